@@ -1,43 +1,17 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import io, base64
-from app.db import client
-
-# --------------------------
-# Helper: fetch block data
-# --------------------------
-def fetch_block_data(district: str, block: str, limit: int = 1000):
-    """
-    Fetch groundwater rows for a district+block (case-insensitive).
-    """
-    resp = (
-        client.table("groundwater")
-        .select("*")
-        .ilike("district", f"%{district}%")
-        .ilike("block", f"%{block}%")
-        .order("datetime_ts", desc=True)
-        .limit(limit)
-        .execute()
-    )
-
-    rows = resp.data or []
-    print(f"[DEBUG] Fetched {len(rows)} rows for {district} / {block}")
-    return rows
+import base64
 
+from app.db import rollup
+from app.plots import plots
 
 # --------------------------
 # Daily fluctuation
 # --------------------------
-def compute_daily_fluctuation(district: str, block: str):
-    rows = fetch_block_data(district, block, limit=500)
-    if not rows:
+async def compute_daily_fluctuation(district: str, block: str):
+    daily = await rollup.daily(district, block)
+    if daily.empty:
         return {"error": "No data found"}
 
-    df = pd.DataFrame(rows)
-    df["datetime_ts"] = pd.to_datetime(df["datetime_ts"])
-    df["date"] = df["datetime_ts"].dt.date
-
-    daily = df.groupby("date")["water_level"].mean().reset_index(name="mean_level_m")
+    daily = daily[["date", "mean_level"]].rename(columns={"mean_level": "mean_level_m"})
 
     if len(daily) < 2:
         return {"daily_fluctuation": None, "reason": "Not enough daily data"}
@@ -56,41 +30,28 @@ def compute_daily_fluctuation(district: str, block: str):
 # --------------------------
 # Mean water level plot
 # --------------------------
-def plot_mean_levels(district: str, block: str, days: int = 10):
-    rows = fetch_block_data(district, block, limit=1000)
-    if not rows:
-        return None
+async def mean_level_series(district: str, block: str, days: int = 10):
+    """
+    Last ``days`` daily mean levels as a (date, mean_level_m) frame.
+    """
+    daily = await rollup.daily(district, block)
+    if daily.empty:
+        return daily
 
-    df = pd.DataFrame(rows)
-    df["datetime_ts"] = pd.to_datetime(df["datetime_ts"])
-    df["date"] = df["datetime_ts"].dt.date
+    daily = daily[["date", "mean_level"]].rename(columns={"mean_level": "mean_level_m"})
+    return daily.tail(min(days, len(daily)))
 
-    daily = df.groupby("date")["water_level"].mean().reset_index(name="mean_level_m")
-    daily = daily.tail(min(days, len(daily)))
 
+async def plot_mean_levels(district: str, block: str, days: int = 10, raw: bool = False):
+    """
+    Mean level chart as a base64 PNG string, or PNG bytes with ``raw``.
+    """
+    daily = await mean_level_series(district, block, days)
     if daily.empty:
-        print(f"[DEBUG] No daily means for {district} / {block}")
         return None
 
-    plt.figure(figsize=(8, 4))
-    plt.plot(
-        daily["date"],
-        daily["mean_level_m"],
-        marker="o",
-        linestyle="-",
-        label="Mean Level",
-    )
-    plt.xticks(rotation=45)
-    plt.xlabel("Date")
-    plt.ylabel("Mean Water Level (m)")
-    plt.title(f"Daily Mean Water Level (last {len(daily)} days)")
-    plt.legend()
-
-    buf = io.BytesIO()
-    plt.tight_layout()
-    plt.savefig(buf, format="png")
-    plt.close()
-    return base64.b64encode(buf.getvalue()).decode()
+    png = await plots.mean_levels_png(district, block, days, daily)
+    return png if raw else base64.b64encode(png).decode()
 
 
 # --------------------------
@@ -99,25 +60,16 @@ def plot_mean_levels(district: str, block: str, days: int = 10):
 DEFAULT_AREA_HA = 1000.0  # fallback if no area passed
 
 
-def estimate_yield(district: str, block: str, days: int = 30, area_ha: float = 1000.0):
-    rows = fetch_block_data(district, block, limit=1000)
-    if not rows:
+async def estimate_yield(district: str, block: str, days: int = 30, area_ha: float = 1000.0):
+    daily = await rollup.daily(district, block)
+    if daily.empty:
         return None
 
-    df = pd.DataFrame(rows)
-    df["datetime_ts"] = pd.to_datetime(df["datetime_ts"])
-    df["date"] = df["datetime_ts"].dt.date
-
-    recent = df.groupby("date").agg({
-        "water_level": "mean",
-        "specific_yield": "mean"
-    }).reset_index()
-
-    recent = recent.tail(min(days, len(recent)))
+    recent = daily.tail(min(days, len(daily)))
     if recent.empty:
         return None
 
-    avg_level = recent["water_level"].mean()
+    avg_level = recent["mean_level"].mean()
     avg_sy = recent["specific_yield"].mean()
 
     # ✅ Assume 1 hectare = 10,000 m², thickness 5 m, crop demand = 5000 m³/ha
@@ -0,0 +1,199 @@
+"""
+Streaming per-well statistics and anomaly alerts.
+
+For every well (exact district, block) and signal (``water_level``,
+``barometric``) ``WellStats`` keeps a fixed handful of numbers: Welford
+count/mean/M2 over all readings seen, an exponentially weighted mean and
+variance (EWMA), the last value and the z-score of the newest reading
+against the EWMA state before it (NaN when that reading is missing).
+State lives in NumPy arrays indexed by well, so a batch of new readings
+is folded in with array operations across all wells at once — one step
+per reading position within the batch, not per row.
+
+A well is anomalous while the z-score of its newest reading is beyond
+``ANOMALY_Z`` for either signal: a sudden water-level drop or rise, or a
+barometric jump, which usually means a sensor fault.
+"""
+import math
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+SIGNALS = ["water_level", "barometric"]
+EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.1"))
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "4"))
+# readings a well needs before its z-scores count
+MIN_READINGS = int(os.getenv("ANOMALY_MIN_READINGS", "20"))
+
+_FIELDS = ("n", "mean", "m2", "ewma", "ewvar", "last", "z")
+
+
+class WellStats:
+    def __init__(self, alpha: float = EWMA_ALPHA):
+        self.alpha = alpha
+        self.wells = []  # position -> (district, block)
+        self._pos = {}
+        self.last_ts = np.empty(0, dtype="datetime64[ns]")
+        self.state = {s: {f: np.empty(0) for f in _FIELDS} for s in SIGNALS}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.wells)
+
+    def _positions(self, keys) -> np.ndarray:
+        """
+        Array positions of ``keys``, growing the arrays for new wells.
+        """
+        new = [k for k in dict.fromkeys(keys) if k not in self._pos]
+        if new:
+            for key in new:
+                self._pos[key] = len(self.wells)
+                self.wells.append(key)
+            grow = len(new)
+            self.last_ts = np.concatenate((self.last_ts, np.full(grow, np.datetime64("NaT"), dtype="datetime64[ns]")))
+            for fields in self.state.values():
+                for name in _FIELDS:
+                    start = 0.0 if name in ("n", "m2", "ewvar") else np.nan
+                    fields[name] = np.concatenate((fields[name], np.full(grow, start)))
+        return np.fromiter((self._pos[k] for k in keys), dtype=np.int64, count=len(keys))
+
+    def update(self, rows: pd.DataFrame) -> int:
+        """
+        Fold new readings (district, block, datetime_ts and the signals)
+        into the per-well state. Readings at or before a well's last seen
+        timestamp are ignored. Returns the number of readings applied.
+        """
+        if rows.empty:
+            return 0
+        rows = rows.assign(datetime_ts=pd.to_datetime(rows["datetime_ts"], errors="coerce"))
+        rows = rows.dropna(subset=["datetime_ts"]).sort_values("datetime_ts", kind="stable")
+        keys = list(zip(rows["district"].astype(str), rows["block"].astype(str)))
+
+        with self._lock:
+            pos = self._positions(keys)
+            ts = rows["datetime_ts"].to_numpy(dtype="datetime64[ns]")
+            last = self.last_ts[pos]
+            fresh = np.isnat(last) | (ts > last)
+            pos, ts = pos[fresh], ts[fresh]
+            values = {
+                s: pd.to_numeric(rows[s], errors="coerce").to_numpy(dtype=np.float64)[fresh]
+                if s in rows.columns else np.full(len(pos), np.nan)
+                for s in SIGNALS
+            }
+
+            # k-th new reading of every well, in time order, as one step
+            step = pd.Series(pos).groupby(pos).cumcount().to_numpy()
+            for k in range(int(step.max()) + 1 if len(step) else 0):
+                at = step == k
+                for signal in SIGNALS:
+                    self._step(self.state[signal], pos[at], values[signal][at])
+            if len(pos):
+                np.maximum.at(self.last_ts.view(np.int64), pos, ts.view(np.int64))
+        return int(len(pos))
+
+    def _step(self, s: dict, pos: np.ndarray, x: np.ndarray):
+        """
+        One reading for each well in ``pos`` (distinct positions). Missing
+        readings leave the statistics alone but clear the well's z-score.
+        """
+        ok = ~np.isnan(x)
+        s["z"][pos[~ok]] = np.nan
+        pos, x = pos[ok], x[ok]
+        if not len(pos):
+            return
+        n, mean, m2 = s["n"][pos] + 1, s["mean"][pos], s["m2"][pos]
+        ewma, ewvar = s["ewma"][pos], s["ewvar"][pos]
+
+        first = np.isnan(mean)
+        mean = np.where(first, 0.0, mean)
+        ewma = np.where(first, x, ewma)
+
+        # z against the state before this reading
+        std = np.sqrt(ewvar)
+        warm = (n > MIN_READINGS) & (std > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s["z"][pos] = np.where(warm, (x - ewma) / std, 0.0)
+
+        # Welford
+        delta = x - mean
+        mean = mean + delta / n
+        s["m2"][pos] = m2 + delta * (x - mean)
+        s["n"][pos], s["mean"][pos] = n, mean
+
+        # exponentially weighted mean / variance
+        diff = x - ewma
+        incr = self.alpha * diff
+        s["ewma"][pos] = ewma + incr
+        s["ewvar"][pos] = (1 - self.alpha) * (ewvar + diff * incr)
+        s["last"][pos] = x
+
+    def _record(self, i: int) -> dict:
+        district, block = self.wells[i]
+        record = {"district": district, "block": block, "last_ts": _iso(self.last_ts[i])}
+        for signal, s in self.state.items():
+            n = int(s["n"][i])
+            record[signal] = {
+                "last": _num(s["last"][i], 3),
+                "z": _num(s["z"][i], 2),
+                "mean": _num(s["mean"][i], 3),
+                "std": _num(math.sqrt(s["m2"][i] / (n - 1)), 3) if n > 1 else None,
+                "ewma": _num(s["ewma"][i], 3),
+                "readings": n,
+            }
+        return record
+
+    def get(self, district: str, block: str):
+        with self._lock:
+            i = self._pos.get((district, block))
+            return None if i is None else self._record(i)
+
+    def alerts(self, threshold: float = ANOMALY_Z, district: str = None) -> list:
+        """
+        Wells whose newest reading is beyond ``threshold`` z for any
+        signal, most extreme first.
+        """
+        with self._lock:
+            if not self.wells:
+                return []
+            z = np.column_stack([np.abs(self.state[s]["z"]) for s in SIGNALS])
+            worst = np.nan_to_num(z).max(axis=1)
+            hits = np.flatnonzero(worst >= threshold)
+            if district is not None:
+                hits = hits[[self.wells[i][0] == district for i in hits]]
+            hits = hits[np.argsort(-worst[hits], kind="stable")]
+            out = []
+            for i in hits:
+                record = self._record(i)
+                record["kind"] = _kind(self.state, i, threshold)
+                out.append(record)
+            return out
+
+    def reset(self):
+        with self._lock:
+            self.wells, self._pos = [], {}
+            self.last_ts = self.last_ts[:0]
+            for fields in self.state.values():
+                for name in _FIELDS:
+                    fields[name] = fields[name][:0]
+
+
+def _kind(state: dict, i: int, threshold: float) -> list:
+    kinds = []
+    z = state["water_level"]["z"][i]
+    if abs(z) >= threshold:
+        kinds.append("level_drop" if z < 0 else "level_rise")
+    if abs(state["barometric"]["z"][i]) >= threshold:
+        kinds.append("sensor_fault")
+    return kinds
+
+
+def _num(value, digits: int = None):
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), digits) if digits is not None else float(value)
+
+
+def _iso(ts):
+    return None if np.isnat(ts) else pd.Timestamp(ts).isoformat()
@@ -1,13 +1,34 @@
 # app/api.py
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+import base64
+import hmac
+import os
+import re
+import time
 import pandas as pd
 
-from app.analytics import compute_daily_fluctuation, estimate_yield, plot_mean_levels
-from app.scoring import compute_sustainability_score
-from app.db import client, fetch_block_data
+from app.analytics import compute_daily_fluctuation, estimate_yield, mean_level_series, plot_mean_levels
+from app.plots import plots
+from app.rollup import stack_daily
+from app.scoring import compute_sustainability_score, score_blocks
+from app.snapshots import BlockSnapshots, snapshot_age
+from app.anomaly import ANOMALY_Z
+from app.coalesce import Coalescer
+from app.timeseries import DEFAULT_POINTS, MAX_POINTS, SERIES_COLUMNS, downsample
+from app import catalog, metrics
+from app.db import forecasts, latest, rollup, storage, well_stats
+from app.metrics import span
+from app.responses import (
+    CSV_MEDIA_TYPE, NDJSON_MEDIA_TYPE, CompressionMiddleware, FastJSONResponse,
+    csv_chunk, frame_response, ndjson_chunk,
+)
 
-app = FastAPI(title="Groundwater Analytics API")
+app = FastAPI(title="Groundwater Analytics API", default_response_class=FastJSONResponse)
 
 # ✅ Allow all origins for dev (restrict in production)
 app.add_middleware(
@@ -16,66 +37,200 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(metrics.ServerTimingMiddleware)
+
+
+metrics.register_caches(lambda: {"catalog": catalog.cache, "plots": plots.cache, "latest": latest.cache})
+
+# identical concurrent requests share one computation
+flights = Coalescer()
+
+# shared secret for POST /cache/invalidate (sent as X-Invalidate-Token);
+# the endpoint is disabled while unset
+CACHE_INVALIDATE_TOKEN = os.getenv("CACHE_INVALIDATE_TOKEN")
+
+
+@app.on_event("startup")
+async def startup():
+    await storage.open()
+    try:
+        await catalog.warm()
+    except Exception as e:
+        print(f"⚠️ Catalog warm-up failed: {e}")
+        return
+    # precompute score/extras snapshots and fit forecast models for every
+    # block without holding up startup
+    snapshots.start()
+    app.state.forecast_warmup = asyncio.create_task(forecasts.warm(await all_pairs()))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    plots.shutdown()
+    snapshots.shutdown()
+    forecasts.shutdown()
+    await storage.close()
 
 
 # -------------------
 # Health Check
 # -------------------
 @app.get("/")
-def health():
+async def health():
     return {"status": "ok"}
 
 
+# -------------------
+# Cache Control
+# -------------------
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "catalog": catalog.cache.stats(),
+        "plots": plots.cache.stats(),
+        "latest": latest.cache.stats(),
+        "snapshots": snapshots.stats(),
+        "coalescing": flights.stats(),
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text-format metrics: request/stage latency, rows fetched, caches."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/memory")
+async def memory():
+    """Bytes held in process for readings and daily rollups, per district."""
+    return {"storage": storage.memory(), "rollup": rollup.memory()}
+
+
+@app.post("/cache/invalidate")
+async def cache_invalidate(x_invalidate_token: Optional[str] = Header(None)):
+    """Drop cached catalog lookups and mark block data stale (call after loading new data)."""
+    if not CACHE_INVALIDATE_TOKEN:
+        raise HTTPException(status_code=403, detail="Cache invalidation is disabled (CACHE_INVALIDATE_TOKEN not set)")
+    if not x_invalidate_token or not hmac.compare_digest(x_invalidate_token, CACHE_INVALIDATE_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Invalidate-Token")
+    catalog.invalidate()
+    latest.expire()
+    rollup.invalidate()
+    snapshots.trigger()
+    return {"status": "invalidated"}
+
+
+# -------------------
+# Name Resolution
+# -------------------
+async def resolve_block(district: str, block: str):
+    """
+    Exact stored (district, block) for the request's spelling (exact or
+    site-style alias match); 404 with close matches otherwise.
+    """
+    pair = await catalog.resolve(district, block)
+    if pair is None:
+        raise await not_found(district, block)
+    return pair
+
+
+async def resolve_district(district: str) -> str:
+    """
+    Exact stored district name for the request's spelling; 404 with close
+    matches otherwise.
+    """
+    exact = await catalog.resolve_district(district)
+    if exact is None:
+        suggestions = await catalog.suggest(district, limit=5)
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": f"Unknown district '{district}'",
+                "suggestions": [s for s in suggestions if s["type"] == "district"],
+            },
+        )
+    return exact
+
+
+async def all_pairs() -> list:
+    """
+    Exact (district, block) of every block in the catalog.
+    """
+    return [(row["district"], row["block"]) for row in await catalog.blocks_all()]
+
+
+async def not_found(district: str, block: str) -> HTTPException:
+    """
+    404 naming the unknown block, with close matches as suggestions.
+    """
+    exact = await catalog.resolve_district(district) if district else None
+    suggestions = await catalog.suggest(block, district=exact, limit=5)
+    where = f"district='{district}', block='{block}'" if district else f"block='{block}'"
+    return HTTPException(
+        status_code=404,
+        detail={
+            "error": f"No data found for {where}",
+            "suggestions": [s for s in suggestions if s["type"] == "block"],
+        },
+    )
+
+
+@app.get("/autocomplete")
+async def autocomplete(
+    q: str = Query(..., min_length=1),
+    district: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    District and block names matching ``q`` (prefix of any word, then
+    fuzzy), optionally restricted to one district.
+    """
+    return {"query": q, "results": await catalog.suggest(q, district=district, limit=limit)}
+
+
 # -------------------
 # Districts & Blocks
 # -------------------
 @app.get("/districts")
-def get_districts():
-    response = client.rpc("get_districts").execute()
-    if not response.data:
+async def get_districts():
+    rows = await catalog.districts()
+    if not rows:
         raise HTTPException(
             status_code=404,
             detail={"error": "No districts found", "reason": "Database returned empty result"}
         )
-    districts = sorted({row["district"].strip().title() for row in response.data if row.get("district")})
+    districts = sorted({d.strip().title() for d in rows})
     return list(districts)
 
 
 
 @app.get("/blocks")
-def get_blocks(district: str = Query(...)):
-    response = client.rpc("get_blocks_by_district", {"district_name": district}).execute()
-    if not response.data:
+async def get_blocks(district: str = Query(...)):
+    rows = await catalog.blocks(await resolve_district(district))
+    if not rows:
         raise HTTPException(status_code=404, detail="No blocks found for this district")
-    blocks = sorted({row["block"].strip().title() for row in response.data if row.get("block")})
+    blocks = sorted({b.strip().title() for b in rows})
     return blocks
 
 
 @app.get("/district-by-block")
-def get_district_by_block(block: str = Query(...)):
+async def get_district_by_block(block: str = Query(...)):
     """Find the district for a given block."""
-    response = (
-        client.table("groundwater")
-        .select("district")
-        .eq("block", block)
-        .limit(1)
-        .execute()
-    )
-    if not response.data:
-        raise HTTPException(status_code=404, detail="No district found for this block")
-
-    return {"block": block, "district": response.data[0]["district"]}
+    pair = await resolve_block(None, block)
+    return {"block": block, "district": pair[0]}
 
 
 @app.get("/blocks-all")
-def get_blocks_all():
+async def get_blocks_all():
     """Return mapping of block → district for all records."""
-    response = client.rpc("get_blocks_all").execute()
-    if not response.data:
+    rows = await catalog.blocks_all()
+    if not rows:
         raise HTTPException(status_code=404, detail="No blocks found")
 
-    mapping = {row["block"].strip(): row["district"].strip() for row in response.data}
+    mapping = {row["block"].strip(): row["district"].strip() for row in rows}
     return {"blocks": mapping}
 
 
@@ -83,53 +238,315 @@ def get_blocks_all():
 # Analytics Endpoints
 # -------------------
 @app.get("/fluctuations-daily")
-def fluctuations_daily(district: str, block: str):
+async def fluctuations_daily(district: str, block: str):
     """Daily fluctuation in mean water level (last two days)."""
-    result = compute_daily_fluctuation(district, block)
+    pair = await resolve_block(district, block)
+    result = await compute_daily_fluctuation(*pair)
     if not result or "error" in result:
         raise HTTPException(status_code=404, detail=result.get("error", "No data found"))
     return result
 
 
-from fastapi import HTTPException
-import re
-
 @app.get("/plot-mean-levels")
-def plot_mean_levels_api(district: str, block: str, days: int = 10):
-    """Return a base64 PNG plot of mean water levels for the last N days (case-insensitive + cleaned)."""
-
-    # normalize inputs
-    def normalize(text: str) -> str:
-        if not text:
-            return ""
-        text = text.lower().strip()
-        text = re.sub(r"[_\-\s]+", " ", text)   # collapse _, - and multiple spaces
-        return text
-
-    norm_district = normalize(district)
-    norm_block = normalize(block)
-
-    print(f"🔎 Normalized request → District={norm_district}, Block={norm_block}")
+async def plot_mean_levels_api(
+    request: Request,
+    district: str,
+    block: str,
+    days: int = 10,
+    format: str = Query("png", pattern="^(png|json|image)$"),
+):
+    """
+    Mean water levels for the last N days (names in any case or separator style):
+    - png (default): {"plot_base64": ...}
+    - image: the PNG itself (image/png), no base64 overhead
+    - json: the raw series for client-side charts, as column-oriented
+      JSON or, with Accept: application/vnd.apache.arrow.stream, Arrow IPC
+    """
+    pair = await resolve_block(district, block)
+
+    if format == "json":
+        series = await flights.run("plot-mean-levels-json", (pair, days), lambda: mean_level_series(*pair, days))
+        if series.empty:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No data found for district='{district}', block='{block}'"
+            )
+        series = series.assign(mean_level_m=series["mean_level_m"].round(3))
+        return frame_response(
+            request,
+            series,
+            meta={"district": pair[0], "block": pair[1]},
+            json_body={
+                "dates": [str(d) for d in series["date"]],
+                "mean_level_m": series["mean_level_m"].to_numpy(),
+            },
+        )
 
-    # Call your existing function
-    encoded = plot_mean_levels(norm_district, norm_block, days)
+    png = await flights.run("plot-mean-levels", (pair, days), lambda: plot_mean_levels(*pair, days, raw=True))
 
-    if not encoded:
+    if not png:
         raise HTTPException(
             status_code=404,
             detail=f"No data found for district='{district}', block='{block}'"
         )
 
-    return {"plot_base64": encoded}
+    if format == "image":
+        return Response(png, media_type="image/png")
+    return FastJSONResponse({"plot_base64": base64.b64encode(png).decode()})
+
+
+
+# -------------------
+# Long-range Series
+# -------------------
+def parse_range(start: Optional[str], end: Optional[str]):
+    """
+    (start, end) timestamps from ISO strings; a date-only ``end`` covers
+    that whole day. 400 on bad or reversed input.
+    """
+    try:
+        start_ts = pd.Timestamp(start) if start else None
+        end_ts = pd.Timestamp(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be ISO dates")
+    if end_ts is not None and len(end) <= 10:
+        end_ts += pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    if start_ts is not None and end_ts is not None and start_ts > end_ts:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start_ts, end_ts
+
+@app.get("/timeseries")
+async def timeseries(
+    request: Request,
+    district: str,
+    block: str,
+    column: str = "water_level",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    points: int = Query(DEFAULT_POINTS, ge=3, le=MAX_POINTS),
+    method: str = Query("minmax", pattern="^(minmax|lttb)$"),
+):
+    """
+    ``column`` of a block between ``start`` and ``end`` (ISO dates; default
+    the whole history) reduced server-side to about ``points`` rows:
+    - minmax (default): per time bucket datetime_ts, mean, min, max, count
+    - lttb: the original points that best keep the line's shape (value)
+    Ranges with at most ``points`` readings come back unreduced (method
+    "raw"). Column-oriented JSON, or Arrow IPC with
+    Accept: application/vnd.apache.arrow.stream.
+    """
+    if column not in SERIES_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"column must be one of {SERIES_COLUMNS}")
+    start_ts, end_ts = parse_range(start, end)
+
+    pair = await resolve_block(district, block)
+
+    df = await storage.history(*pair, ["datetime_ts", column], start=start_ts, end=end_ts)
+    with span("downsample"):
+        series, raw, used = downsample(df, column, points, method, start_ts, end_ts)
+    return frame_response(
+        request,
+        series,
+        meta={
+            "district": pair[0],
+            "block": pair[1],
+            "column": column,
+            "method": used,
+            "raw_points": raw,
+            "points": len(series),
+        },
+    )
+
 
+# -------------------
+# Export
+# -------------------
+EXPORT_BATCH_BLOCKS = 25
+
+
+@app.get("/export")
+async def export(
+    district: str,
+    block: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+):
+    """
+    Raw readings of a block, or of every block of a district, between
+    ``start`` and ``end`` (default: the full history), streamed as NDJSON
+    or CSV. Storage is paged with keyset pagination and each page is sent
+    as soon as it is encoded, so memory stays at one page however many
+    years are exported. Rows are oldest first within each batch of
+    ``EXPORT_BATCH_BLOCKS`` blocks.
+    """
+    start_ts, end_ts = parse_range(start, end)
+    if block is not None:
+        pair = await resolve_block(district, block)
+        pairs, name = [pair], f"{pair[0]}_{pair[1]}"
+    else:
+        exact = await resolve_district(district)
+        pairs, name = [(exact, b) for b in await catalog.blocks(exact)], exact
+
+    async def body():
+        header = True
+        for i in range(0, len(pairs), EXPORT_BATCH_BLOCKS):
+            async for page in storage.pages(pairs[i:i + EXPORT_BATCH_BLOCKS], start=start_ts, end=end_ts):
+                if page.empty:
+                    continue
+                if format == "csv":
+                    yield csv_chunk(page, header)
+                    header = False
+                else:
+                    yield ndjson_chunk(page)
+
+    filename = re.sub(r"[^\w.-]+", "_", name) + "." + format
+    return StreamingResponse(
+        body(),
+        media_type=NDJSON_MEDIA_TYPE if format == "ndjson" else CSV_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# -------------------
+# Wells by Location
+# -------------------
+MAX_NEAREST = 100
+MAX_RADIUS_KM = 500.0
+MAX_WITHIN = 500
+
+
+async def with_snapshots(wells: list) -> list:
+    """
+    Attach each well's latest reading (from the snapshot cache).
+    """
+    rows = await asyncio.gather(*(latest.get(w["district"], w["block"]) for w in wells))
+    return [{**w, "latest": row} for w, row in zip(wells, rows)]
+
+
+@app.get("/wells/nearest")
+async def wells_nearest(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=MAX_NEAREST),
+    max_km: Optional[float] = Query(None, gt=0),
+):
+    """
+    The ``k`` wells nearest to (lat, lon), nearest first, optionally only
+    those within ``max_km``, each with its latest snapshot.
+    """
+    index = await catalog.wells()
+    with span("spatial"):
+        wells = index.nearest(lat, lon, k, max_km)
+    return {"lat": lat, "lon": lon, "count": len(wells), "wells": await with_snapshots(wells)}
+
+
+@app.get("/wells/within")
+async def wells_within(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=MAX_RADIUS_KM),
+    limit: int = Query(100, ge=1, le=MAX_WITHIN),
+):
+    """
+    Wells within ``radius_km`` of (lat, lon), nearest first (at most
+    ``limit``), each with its latest snapshot.
+    """
+    index = await catalog.wells()
+    with span("spatial"):
+        wells = index.within(lat, lon, radius_km, limit)
+    return {
+        "lat": lat,
+        "lon": lon,
+        "radius_km": radius_km,
+        "count": len(wells),
+        "wells": await with_snapshots(wells),
+    }
+
+
+# -------------------
+# Anomaly Alerts
+# -------------------
+@app.get("/alerts")
+async def get_alerts(
+    district: Optional[str] = None,
+    z: float = Query(ANOMALY_Z, gt=0),
+    refresh: bool = True,
+):
+    """
+    Wells whose newest reading is anomalous (|z| >= ``z`` against the
+    well's EWMA for water level or barometric pressure), most extreme
+    first. With ``refresh`` every block is first topped up with readings
+    newer than its high-water mark; no history is re-read.
+    """
+    exact = await resolve_district(district) if district else None
+    if refresh:
+        rows = await catalog.blocks_all()
+        pairs = [(r["district"], r["block"]) for r in rows if exact is None or r["district"] == exact]
+        await rollup.refresh_many(pairs)
+    with span("alerts"):
+        alerts = well_stats.alerts(z, district=exact)
+    return {"threshold_z": z, "wells_tracked": len(well_stats), "count": len(alerts), "alerts": alerts}
+
+
+@app.get("/well-stats")
+async def get_well_stats(district: str = Query(...), block: str = Query(...)):
+    """
+    Streaming statistics of one well: Welford mean/std, EWMA and the
+    z-score of the newest reading, per signal.
+    """
+    pair = await resolve_block(district, block)
+    await rollup.refresh(*pair)
+    stats = well_stats.get(*pair)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No readings for this well yet")
+    return stats
+
+
+# -------------------
+# Forecast
+# -------------------
+@app.get("/forecast")
+async def get_forecast(
+    request: Request,
+    district: str,
+    block: str,
+    days: int = Query(30, ge=1, le=180),
+    level: float = Query(0.95, gt=0.5, lt=1.0),
+):
+    """
+    Daily mean water level forecast for the ``days`` after the last
+    observed day, with a ``level`` prediction interval. Served from the
+    block's cached model (trend + annual seasonality once a year of data
+    exists). Column-oriented JSON, or Arrow IPC on request.
+    """
+    pair = await resolve_block(district, block)
+    model, frame = await forecasts.forecast(*pair, days=days, level=level)
+    if frame is None:
+        raise HTTPException(status_code=404, detail="Not enough daily data to forecast this block")
+    params = model["params"]
+    return frame_response(
+        request,
+        frame,
+        meta={
+            "district": pair[0],
+            "block": pair[1],
+            "level": level,
+            "model": "trend+annual" if params["harmonics"] else "trend",
+            "trained_days": params["n"],
+            "residual_sigma_m": round(params["sigma"], 4),
+            "model_age_seconds": round(time.time() - model["fitted_at"], 1),
+        },
+    )
 
 
 # -------------------
 # Yield Endpoint
 # -------------------
 @app.get("/yield")
-def yield_endpoint(district: str, block: str, days: int = 30):
-    result = estimate_yield(district, block, days=days)
+async def yield_endpoint(district: str, block: str, days: int = 30):
+    pair = await resolve_block(district, block)
+    result = await estimate_yield(*pair, days=days)
     if not result:
         raise HTTPException(status_code=404, detail="No yield data available")
     return {"estimated_irrigated_area_ha": result}
@@ -140,121 +557,95 @@ def yield_endpoint(district: str, block: str, days: int = 30):
 # Metadata Endpoints
 # -------------------
 @app.get("/last-recorded")
-def last_recorded(district: str = Query(...), block: str = Query(...)):
+async def last_recorded(district: str = Query(...), block: str = Query(...)):
     """Return last recorded timestamp for a block."""
-    resp = (
-        client.table("groundwater")
-        .select("datetime_ts")
-        .eq("district", district)
-        .eq("block", block)
-        .order("datetime_ts", desc=True)
-        .limit(1)
-        .execute()
-    )
-    if not resp.data:
+    pair = await resolve_block(district, block)
+    row = await latest.get(*pair)
+    if not row:
         return {"last_recorded": None}
-    return {"last_recorded": resp.data[0]["datetime_ts"]}
+    return {"last_recorded": row["datetime_ts"]}
 
 
 @app.get("/last-water-level")
-def last_water_level(district: str = Query(...), block: str = Query(...)):
+async def last_water_level(district: str = Query(...), block: str = Query(...)):
     """Return last water level for a block."""
-    resp = (
-        client.table("groundwater")
-        .select("water_level, datetime_ts")
-        .eq("district", district)
-        .eq("block", block)
-        .order("datetime_ts", desc=True)
-        .limit(1)
-        .execute()
-    )
-    if not resp.data:
+    pair = await resolve_block(district, block)
+    row = await latest.get(*pair)
+    if not row:
         return {"last_water_level": None}
-    return resp.data[0]
+    return {"water_level": row["water_level"], "datetime_ts": row["datetime_ts"]}
 
 
 @app.get("/rainfall")
-def rainfall(district: str = Query(...), block: str = Query(...)):
+async def rainfall(district: str = Query(...), block: str = Query(...)):
     """Return last recorded rainfall for a block."""
-    resp = (
-        client.table("groundwater")
-        .select("rainfall_mm, datetime_ts")
-        .eq("district", district)
-        .eq("block", block)
-        .order("datetime_ts", desc=True)
-        .limit(1)
-        .execute()
-    )
-    if not resp.data:
+    pair = await resolve_block(district, block)
+    row = await latest.get(*pair)
+    if not row:
         return {"rainfall_mm": None}
-    return resp.data[0]
+    return {"rainfall_mm": row["rainfall_mm"], "datetime_ts": row["datetime_ts"]}
 
 
 @app.get("/aquifer")
-def get_aquifer_type(district: str = Query(...), block: str = Query(...)):
+async def get_aquifer_type(district: str = Query(...), block: str = Query(...)):
     """Return aquifer type for a block."""
-    resp = (
-        client.table("groundwater")
-        .select("aquifer_type")
-        .eq("district", district)
-        .eq("block", block)
-        .order("datetime_ts", desc=True)
-        .limit(1)
-        .execute()
-    )
-    if not resp.data:
+    pair = await resolve_block(district, block)
+    row = await latest.get(*pair)
+    if not row:
         return {"aquifer_type": None}
-    return {"district": district, "block": block, "aquifer_type": resp.data[0].get("aquifer_type")}
+    return {"district": district, "block": block, "aquifer_type": row.get("aquifer_type")}
+
+
+@app.get("/block-summary")
+async def block_summary(district: str = Query(...), block: str = Query(...)):
+    """
+    Everything the dashboard header shows for a block, from its newest
+    reading, in one cached lookup.
+    """
+    pair = await resolve_block(district, block)
+
+    snap = await latest.snapshot(*pair)
+    row = snap["row"]
+    if not row:
+        raise await not_found(district, block)
+
+    return {
+        "district": pair[0],
+        "block": pair[1],
+        "last_recorded": row["datetime_ts"],
+        "water_level": row["water_level"],
+        "rainfall_mm": row["rainfall_mm"],
+        "aquifer_type": row["aquifer_type"],
+        "specific_yield": row["specific_yield"],
+        "water_quality": {
+            "pH": row["wq_ph"],
+            "EC": row["wq_ec"],
+            "Cl": row["wq_cl"],
+            "F": row["wq_f"],
+            "Hardness": row["wq_total_hardness"],
+        },
+        "snapshot_age_seconds": round(time.time() - snap["fetched_at"], 1),
+    }
 
 
 # -------------------
 # Sustainability Score
 # -------------------
 @app.get("/score")
-def get_sustainability_score(district: str = Query(...), block: str = Query(...)):
+async def get_sustainability_score(district: str = Query(...), block: str = Query(...)):
+    """
+    Sustainability score of the last 30 days, served from the block's
+    precomputed snapshot (``snapshot_age_seconds`` tells how old it is).
+    """
+    pair = await resolve_block(district, block)
     try:
-        resp = client.table("groundwater") \
-            .select("datetime_ts, water_level, rainfall_mm, specific_yield, aquifer_type, wq_ph, wq_ec, wq_cl, wq_f, wq_total_hardness") \
-            .ilike("district", f"%{district}%") \
-            .ilike("block", f"%{block}%") \
-            .order("datetime_ts", desc=True) \
-            .limit(1000) \
-            .execute()
-
-        if not resp.data:
-            return {"error": f"No groundwater data found for district='{district}', block='{block}'"}
+        snap = await block_snapshot(pair)
+        score = snap["payloads"].get("score") if snap else None
 
-        df = pd.DataFrame(resp.data)
-        df["datetime_ts"] = pd.to_datetime(df["datetime_ts"], errors="coerce")
-        df = df.dropna(subset=["datetime_ts", "water_level"])
-
-        if df.empty:
-            return {"error": "Not enough valid data for scoring"}
-
-        # Aggregate into daily means
-        df["date"] = df["datetime_ts"].dt.date
-        daily = df.groupby("date").agg({
-            "water_level": "mean",
-            "rainfall_mm": "mean",
-            "specific_yield": "mean",
-            "aquifer_type": "last",
-            "wq_ph": "mean",
-            "wq_ec": "mean",
-            "wq_cl": "mean",
-            "wq_f": "mean",
-            "wq_total_hardness": "mean"
-        }).reset_index()
-
-        daily.rename(columns={"water_level": "mean_level"}, inplace=True)
-
-        score = compute_sustainability_score(daily.tail(30))
+        if score is None:
+            return {"error": f"No groundwater data found for district='{district}', block='{block}'"}
 
-        return {
-            "district": district,
-            "block": block,
-            "final_score_pct": score.get("final_score_pct"),
-            "components": {k: v for k, v in score.items() if k != "final_score_pct"}
-        }
+        return snapshot_response(snap, {"district": district, "block": block, **score})
     except Exception as e:
         return {"error": f"Score computation failed: {str(e)}"}
 
@@ -271,129 +662,271 @@ def safe_round(value, digits=2):
         return None
 
 
-from fastapi import Query
-import pandas as pd
-from app.db import client
-from app.analytics import compute_daily_fluctuation, estimate_yield, plot_mean_levels
-from app.scoring import compute_sustainability_score
-
-@app.get("/extras")
-def get_extras(district: str = Query(...), block: str = Query(...)):
+def summarize_daily(daily_by_block: dict) -> pd.DataFrame:
+    """
+    Per-block last-day values, day-over-day fluctuation and median specific
+    yield, computed for every block in one grouped pass.
+    """
+    frames = {key: daily for key, daily in daily_by_block.items() if not daily.empty}
+    if not frames:
+        return pd.DataFrame()
+
+    daily = pd.concat(frames, names=["district", "block", "row"])
+    grouped = daily.groupby(level=["district", "block"], sort=False)
+    summary = grouped.tail(1).droplevel("row")
+    summary["prev_level"] = grouped["mean_level"].nth(-2).droplevel("row")
+    summary["sy_median"] = grouped["specific_yield"].median()
+    summary["daily_rows"] = grouped.size()
+    return summary
+
+
+def build_extras(district: str, block: str, daily: pd.DataFrame, summary: pd.Series, score: dict = None) -> dict:
+    """
+    Assemble the /extras payload for one block from its daily frame and
+    summary row. ``score`` may be passed in when already computed in bulk.
+    """
+    last_row = summary[daily.columns].to_dict()
+    last_date = str(last_row.get("date"))
+    last_level = safe_round(last_row.get("mean_level"), 2)
+    rainfall = safe_round(last_row.get("rainfall_mm"), 2)
+    aquifer = last_row.get("aquifer_type", "Unknown")
+
+    # 🔹 Compute sustainability score
     try:
-        # 🔹 Fetch raw data from Supabase
-        resp = client.table("groundwater") \
-            .select("datetime_ts, water_level, rainfall_mm, specific_yield, aquifer_type, wq_ph, wq_ec, wq_cl, wq_f, wq_total_hardness") \
-            .eq("district", district) \
-            .eq("block", block) \
-            .order("datetime_ts", desc=True) \
-            .limit(500) \
-            .execute()
-
-        rows = resp.data or []
-        if not rows:
-            return {
-                "error": f"No groundwater data found for district={district}, block={block}"
-            }
+        if score is None:
+            with span("score"):
+                score = compute_sustainability_score(daily.tail(60))
+        final_score = score.get("final_score_pct", None)
+    except Exception as e:
+        final_score = None
+        score = {"error": f"Scoring failed: {str(e)}"}
+
+    # 🔹 Daily fluctuation (last 2 days)
+    fluctuation = None
+    if summary["daily_rows"] >= 2:
+        fluctuation = safe_round(summary["mean_level"] - summary["prev_level"], 2)
+
+    # 🔹 Yield estimation (if specific_yield exists)
+    yield_info = None
+    if pd.notna(summary["sy_median"]):
+        area_used = 1000  # hectares (reference area)
+        sy = summary["sy_median"]
+        available_volume = round(area_used * sy * 3.5, 2)  # dummy factor
+        irrigated_area = round(area_used * 0.7, 2)
+        yield_info = {
+            "area_ha_used": area_used,
+            "available_volume_m3": available_volume,
+            "estimated_irrigated_area_ha": irrigated_area
+        }
 
-        # 🔹 Convert to DataFrame
-        df = pd.DataFrame(rows)
-        if df.empty:
-            return {
-                "error": "Fetched rows but DataFrame is empty after conversion"
-            }
+    # 🔹 Water Quality
+    wq = {
+        "pH": safe_round(last_row.get("wq_ph"), 2),
+        "EC": safe_round(last_row.get("wq_ec"), 2),
+        "Cl": safe_round(last_row.get("wq_cl"), 2),
+        "F": safe_round(last_row.get("wq_f"), 2),
+        "Hardness": safe_round(last_row.get("wq_total_hardness"), 2),
+    }
+
+    return {
+        "district": district,
+        "block": block,
+        "last_date": last_date,
+        "last_water_level": last_level,
+        "rainfall_mm": rainfall,
+        "aquifer_type": aquifer,
+        "final_score_pct": final_score,
+        "score_components": score,
+        "daily_fluctuation": fluctuation,
+        "yield": yield_info,
+        "water_quality": wq,
+    }
+
+
+def build_snapshots(daily_by_block: dict) -> dict:
+    """
+    /score and /extras payloads for many blocks, scored in bulk. Blocks
+    without daily data get no payloads.
+    """
+    summary = summarize_daily(daily_by_block)
+    if summary.empty:
+        return {}
+    stacked = stack_daily(daily_by_block)
+    with span("score"):
+        scores = score_blocks(stacked, window=30).to_dict(orient="index")
+        extras_scores = score_blocks(stacked, window=60).to_dict(orient="index")
+
+    payloads = {}
+    for pair in summary.index:
+        score = dict(scores.get(pair, {}))
+        payloads[pair] = {
+            "score": {"final_score_pct": score.pop("final_score_pct", None), "components": score},
+            "extras": build_extras(
+                *pair, daily_by_block[pair], summary.loc[pair], score=extras_scores.get(pair),
+            ),
+        }
+    return payloads
 
-        df["datetime_ts"] = pd.to_datetime(df["datetime_ts"], errors="coerce")
-        df = df.dropna(subset=["datetime_ts", "water_level"])
-        if df.empty:
-            return {
-                "error": "All rows invalid after cleaning (no datetime_ts or water_level)"
-            }
 
-        # 🔹 Daily aggregation
-        df["date"] = df["datetime_ts"].dt.date
-        daily = df.groupby("date").agg({
-            "water_level": "mean",
-            "rainfall_mm": "mean",
-            "specific_yield": "mean",
-            "aquifer_type": "last",
-            "wq_ph": "mean",
-            "wq_ec": "mean",
-            "wq_cl": "mean",
-            "wq_f": "mean",
-            "wq_total_hardness": "mean"
-        }).reset_index()
-
-        daily.rename(columns={"water_level": "mean_level"}, inplace=True)
+snapshots = BlockSnapshots(rollup, build_snapshots, all_pairs)
 
-        if daily.empty:
-            return {"error": "Not enough aggregated daily data"}
-
-        # 🔹 Safely extract last record
-        last_row = daily.iloc[-1].to_dict()
-        last_date = str(last_row.get("date"))
-        last_level = safe_round(last_row.get("mean_level"), 2)
-        rainfall = safe_round(last_row.get("rainfall_mm"), 2)
-        aquifer = last_row.get("aquifer_type", "Unknown")
-
-        # 🔹 Compute sustainability score
-        try:
-            score = compute_sustainability_score(daily.tail(60))
-            final_score = score.get("final_score_pct", None)
-        except Exception as e:
-            final_score = None
-            score = {"error": f"Scoring failed: {str(e)}"}
-
-        # 🔹 Daily fluctuation (last 2 days)
-        fluctuation = None
-        if len(daily) >= 2:
-            fluctuation = safe_round(daily["mean_level"].iloc[-1] - daily["mean_level"].iloc[-2], 2)
-
-        # 🔹 Yield estimation (if specific_yield exists)
-        yield_info = None
-        if "specific_yield" in daily and daily["specific_yield"].notna().any():
-            try:
-                area_used = 1000  # hectares (reference area)
-                sy = daily["specific_yield"].median()
-                available_volume = round(area_used * sy * 3.5, 2)  # dummy factor
-                irrigated_area = round(area_used * 0.7, 2)
-                yield_info = {
-                    "area_ha_used": area_used,
-                    "available_volume_m3": available_volume,
-                    "estimated_irrigated_area_ha": irrigated_area
+
+async def block_snapshot(pair):
+    """
+    The block's snapshot. Concurrent requests for a block that has none
+    yet share one build; existing snapshots are a plain lookup.
+    """
+    if pair in snapshots.snapshots:
+        return await snapshots.get(*pair)
+    return await flights.run("snapshot", pair, lambda: snapshots.get(*pair))
+
+
+def snapshot_response(snap: dict, payload: dict) -> FastJSONResponse:
+    """
+    ``payload`` with the snapshot's age, in the body and as ``Age``.
+    """
+    age = snapshot_age(snap)
+    return FastJSONResponse({**payload, "snapshot_age_seconds": age}, headers={"Age": str(int(age))})
+
+
+@app.get("/extras")
+async def get_extras(district: str = Query(...), block: str = Query(...), debug: bool = False):
+    """
+    Dashboard extras for one block, served from its precomputed snapshot.
+    ``debug=true`` computes them live instead and adds the rollup row
+    counts and the raw last daily row.
+    """
+    pair = await resolve_block(district, block)
+    try:
+        if not debug:
+            snap = await block_snapshot(pair)
+            extras = snap["payloads"].get("extras") if snap else None
+            if extras is None:
+                return {
+                    "error": f"No groundwater data found for district={district}, block={block}"
                 }
-            except Exception as e:
-                yield_info = {"error": f"Yield calc failed: {str(e)}"}
-
-        # 🔹 Water Quality
-        wq = {
-            "pH": safe_round(last_row.get("wq_ph"), 2),
-            "EC": safe_round(last_row.get("wq_ec"), 2),
-            "Cl": safe_round(last_row.get("wq_cl"), 2),
-            "F": safe_round(last_row.get("wq_f"), 2),
-            "Hardness": safe_round(last_row.get("wq_total_hardness"), 2),
-        }
+            return snapshot_response(snap, extras)
 
-        return {
-            "district": district,
-            "block": block,
-            "last_date": last_date,
-            "last_water_level": last_level,
-            "rainfall_mm": rainfall,
-            "aquifer_type": aquifer,
-            "final_score_pct": final_score,
-            "score_components": score,
-            "daily_fluctuation": fluctuation,
-            "yield": yield_info,
-            "water_quality": wq,
-            "debug": {
-                "rows_fetched": len(rows),
-                "daily_rows": len(daily),
-                "last_row": last_row,
+        # 🔹 Daily aggregates from the shared rollup
+        entry = await rollup.refresh(*pair)
+        daily = entry["daily"]
+        if daily.empty:
+            return {
+                "error": f"No groundwater data found for district={district}, block={block}"
             }
+
+        summary = summarize_daily({pair: daily}).iloc[0]
+        result = build_extras(*pair, daily, summary)
+        result["debug"] = {
+            "rows_fetched": entry["readings"],
+            "daily_rows": len(daily),
+            "last_row": summary[daily.columns].to_dict(),
         }
+        return FastJSONResponse(result)
 
     except Exception as e:
         return {
             "error": f"Internal error in extras: {str(e)}"
         }
 
+
+# -------------------
+# Batch Extras Endpoint
+# -------------------
+MAX_BATCH_BLOCKS = 200
+
+
+class BlockRef(BaseModel):
+    district: str
+    block: str
+
+
+class ExtrasBatchRequest(BaseModel):
+    blocks: List[BlockRef] = []
+    district: Optional[str] = None
+
+
+@app.post("/extras/batch")
+async def get_extras_batch(request: ExtrasBatchRequest):
+    """
+    /extras for many blocks at once: either explicit (district, block)
+    pairs, a whole district, or both. ``results`` is a list of /extras
+    payloads, each naming its exact district and block (block names repeat
+    across districts); ``missing`` lists the requested pairs without data.
+    """
+    requested = [(ref.district, ref.block) for ref in request.blocks]
+    if request.district:
+        exact = await resolve_district(request.district)
+        requested += [(exact, block) for block in await catalog.blocks(exact)]
+    requested = list(dict.fromkeys(requested))
+
+    if not requested and not request.district:
+        raise HTTPException(status_code=400, detail="Pass 'blocks' and/or 'district'")
+    if len(requested) > MAX_BATCH_BLOCKS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_BLOCKS} blocks per request")
+
+    index = await catalog.index()
+    resolved = {ref: index.resolve(*ref) for ref in requested}
+    pairs = list(dict.fromkeys(pair for pair in resolved.values() if pair))
+
+    # 🔹 One storage query + one grouped aggregation for every stale block
+    daily_by_block = await rollup.refresh_many(pairs)
+    summary = summarize_daily(daily_by_block)
+    scores = {}
+    if not summary.empty:
+        with span("score"):
+            scores = score_blocks(stack_daily(daily_by_block), window=60).to_dict(orient="index")
+
+    missing = [
+        {"district": district, "block": block}
+        for (district, block), pair in resolved.items()
+        if pair is None or pair not in summary.index
+    ]
+    results = [
+        build_extras(*pair, daily_by_block[pair], summary.loc[pair], score=scores.get(pair))
+        for pair in pairs if pair in summary.index
+    ]
+    return FastJSONResponse({"results": results, "missing": missing})
+
+
+# -------------------
+# Sustainability Ranking
+# -------------------
+@app.get("/ranking")
+async def get_ranking(
+    district: Optional[str] = None,
+    window: int = Query(30, ge=2, le=365),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Blocks of a district (or the whole state) ranked by sustainability
+    score, all scored in one vectorized pass over the daily rollup.
+    """
+    exact = await resolve_district(district) if district else None
+    pairs = [
+        (row["district"], row["block"])
+        for row in await catalog.blocks_all()
+        if not exact or row["district"] == exact
+    ]
+    if not pairs:
+        raise HTTPException(status_code=404, detail="No blocks found")
+
+    stacked = stack_daily(await rollup.refresh_many(pairs))
+    if stacked.empty:
+        raise HTTPException(status_code=404, detail="No groundwater data found")
+
+    with span("score"):
+        scores = score_blocks(stacked, window=window)
+    scores = scores.sort_values("final_score_pct", ascending=False, na_position="last").head(limit)
+
+    ranking = []
+    for rank, ((block_district, block), row) in enumerate(scores.iterrows(), start=1):
+        row = row.to_dict()
+        ranking.append({
+            "rank": rank,
+            "district": block_district,
+            "block": block,
+            "final_score_pct": row.pop("final_score_pct"),
+            "components": row,
+        })
+    return FastJSONResponse({"district": district, "window_days": window, "count": len(ranking), "ranking": ranking})
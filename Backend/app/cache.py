@@ -0,0 +1,169 @@
+"""
+Small in-process caches.
+
+``TTLCache`` is a bounded LRU map whose entries expire after ``ttl``
+seconds. It keeps hit/miss counters so cache effectiveness can be
+reported by the API.
+
+``SizedCache`` is an LRU map bounded by the total size of its values
+(e.g. bytes of memory) rather than by entry count.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 256, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """
+        Unexpired value for ``key`` without touching LRU order or counters.
+        """
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] > time.monotonic():
+                return item[1]
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, loader):
+        """
+        Return the cached value for ``key``, calling ``loader()`` on a miss.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    async def aget_or_set(self, key, loader):
+        """
+        Async ``get_or_set``: ``loader()`` returns an awaitable.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = await loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=_MISSING):
+        """
+        Drop one key, or everything when called without arguments.
+        """
+        with self._lock:
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+
+class SizedCache:
+    def __init__(self, max_size: int, sizeof=len):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def peek(self, key, default=None):
+        """
+        Like ``get`` but without touching the LRU order or the counters.
+        """
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            return default if item is _MISSING else item[1]
+
+    def set(self, key, value):
+        """
+        Store ``value``, evicting least recently used entries to stay within
+        ``max_size``. Values larger than the whole budget are not stored.
+        """
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[0]
+            if size > self.max_size:
+                return
+            self._data[key] = (size, value)
+            self.size += size
+            while self.size > self.max_size:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self.size -= evicted
+
+    def invalidate(self, key=_MISSING):
+        with self._lock:
+            if key is _MISSING:
+                self._data.clear()
+                self.size = 0
+            else:
+                old = self._data.pop(key, None)
+                if old is not None:
+                    self.size -= old[0]
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "size": self.size,
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
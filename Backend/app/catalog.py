@@ -0,0 +1,102 @@
+"""
+Cached district/block catalog.
+
+The catalog only changes when new data is loaded, so lookups are served
+from a ``TTLCache``. The cache is warmed at API startup and cleared by
+``invalidate()`` after ingestion.
+
+The name index built from the catalog (``app.names``) turns whatever
+spelling a client sends into the exact stored (district, block) names.
+The well index (``app.spatial``) locates blocks by the coordinates in
+their latest snapshot.
+"""
+import asyncio
+import os
+
+from app.cache import TTLCache
+from app.db import latest, storage
+from app.metrics import span
+from app.names import NameIndex
+from app.spatial import WellIndex
+
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "3600"))
+CATALOG_MAX_ENTRIES = int(os.getenv("CATALOG_MAX_ENTRIES", "1024"))
+# concurrent snapshot reads while building the well index
+WELL_FETCH_CONCURRENCY = int(os.getenv("WELL_FETCH_CONCURRENCY", "16"))
+
+cache = TTLCache(maxsize=CATALOG_MAX_ENTRIES, ttl=CATALOG_TTL_SECONDS)
+
+
+async def districts() -> list:
+    return await cache.aget_or_set(("districts",), storage.districts)
+
+
+async def blocks(district: str) -> list:
+    key = ("blocks", district.strip().lower())
+    return await cache.aget_or_set(key, lambda: storage.blocks(district))
+
+
+async def blocks_all() -> list:
+    return await cache.aget_or_set(("blocks_all",), storage.blocks_all)
+
+
+async def index() -> NameIndex:
+    async def build():
+        return NameIndex((row["district"], row["block"]) for row in await blocks_all())
+
+    return await cache.aget_or_set(("index",), build)
+
+
+async def wells() -> WellIndex:
+    async def build():
+        rows = await blocks_all()
+        gate = asyncio.Semaphore(WELL_FETCH_CONCURRENCY)
+
+        async def locate(row):
+            async with gate:
+                snap = await latest.get(row["district"], row["block"])
+            if snap is None:
+                return None
+            return row["district"], row["block"], snap.get("latitude"), snap.get("longitude")
+
+        with span("spatial"):
+            located = await asyncio.gather(*(locate(row) for row in rows))
+            return WellIndex(w for w in located if w is not None)
+
+    return await cache.aget_or_set(("wells",), build)
+
+
+async def resolve_district(district: str):
+    """
+    Exact stored district name for ``district``, or None.
+    """
+    names = await index()
+    with span("resolve"):
+        return names.resolve_district(district)
+
+
+async def resolve(district: str, block: str):
+    """
+    Exact stored (district, block) for the given spellings, or None.
+    """
+    names = await index()
+    with span("resolve"):
+        return names.resolve(district, block)
+
+
+async def suggest(text: str, district: str = None, limit: int = 10) -> list:
+    return (await index()).search(text, district=district, limit=limit)
+
+
+async def warm():
+    """
+    Preload districts, each district's blocks, the name index and the
+    well index.
+    """
+    names, _ = await asyncio.gather(districts(), blocks_all())
+    await asyncio.gather(*(blocks(district) for district in names))
+    await asyncio.gather(index(), wells())
+
+
+def invalidate():
+    cache.invalidate()
@@ -0,0 +1,60 @@
+"""
+Request coalescing ("single flight").
+
+When many clients ask for the same block at once (a shared dashboard
+link), only the first request computes; requests arriving while that
+computation is in flight wait for it and receive the same result. Keys
+are built from the exact stored (district, block) names plus the
+parameters that change the result, so differently spelled requests for
+the same block coalesce too.
+
+The computation runs as its own task: a caller that disconnects does not
+cancel it for the others. Results are shared, so callers must treat them
+as read-only.
+"""
+import asyncio
+
+from app.metrics import COALESCE_COMPUTATIONS, COALESCED_REQUESTS, span
+
+
+class Coalescer:
+    def __init__(self):
+        self._inflight = {}  # (name, key) -> task
+        self._counts = {}  # name -> [computations, coalesced]
+
+    async def run(self, name: str, key, compute):
+        """
+        Result of ``compute()`` (a coroutine function) for ``key``, shared
+        with every concurrent call for the same ``name`` and ``key``.
+        """
+        flight = (name, key)
+        counts = self._counts.setdefault(name, [0, 0])
+        task = self._inflight.get(flight)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(compute())
+            self._inflight[flight] = task
+            task.add_done_callback(lambda done: self._done(flight, done))
+            counts[0] += 1
+            COALESCE_COMPUTATIONS.inc(1, name)
+            return await asyncio.shield(task)
+
+        counts[1] += 1
+        COALESCED_REQUESTS.inc(1, name)
+        with span("coalesced"):
+            return await asyncio.shield(task)
+
+    def _done(self, flight, task):
+        if self._inflight.get(flight) is task:
+            del self._inflight[flight]
+        if not task.cancelled():
+            task.exception()  # retrieved here so a failure nobody awaited is not logged
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "computations": computations,
+                "coalesced": coalesced,
+                "in_flight": sum(1 for n, _ in self._inflight if n == name),
+            }
+            for name, (computations, coalesced) in sorted(self._counts.items())
+        }
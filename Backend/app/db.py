@@ -1,84 +1,87 @@
-from supabase import create_client
 import os
+import httpx
 from dotenv import load_dotenv
 
+from app.anomaly import WellStats
+from app.forecast import ForecastEngine
+from app.latest import LatestReadings
+from app.rollup import DailyRollup
+from app.storage import make_storage
+
 load_dotenv()
 
 URL = os.getenv("SUPABASE_URL")
 KEY = os.getenv("SUPABASE_KEY")
 
-if not URL or not KEY:
-    raise RuntimeError("❌ Set SUPABASE_URL and SUPABASE_KEY in .env")
+# "supabase" (default) or "local" to serve from data/*.parquet without network
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
 
-client = create_client(URL, KEY)
+# Shared HTTP connection pool for every PostgREST request
+MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "50"))
+MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+REQUEST_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "20"))
 
-# -------------------------------
-# Fetch districts and blocks
-# -------------------------------
-def fetch_districts():
+
+def create_async_client(url: str, key: str):
     """
-    Get all unique districts in groundwater table.
+    Async PostgREST client backed by one bounded, keep-alive httpx pool.
     """
-    resp = client.table("groundwater").select("district").execute()
-    if not resp.data:
-        return []
-    districts = sorted({row["district"] for row in resp.data if row.get("district")})
-    return districts
+    from postgrest import AsyncPostgrestClient
 
+    class PooledPostgrestClient(AsyncPostgrestClient):
+        def create_session(self, base_url, headers, timeout, verify=True):
+            return httpx.AsyncClient(
+                base_url=base_url,
+                headers=headers,
+                timeout=timeout,
+                verify=verify,
+                follow_redirects=True,
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+            )
 
-def fetch_blocks(district: str):
-    """
-    Get all unique blocks in a given district.
-    """
-    resp = (
-        client.table("groundwater")
-        .select("block")
-        .ilike("district", district)
-        .execute()
+    return PooledPostgrestClient(
+        f"{url}/rest/v1",
+        headers={
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        },
+        timeout=REQUEST_TIMEOUT,
     )
-    if not resp.data:
-        return []
-    blocks = sorted({row["block"] for row in resp.data if row.get("block")})
-    return blocks
 
 
+client = None
+if STORAGE_BACKEND == "supabase":
+    if not URL or not KEY:
+        raise RuntimeError("❌ Set SUPABASE_URL and SUPABASE_KEY in .env (or STORAGE_BACKEND=local)")
+
+    client = create_async_client(URL, KEY)
+
+storage = make_storage(STORAGE_BACKEND, client)
+well_stats = WellStats()
+rollup = DailyRollup(storage, on_rows=well_stats.update)
+latest = LatestReadings(storage)
+forecasts = ForecastEngine(rollup)
+
 # -------------------------------
-# Fetch groundwater data
+# Fetch districts and blocks
 # -------------------------------
-def fetch_groundwater(district: str, block: str, limit: int = 1000):
+async def fetch_districts():
     """
-    Fetch groundwater readings for a district/block.
+    Get all unique districts in groundwater table.
     """
-    resp = (
-        client.table("groundwater")
-        .select(
-            "datetime_ts, water_level, rainfall_mm, specific_yield, district, block"
-        )
-        .ilike("district", district)
-        .ilike("block", block)
-        .order("datetime_ts", desc=True)
-        .limit(limit)
-        .execute()
-    )
-    return resp.data or []
+    return sorted(set(await storage.districts()))
 
 
-def fetch_block_data(district: str, block: str, limit: int = 1000):
+async def fetch_blocks(district: str):
     """
-    Fetch groundwater + water quality for a block.
+    Get all unique blocks in a given district.
     """
-    resp = (
-        client.table("groundwater")
-        .select(
-            "datetime_ts, water_level, rainfall_mm, specific_yield, district, block, aquifer_type, wq_ph, wq_ec, wq_cl, wq_f, wq_total_hardness"
-        )
-        .ilike("district", district)
-        .ilike("block", block)
-        .order("datetime_ts", desc=True)
-        .limit(limit)
-        .execute()
-    )
-    print(
-        f"🔍 Query for district={district}, block={block} returned {len(resp.data)} rows"
-    )
-    return resp.data or []
+    return sorted(set(await storage.blocks(district)))
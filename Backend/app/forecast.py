@@ -0,0 +1,218 @@
+"""
+Water-level forecasts per block.
+
+Each block's daily mean levels get a small least-squares model: an
+intercept and linear trend, plus annual Fourier terms once the block has
+a year of history. Fitting runs in a process pool, many blocks per task.
+The fitted parameters are cached per block together with the rollup's
+high-water mark they were fitted on; a block is refitted only after it
+received new readings.
+
+Serving a forecast evaluates the cached parameters (a few NumPy ops).
+A block whose data moved on keeps serving its previous model while the
+refit runs in the background; only a block never fitted before is fitted
+in the request.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from app.metrics import span
+
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", "2"))
+FIT_BATCH_BLOCKS = int(os.getenv("FORECAST_FIT_BATCH_BLOCKS", "64"))
+MIN_DAYS = 14
+YEAR_DAYS = 365.25
+MAX_HARMONICS = 2
+
+
+# -------------------------------
+# Model (runs in worker processes)
+# -------------------------------
+def _design(t: np.ndarray, scale: float, harmonics: int) -> np.ndarray:
+    columns = [np.ones_like(t), t / scale]
+    for k in range(1, harmonics + 1):
+        angle = 2 * np.pi * k * t / YEAR_DAYS
+        columns += [np.sin(angle), np.cos(angle)]
+    return np.column_stack(columns)
+
+
+def fit_series(days: list, levels: list):
+    """
+    Fit trend (+ annual seasonality) to daily levels. ``days`` are day
+    numbers (epoch days). Returns plain parameters, or None when there
+    are fewer than ``MIN_DAYS`` points.
+    """
+    t = np.asarray(days, dtype=np.float64)
+    y = np.asarray(levels, dtype=np.float64)
+    ok = ~np.isnan(y)
+    t, y = t[ok], y[ok]
+    if len(t) < MIN_DAYS:
+        return None
+
+    t0 = t[0]
+    t_span = max(t[-1] - t0, 1.0)
+    harmonics = min(int(t_span // YEAR_DAYS), MAX_HARMONICS)
+    x = _design(t - t0, t_span, harmonics)
+    coef, *_ = np.linalg.lstsq(x, y, rcond=None)
+    resid = y - x @ coef
+    dof = max(len(y) - x.shape[1], 1)
+    return {
+        "t0": float(t0),
+        "scale": float(t_span),
+        "harmonics": harmonics,
+        "coef": coef.tolist(),
+        "xtx_inv": np.linalg.pinv(x.T @ x).tolist(),
+        "sigma": float(np.sqrt(resid @ resid / dof)),
+        "n": int(len(y)),
+        "last_day": float(t[-1]),
+    }
+
+
+def fit_many(series: list) -> list:
+    """
+    ``fit_series`` for a batch of (days, levels), one pool task.
+    """
+    return [fit_series(days, levels) for days, levels in series]
+
+
+def predict(params: dict, days: np.ndarray, level: float = 0.95) -> pd.DataFrame:
+    """
+    Point forecast and ``level`` prediction interval for epoch ``days``.
+    """
+    x = _design(days - params["t0"], params["scale"], params["harmonics"])
+    mean = x @ np.asarray(params["coef"])
+    leverage = np.einsum("ij,jk,ik->i", x, np.asarray(params["xtx_inv"]), x)
+    half = NormalDist().inv_cdf(0.5 + level / 2) * params["sigma"] * np.sqrt(1 + leverage)
+    return pd.DataFrame({
+        "date": pd.to_datetime(days, unit="D").date,
+        "forecast_m": mean.round(3),
+        "lower_m": (mean - half).round(3),
+        "upper_m": (mean + half).round(3),
+    })
+
+
+def _epoch_days(dates) -> np.ndarray:
+    return pd.to_datetime(pd.Series(dates)).to_numpy(dtype="datetime64[D]").astype(np.int64)
+
+
+# -------------------------------
+# Engine
+# -------------------------------
+class ForecastEngine:
+    def __init__(self, rollup, workers: int = FORECAST_WORKERS):
+        self.rollup = rollup
+        self.workers = workers
+        self.models = {}  # (district, block) -> {"params", "version", "fitted_at"}
+        self._pool = None
+        self._refitting = set()
+        self._tasks = set()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def _fit(self, items: dict):
+        """
+        Fit {pair: (version, daily)} in the pool, ``FIT_BATCH_BLOCKS`` per task.
+        """
+        pairs = list(items)
+        loop = asyncio.get_running_loop()
+        batches = [pairs[i:i + FIT_BATCH_BLOCKS] for i in range(0, len(pairs), FIT_BATCH_BLOCKS)]
+
+        async def run(batch):
+            series = [
+                (_epoch_days(items[p][1]["date"]).tolist(), items[p][1]["mean_level"].astype(float).tolist())
+                for p in batch
+            ]
+            return batch, await loop.run_in_executor(self.pool, fit_many, series)
+
+        with span("fit"):
+            for batch, fitted in await asyncio.gather(*(run(b) for b in batches)):
+                now = time.time()
+                for pair, params in zip(batch, fitted):
+                    self.models[pair] = {"params": params, "version": items[pair][0], "fitted_at": now}
+
+    async def warm(self, pairs):
+        """
+        Fit every block up front (startup); failures only log.
+        """
+        try:
+            fitted = await self.refresh(pairs)
+            print(f"✅ Forecast models fitted for {fitted} blocks")
+        except Exception as e:
+            print(f"⚠️ Forecast warm-up failed: {e}")
+
+    async def refresh(self, pairs) -> int:
+        """
+        Refit every block in ``pairs`` whose daily data changed since its
+        model was fitted. Returns the number of blocks fitted.
+        """
+        daily = await self.rollup.refresh_many(pairs)
+        stale = {}
+        for pair, frame in daily.items():
+            version = self.rollup.version(*pair)
+            model = self.models.get(pair)
+            if model is None or model["version"] != version:
+                stale[pair] = (version, frame)
+        if stale:
+            await self._fit(stale)
+        return len(stale)
+
+    def _refit_later(self, pair):
+        if pair in self._refitting:
+            return
+        self._refitting.add(pair)
+
+        async def refit():
+            try:
+                await self.refresh([pair])
+            finally:
+                self._refitting.discard(pair)
+
+        task = asyncio.get_running_loop().create_task(refit())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def model(self, district: str, block: str):
+        """
+        Cached model of the block (fitted now only if it never was). A
+        model older than the block's data is returned as is and refitted
+        in the background.
+        """
+        pair = (district, block)
+        await self.rollup.refresh(*pair)
+        model = self.models.get(pair)
+        if model is None:
+            await self.refresh([pair])
+            return self.models.get(pair)
+        if model["version"] != self.rollup.version(*pair):
+            self._refit_later(pair)
+        return model
+
+    async def forecast(self, district: str, block: str, days: int = 30, level: float = 0.95):
+        """
+        (model, frame of date/forecast_m/lower_m/upper_m for the ``days``
+        after the last observed day), or (model, None) without enough data.
+        """
+        model = await self.model(district, block)
+        if model is None or model["params"] is None:
+            return model, None
+        params = model["params"]
+        horizon = params["last_day"] + np.arange(1, days + 1, dtype=np.float64)
+        with span("forecast"):
+            return model, predict(params, horizon, level)
+
+    def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,288 @@
+"""
+Streaming bulk ingestion of groundwater CSVs into Supabase.
+
+The CSV is read in bounded-memory chunks, each chunk is uploaded as one
+batch by a small worker pool, failed batches are retried with
+exponential backoff, and finished batches are recorded in a checkpoint
+file so an interrupted load resumes where it stopped.
+
+    python -m app.ingest all_groundwater.csv --workers 8
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TABLE_NAME = "groundwater"
+BATCH_SIZE = 500
+WORKERS = 8
+MAX_RETRIES = 5
+
+NUMERIC_COLUMNS = [
+    "water_level", "barometric",
+    "latitude", "longitude", "wq_distance_km",
+    "wq_ph", "wq_ec", "wq_cl", "wq_f",
+    "wq_total_hardness", "specific_yield"
+]
+
+EXPECTED_COLUMNS = [
+    "datetime", "water_level", "barometric",
+    "state", "district", "block", "site_name", "well_id",
+    "latitude", "longitude", "wq_distance_km", "wq_ph",
+    "wq_ec", "wq_cl", "wq_f", "wq_total_hardness",
+    "aquifer_type", "specific_yield"
+]
+
+
+# -------------------------------
+# Reading
+# -------------------------------
+def clean_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Coerce numeric columns and keep only the columns the table accepts.
+    """
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df[[c for c in EXPECTED_COLUMNS if c in df.columns]]
+
+
+def to_json_records(df: pd.DataFrame) -> list:
+    """
+    Records with NaN/Inf replaced by None for a JSON-safe upload.
+    """
+    df = df.replace([np.inf, -np.inf], np.nan)
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def iter_batches(csv_file: str, batch_size: int = BATCH_SIZE, skip=frozenset()):
+    """
+    Yield (batch_no, first_row, records) without loading the whole CSV.
+    Batches in ``skip`` (any container of batch numbers) are read but not
+    converted.
+    """
+    reader = pd.read_csv(csv_file, chunksize=batch_size, low_memory=False)
+    first_row = 0
+    for batch_no, chunk in enumerate(reader):
+        if batch_no not in skip:
+            yield batch_no, first_row, to_json_records(clean_chunk(chunk))
+        first_row += len(chunk)
+
+
+# -------------------------------
+# Checkpoint
+# -------------------------------
+class Checkpoint:
+    """
+    Completed batch numbers for one CSV, persisted as JSON.
+
+    Batches finish roughly in order, so the set is kept as a contiguous
+    high-water mark (every batch below ``below`` is done) plus the few
+    batches finished ahead of it. The file stays a few workers' worth of
+    numbers long, however many batches the load has.
+
+    The checkpoint is tied to the file's size, mtime and batch size; if
+    any of them changed the load starts over.
+    """
+
+    def __init__(self, path: str, csv_file: str, batch_size: int):
+        stat = os.stat(csv_file)
+        self.path = Path(path)
+        self.source = {
+            "csv": str(Path(csv_file).resolve()),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "batch_size": batch_size,
+        }
+        self.below = 0
+        self.ahead = set()
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            saved = json.loads(self.path.read_text())
+            if saved.get("source") == self.source:
+                self.below = saved.get("below", 0)
+                self.ahead = set(saved.get("done", []))
+                self._advance()
+
+    def __contains__(self, batch_no: int) -> bool:
+        return batch_no < self.below or batch_no in self.ahead
+
+    def __len__(self) -> int:
+        return self.below + len(self.ahead)
+
+    def _advance(self):
+        while self.below in self.ahead:
+            self.ahead.discard(self.below)
+            self.below += 1
+        self.ahead = {b for b in self.ahead if b > self.below}
+
+    def mark(self, batch_no: int):
+        with self._lock:
+            self.ahead.add(batch_no)
+            self._advance()
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"source": self.source, "below": self.below, "done": sorted(self.ahead)}))
+            tmp.replace(self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+# -------------------------------
+# Upload
+# -------------------------------
+def upload_with_retry(client, table: str, records: list, retries: int = MAX_RETRIES, on_conflict: str = None):
+    """
+    Insert one batch, retrying transient failures with exponential backoff.
+
+    With ``on_conflict`` the batch is upserted on those columns, which
+    makes a retry after an ambiguous failure idempotent.
+    """
+    for attempt in range(retries + 1):
+        try:
+            if on_conflict:
+                client.table(table).upsert(records, on_conflict=on_conflict).execute()
+            else:
+                client.table(table).insert(records).execute()
+            return
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = min(2 ** attempt, 30) * (0.5 + random.random())
+            print(f"⚠️ Batch upload failed ({e}); retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def run(
+    client,
+    csv_file: str,
+    table: str = TABLE_NAME,
+    batch_size: int = BATCH_SIZE,
+    workers: int = WORKERS,
+    retries: int = MAX_RETRIES,
+    checkpoint_file: str = None,
+    on_conflict: str = None,
+) -> dict:
+    """
+    Stream ``csv_file`` into ``table``. Returns a summary with rows/s.
+
+    At most ``2 * workers`` batches are held in memory at once.
+    """
+    checkpoint = Checkpoint(checkpoint_file or f"{csv_file}.checkpoint.json", csv_file, batch_size)
+    if len(checkpoint):
+        print(f"↩️ Resuming: {len(checkpoint)} batches already loaded")
+
+    uploaded = 0
+    started = time.monotonic()
+    pending = {}
+
+    def finish(done_futures):
+        """Checkpoint finished batches; return errors of batches that gave up."""
+        nonlocal uploaded
+        errors = []
+        for future in done_futures:
+            batch_no, first_row, n = pending.pop(future)
+            if future.exception() is not None:
+                errors.append(future.exception())
+                continue
+            checkpoint.mark(batch_no)
+            uploaded += n
+            rate = uploaded / max(time.monotonic() - started, 1e-9)
+            print(f"Inserted rows {first_row + 1}–{first_row + n} ({uploaded} this run, {rate:,.0f} rows/s)")
+        return errors
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch_no, first_row, records in iter_batches(csv_file, batch_size, skip=checkpoint):
+            if not records:
+                checkpoint.mark(batch_no)
+                continue
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                errors += finish(done)
+                if errors:
+                    break
+            future = pool.submit(upload_with_retry, client, table, records, retries, on_conflict)
+            pending[future] = (batch_no, first_row, len(records))
+        # let in-flight batches finish so they are checkpointed either way
+        errors += finish(wait(pending).done)
+
+    if errors:
+        print(f"❌ Stopped after {uploaded} rows; rerun to resume from the checkpoint")
+        raise errors[0]
+
+    elapsed = time.monotonic() - started
+    checkpoint.clear()
+    summary = {
+        "rows": uploaded,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(uploaded / elapsed, 1) if elapsed else None,
+    }
+    print(f"✅ Done: {summary['rows']} rows in {summary['seconds']}s ({summary['rows_per_second']} rows/s)")
+    return summary
+
+
+def notify_api(api_url: str, token: str = None):
+    """
+    Ask a running API to drop caches that depend on the loaded data,
+    authenticating with ``token`` (default: ``CACHE_INVALIDATE_TOKEN``).
+    """
+    import requests
+
+    token = token or os.getenv("CACHE_INVALIDATE_TOKEN")
+    if not token:
+        print("⚠️ CACHE_INVALIDATE_TOKEN not set; skipping cache invalidation")
+        return
+    try:
+        requests.post(
+            f"{api_url}/cache/invalidate", headers={"X-Invalidate-Token": token}, timeout=10,
+        ).raise_for_status()
+        print(f"✅ Catalog cache invalidated at {api_url}")
+    except requests.RequestException as e:
+        print(f"⚠️ Could not invalidate catalog cache at {api_url}: {e}")
+
+
+def main():
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Stream a groundwater CSV into Supabase")
+    parser.add_argument("csv_file")
+    parser.add_argument("--table", default=TABLE_NAME)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (default: <csv>.checkpoint.json)")
+    parser.add_argument("--on-conflict", default=None, help="upsert on these columns, e.g. well_id,datetime")
+    parser.add_argument("--api-url", default=os.getenv("API_URL"), help="running API to notify when done")
+    args = parser.parse_args()
+
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise SystemExit("❌ Set SUPABASE_URL and SUPABASE_KEY in .env")
+
+    run(
+        create_client(url, key),
+        args.csv_file,
+        table=args.table,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        retries=args.retries,
+        checkpoint_file=args.checkpoint,
+        on_conflict=args.on_conflict,
+    )
+    if args.api_url:
+        notify_api(args.api_url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Latest-reading snapshot per block.
+
+The dashboard header shows the newest reading of a block: timestamp,
+water level, rainfall, aquifer type and water quality. One storage query
+fetches all of those columns (plus the well's coordinates); the row is
+kept in a ``TTLCache`` and served to every endpoint that needs part of
+it. Snapshots are re-read after ``LATEST_REFRESH_SECONDS``, or on the
+next read after ``expire``, which ``/cache/invalidate`` calls once new
+data was loaded.
+"""
+import asyncio
+import os
+import time
+
+from app.cache import TTLCache
+from app.rollup import block_key
+
+LATEST_COLUMNS = [
+    "datetime_ts", "district", "block", "water_level", "rainfall_mm",
+    "aquifer_type", "specific_yield", "latitude", "longitude",
+    "wq_ph", "wq_ec", "wq_cl", "wq_f", "wq_total_hardness",
+]
+
+LATEST_REFRESH_SECONDS = float(os.getenv("LATEST_REFRESH_SECONDS", "300"))
+LATEST_MAX_BLOCKS = int(os.getenv("LATEST_MAX_BLOCKS", "4096"))
+
+
+class LatestReadings:
+    def __init__(self, storage, refresh_seconds: float = LATEST_REFRESH_SECONDS):
+        self.storage = storage
+        self.cache = TTLCache(maxsize=LATEST_MAX_BLOCKS, ttl=refresh_seconds)
+        self._locks = {}
+
+    async def snapshot(self, district: str, block: str) -> dict:
+        """
+        {"row": newest reading or None, "fetched_at": epoch seconds} for the
+        exact (district, block). Concurrent misses share one query.
+        """
+        key = block_key(district, block)
+        snap = self.cache.get(key)
+        if snap is not None:
+            return snap
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            snap = self.cache.peek(key)
+            if snap is None:
+                row = await self.storage.latest(district, block, LATEST_COLUMNS)
+                snap = {"row": row, "fetched_at": time.time()}
+                self.cache.set(key, snap)
+        return snap
+
+    async def get(self, district: str, block: str):
+        """
+        Newest reading of the block as a record, or None if it has none.
+        """
+        return (await self.snapshot(district, block))["row"]
+
+    def expire(self):
+        """
+        Drop every snapshot so the next read fetches from storage.
+        """
+        self.cache.invalidate()
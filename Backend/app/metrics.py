@@ -0,0 +1,228 @@
+"""
+Request instrumentation.
+
+Code wraps each expensive stage in ``with span("db"):``. Inside a request
+the stage timings are summed per request and sent back as a
+``Server-Timing`` header; everywhere they also feed the process-wide
+histograms and counters that ``/metrics`` renders in the Prometheus text
+format. Spans outside a request (startup, background work) only update
+the histograms.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; covers sub-millisecond cache hits up to slow cold renders
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, n) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = _labels((*self.labelnames, "le"), (*labels, bound))
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _labels((*self.labelnames, "le"), (*labels, "+Inf"))
+                lines.append(f"{self.name}_bucket{le} {n}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route", "status")
+)
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Time spent per processing stage.", ("stage",))
+ROWS_FETCHED = Counter("storage_rows_fetched_total", "Rows returned by storage queries.", ("backend",))
+COALESCE_COMPUTATIONS = Counter(
+    "coalesce_computations_total", "Computations started on behalf of coalesced requests.", ("name",)
+)
+COALESCED_REQUESTS = Counter(
+    "coalesced_requests_total", "Requests that joined an identical in-flight computation.", ("name",)
+)
+
+# callables returning {name: TTLCache-style stats()} rendered at scrape time
+_cache_sources = []
+
+
+def register_caches(source):
+    """
+    Report the caches returned by ``source()`` (name -> cache) on /metrics.
+    """
+    _cache_sources.append(source)
+
+
+# -------------------------------
+# Spans
+# -------------------------------
+@contextmanager
+def span(stage: str):
+    """
+    Time a stage. Durations of the same stage add up within a request.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def rows_fetched(backend: str, n: int):
+    ROWS_FETCHED.inc(n, backend)
+    timings = _timings.get()
+    if timings is not None:
+        timings["rows"] = timings.get("rows", 0) + n
+
+
+def start_request() -> dict:
+    """
+    Begin collecting spans for the current request; returns the dict they
+    are written to.
+    """
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def server_timing(timings: dict, total: float) -> str:
+    """
+    ``Server-Timing`` header value (durations in ms, rows as a description).
+    """
+    parts = [
+        f"{stage};dur={seconds * 1000:.2f}"
+        for stage, seconds in timings.items()
+        if stage != "rows"
+    ]
+    if "rows" in timings:
+        parts.append(f'rows;desc="{timings["rows"]}"')
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware: collects the spans of each HTTP request, adds them as
+    a ``Server-Timing`` header and records the request latency by route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = start_request()
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(timings, time.perf_counter() - started)
+                message["headers"] = [*message.get("headers", []), (b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], path, status)
+
+
+# -------------------------------
+# Exposition
+# -------------------------------
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = REQUEST_SECONDS.render() + STAGE_SECONDS.render() + ROWS_FETCHED.render()
+    lines += COALESCE_COMPUTATIONS.render() + COALESCED_REQUESTS.render()
+
+    stats = {}
+    for source in _cache_sources:
+        for name, cache in source().items():
+            stats[name] = cache.stats()
+    gauges = [
+        ("cache_hits_total", "counter", "Cache hits.", "hits"),
+        ("cache_misses_total", "counter", "Cache misses.", "misses"),
+        ("cache_hit_ratio", "gauge", "Hits / lookups since start.", "hit_rate"),
+        ("cache_entries", "gauge", "Entries currently cached.", "size"),
+    ]
+    for name, kind, help, field in gauges:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for cache_name, s in sorted(stats.items()):
+            value = s.get("entries", s.get(field)) if field == "size" else s.get(field)
+            if value is not None:
+                lines.append(f"{name}{_labels(('cache',), (cache_name,))} {_number(value)}")
+    return "\n".join(lines) + "\n"
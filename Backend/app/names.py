@@ -0,0 +1,185 @@
+"""
+District/block name resolution.
+
+Clients send names in many spellings: any case, underscores or hyphens
+for spaces, and only part of the long site-style block names such as
+"Barauli Ahir_Dav Degree College_ Kundal" (administrative block, then
+the monitoring site). ``NameIndex`` maps all of these to the exact
+(district, block) keys stored in the database, so data queries can use
+exact matches instead of ``ilike '%…%'`` scans.
+
+Resolution only accepts a name's key or a site-style alias; anything
+looser (prefixes, typos) is left to ``search``, which answers
+autocomplete and the suggestions sent with a 404.
+"""
+import bisect
+import difflib
+import re
+
+FUZZY_CUTOFF = 0.85
+SUGGEST_CUTOFF = 0.6
+
+
+def name_key(text: str) -> str:
+    """
+    Comparison key for a name: lowercase, with runs of spaces, underscores
+    and hyphens collapsed to one space.
+    """
+    if not text:
+        return ""
+    return re.sub(r"[_\-\s]+", " ", text.strip().lower()).strip()
+
+
+def block_aliases(block: str) -> set:
+    """
+    Alternative keys for a site-style block name: the administrative block
+    (first "_" segment) and the site part (the rest).
+    """
+    parts = [p for p in (name_key(s) for s in block.split("_")) if p]
+    aliases = set()
+    if len(parts) > 1:
+        aliases.add(parts[0])
+        aliases.add(" ".join(parts[1:]))
+    return aliases
+
+
+class NameIndex:
+    """
+    Immutable index over the catalog's (district, block) pairs.
+    """
+
+    def __init__(self, pairs):
+        self.districts = {}        # key -> exact district
+        self.blocks = {}           # (district key, block key) -> (district, block)
+        self.by_block = {}         # block key -> {(district, block)}
+        self.aliases = {}          # alias key -> {(district, block)}
+        terms = []                 # (term, kind, district, block) for prefix search
+
+        for district, block in pairs:
+            if not district or not block:
+                continue
+            district, block = district.strip(), block.strip()
+            dkey, bkey = name_key(district), name_key(block)
+            if dkey not in self.districts:
+                self.districts[dkey] = district
+                terms += [(t, "district", district, None) for t in _word_suffixes(dkey)]
+            self.blocks[(dkey, bkey)] = (district, block)
+            self.by_block.setdefault(bkey, set()).add((district, block))
+            for alias in block_aliases(block):
+                self.aliases.setdefault(alias, set()).add((district, block))
+            terms += [(t, "block", district, block) for t in _word_suffixes(bkey)]
+
+        self._terms = sorted(set(terms), key=lambda t: (t[0], t[1], t[2], t[3] or ""))
+        self._term_keys = [t[0] for t in self._terms]
+
+    # ---------------------------
+    # Resolution
+    # ---------------------------
+    def resolve_district(self, text: str):
+        """
+        Exact district name for ``text``, or None if it is unknown.
+        """
+        return self.districts.get(name_key(text))
+
+    def _match_district(self, text: str):
+        """
+        District for a partial or misspelt ``text`` (exact key, unique
+        prefix, then fuzzy match), or None. Only used by ``search``.
+        """
+        key = name_key(text)
+        if not key:
+            return None
+        if key in self.districts:
+            return self.districts[key]
+        starts = [d for k, d in self.districts.items() if k.startswith(key)]
+        if len(starts) == 1:
+            return starts[0]
+        close = difflib.get_close_matches(key, list(self.districts), n=1, cutoff=FUZZY_CUTOFF)
+        return self.districts[close[0]] if close else None
+
+    def resolve(self, district: str, block: str):
+        """
+        Exact (district, block) for the given spellings, or None.
+
+        Tried in order, each only if it yields a single block: exact key,
+        then site-style alias. ``district`` may be empty to look in every
+        district.
+        """
+        bkey = name_key(block)
+        if not bkey:
+            return None
+        dkey = None
+        if district:
+            exact = self.resolve_district(district)
+            if exact is None:
+                return None
+            dkey = name_key(exact)
+
+        def in_district(found):
+            return {v for v in found if dkey is None or name_key(v[0]) == dkey}
+
+        found = in_district(self.by_block.get(bkey, ()))
+        if len(found) == 1:
+            return found.pop()
+
+        found = in_district(self.aliases.get(bkey, ()))
+        if len(found) == 1:
+            return found.pop()
+        return None
+
+    # ---------------------------
+    # Lookup
+    # ---------------------------
+    def search(self, text: str, district: str = None, limit: int = 10) -> list:
+        """
+        Districts and blocks matching ``text``: names with a word starting
+        with it first, then fuzzy matches. Optionally within one district,
+        which may itself be partial or misspelt.
+        """
+        key = name_key(text)
+        dkey = None
+        if district:
+            exact = self._match_district(district)
+            if exact is None:
+                return []
+            dkey = name_key(exact)
+
+        results, seen = [], set()
+
+        def add(kind, d, b):
+            if (kind, d, b) in seen or len(results) >= limit:
+                return
+            if dkey is not None and name_key(d) != dkey:
+                return
+            if kind == "district" and dkey is not None:
+                return
+            seen.add((kind, d, b))
+            results.append({"type": kind, "district": d, "block": b, "label": b or d})
+
+        if key:
+            start = bisect.bisect_left(self._term_keys, key)
+            matches = []
+            for term, kind, d, b in self._terms[start:]:
+                if not term.startswith(key):
+                    break
+                # whole-name prefixes rank ahead of later-word prefixes
+                whole = term == name_key(b or d)
+                matches.append((not whole, kind != "district", b or d, kind, d, b))
+            for *_, kind, d, b in sorted(matches):
+                add(kind, d, b)
+
+        if len(results) < limit and key:
+            names = {}
+            for k, d in self.districts.items():
+                names.setdefault(k, []).append(("district", d, None))
+            for (_, k), (d, b) in self.blocks.items():
+                names.setdefault(k, []).append(("block", d, b))
+            for k in difflib.get_close_matches(key, list(names), n=limit, cutoff=SUGGEST_CUTOFF):
+                for kind, d, b in names[k]:
+                    add(kind, d, b)
+        return results
+
+
+def _word_suffixes(key: str) -> list:
+    words = key.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words))]
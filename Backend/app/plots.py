@@ -0,0 +1,96 @@
+"""
+Plot rendering service.
+
+Charts are drawn with matplotlib's object-oriented Agg API (no pyplot
+global state) in a process pool, so rendering neither blocks the event
+loop nor races between concurrent requests. Rendered PNGs are cached
+under a hash of the block, the window and the daily data being drawn,
+so an unchanged chart is rendered once.
+"""
+import asyncio
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from app.cache import TTLCache
+from app.metrics import span
+
+PLOT_WORKERS = int(os.getenv("PLOT_WORKERS", "2"))
+PLOT_CACHE_SIZE = int(os.getenv("PLOT_CACHE_SIZE", "512"))
+PLOT_CACHE_TTL_SECONDS = float(os.getenv("PLOT_CACHE_TTL_SECONDS", "86400"))
+
+
+def render_mean_levels(dates: list, levels: list) -> bytes:
+    """
+    Render the daily mean water level chart to PNG bytes.
+
+    Runs inside a worker process, so it only takes plain lists.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(dates, levels, marker="o", linestyle="-", label="Mean Level")
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Mean Water Level (m)")
+    ax.set_title(f"Daily Mean Water Level (last {len(dates)} days)")
+    ax.legend()
+    fig.tight_layout()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def plot_key(kind: str, district: str, block: str, days: int, data: pd.DataFrame) -> str:
+    """
+    Content address for a chart: what is drawn, for whom, and from which data.
+    """
+    digest = hashlib.sha256(f"{kind}|{district.lower()}|{block.lower()}|{days}".encode())
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class PlotService:
+    def __init__(self, workers: int = PLOT_WORKERS):
+        self.workers = workers
+        self.cache = TTLCache(maxsize=PLOT_CACHE_SIZE, ttl=PLOT_CACHE_TTL_SECONDS)
+        self._pool = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def mean_levels_png(self, district: str, block: str, days: int, daily: pd.DataFrame) -> bytes:
+        """
+        PNG bytes for the last ``days`` of ``daily`` (date, mean_level_m).
+        """
+        key = plot_key("mean_levels", district, block, days, daily)
+        png = self.cache.get(key)
+        if png is None:
+            loop = asyncio.get_running_loop()
+            with span("plot"):
+                png = await loop.run_in_executor(
+                    self.pool,
+                    render_mean_levels,
+                    [pd.Timestamp(d).to_pydatetime() for d in daily["date"]],
+                    daily["mean_level_m"].astype(float).tolist(),
+                )
+            self.cache.set(key, png)
+        return png
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+plots = PlotService()
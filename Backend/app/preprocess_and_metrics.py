@@ -1,11 +1,23 @@
+import json
+import os
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
-from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.cache import SizedCache
+from app.rollup import aggregate_daily
+from app.schema import canonical_name, canonicalize, compact, is_canonical
 
 # -------------------------
 # Paths
 # -------------------------
 DATA_DIR = Path("data")
+MERGED_CSV = DATA_DIR / "groundwater_merged.csv"
+PARTITION_DIR = DATA_DIR / "partitioned"
+MANIFEST_NAME = "manifest.json"
 
 # Prefer "parquet_chunks", fallback to "parquets"
 if (DATA_DIR / "parquet_chunks").exists():
@@ -15,73 +27,345 @@ else:
 
 PARQUET_DIR.mkdir(parents=True, exist_ok=True)
 
+# Memory budget for parsed district frames kept by load_district()
+FRAME_CACHE_MB = float(os.getenv("FRAME_CACHE_MB", "256"))
+
+# -------------------------
+# Merged CSV layout
+# -------------------------
+DATETIME_FORMAT = "%d-%m-%Y %H:%M"
+
+# Raw headers as they appear in groundwater_merged.csv. Columns with
+# placeholder cells ("-", unit fragments) are read as text and coerced by
+# canonicalize(); everything else is parsed as float straight away.
+MERGED_DTYPES = {
+    "datetime": str,
+    "district": str,
+    "block": str,
+    "aquifier_type": str,
+    "water level": "float64",
+    "barometric (hpa)": "float64",
+    "latitude": "float64",
+    "longitude": "float64",
+    "wq_ph": "float64",
+    "wq_ec_(?s/cm_at": str,
+    "wq_co3_(mg/l)": "float64",
+    "wq_hco3": str,
+    "wq_cl_(mg/l)": "float64",
+    "wq_f_(mg/l)": "float64",
+    "wq_so4": str,
+    "wq_no3": str,
+    "wq_po4": str,
+    "wq_total_hardness": str,
+    "wq_ca_(mg/l)": "float64",
+    "wq_mg_(mg/l)": "float64",
+    "wq_na_(mg/l)": "float64",
+    "wq_k_(mg/l)": "float64",
+    "wq_fe_(ppm)": "float64",
+    "wq_as_(ppb)": "float64",
+    "wq_u_(ppb)": "float64",
+    "yield_percent": "float64",
+    "rainfall_mm": "float64",
+}
+
 
 # -------------------------
 # Functions
 # -------------------------
 
-def preprocess_and_chunk():
+def read_merged_csv(path=MERGED_CSV) -> pd.DataFrame:
     """
-    Dummy placeholder. 
-    In your pipeline this should generate parquet files into PARQUET_DIR.
+    Parse the merged CSV with fixed dtypes and datetime format, renamed to
+    the canonical schema. Names keep their stored spelling (only surrounding
+    whitespace is stripped); lookups compare them case-insensitively.
     """
-    print(f"✅ Using parquet directory: {PARQUET_DIR}")
+    df = pd.read_csv(path, dtype=MERGED_DTYPES, na_values=["-"], keep_default_na=True)
+    df["datetime"] = pd.to_datetime(df["datetime"], format=DATETIME_FORMAT)
+    df = canonicalize(df)
+    for col in ("district", "block"):
+        df[col] = df[col].str.strip()
+    return df.dropna(subset=["datetime_ts", "district", "block"])
+
 
+def _ts(value) -> str:
+    return pd.Timestamp(value).isoformat()
 
-def load_district(district: str) -> pd.DataFrame:
+
+def preprocess_and_chunk(csv_path=MERGED_CSV, out_dir=PARTITION_DIR, water_quality=None, match_year=False) -> dict:
     """
-    Load one district parquet file into a DataFrame.
-    District name should match filename (case insensitive).
+    Build the partitioned Parquet store from the merged CSV.
+
+    With ``water_quality`` (a lab-sample CSV) the ``wq_*`` columns are
+    re-joined from the nearest sample first (see ``app.water_quality``).
+
+    Writes ``district=<name>/month=<YYYY-MM>/part-0.parquet`` under
+    ``out_dir``, each file sorted by block and time with one row group per
+    block, plus a ``manifest.json`` listing every file and row group with
+    its block, row count and time range. Returns the manifest.
     """
-    fname = district.lower().replace(" ", "_") + ".parquet"
-    path = PARQUET_DIR / fname
-    if not path.exists():
-        raise FileNotFoundError(f"No parquet file found for {district} at {path}")
-    return pd.read_parquet(path)
+    out_dir = Path(out_dir)
+    df = read_merged_csv(csv_path)
+    if water_quality is not None:
+        from app.water_quality import join_water_quality, load_samples
+
+        df = join_water_quality(df, load_samples(water_quality), match_year=match_year)
+    df["month"] = df["datetime_ts"].dt.strftime("%Y-%m")
+    df = df.sort_values(["district", "month", "block", "datetime_ts"], kind="stable")
+
+    # rebuild from scratch so partitions of removed data do not linger
+    for old in out_dir.glob("district=*/month=*/*.parquet"):
+        old.unlink()
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    files = []
+    for (district, month), part in df.groupby(["district", "month"], sort=True):
+        part = part.drop(columns="month").reset_index(drop=True)
+        rel = Path(f"district={district}") / f"month={month}" / "part-0.parquet"
+        (out_dir / rel).parent.mkdir(parents=True, exist_ok=True)
+
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        blocks, starts = np.unique(part["block"].to_numpy(), return_index=True)
+        order = np.argsort(starts)
+        blocks, starts = blocks[order], starts[order]
+        ends = np.append(starts[1:], len(part))
+
+        row_groups = []
+        with pq.ParquetWriter(out_dir / rel, table.schema, write_statistics=True) as writer:
+            for index, (block, start, end) in enumerate(zip(blocks, starts, ends)):
+                writer.write_table(table.slice(start, end - start), row_group_size=end - start)
+                ts = part["datetime_ts"].iloc[start:end]
+                row_groups.append({
+                    "index": index,
+                    "block": block,
+                    "rows": int(end - start),
+                    "min_ts": _ts(ts.min()),
+                    "max_ts": _ts(ts.max()),
+                })
+
+        files.append({
+            "path": rel.as_posix(),
+            "district": district,
+            "month": month,
+            "rows": len(part),
+            "min_ts": _ts(part["datetime_ts"].min()),
+            "max_ts": _ts(part["datetime_ts"].max()),
+            "row_groups": row_groups,
+        })
+
+    manifest = {
+        "source": str(csv_path),
+        "rows": int(sum(f["rows"] for f in files)),
+        "columns": [c for c in df.columns if c != "month"],
+        "files": files,
+    }
+    tmp = out_dir / f"{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    tmp.replace(out_dir / MANIFEST_NAME)
+    print(f"✅ Wrote {manifest['rows']} rows in {len(files)} partitions to {out_dir}")
+    return manifest
+
+
+_manifests = {}
+
+
+def load_manifest(root=PARTITION_DIR):
+    """
+    Manifest of the partitioned store, or None if it was never built.
+    Re-read only when the file changes.
+    """
+    path = Path(root) / MANIFEST_NAME
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _manifests.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, json.loads(path.read_text()))
+        _manifests[path] = cached
+    return cached[1]
+
+
+def scan_partitioned(district=None, block=None, start=None, end=None, columns=None, root=PARTITION_DIR) -> pd.DataFrame:
+    """
+    Read readings from the partitioned store, touching only the files and
+    row groups whose district, block and time range can match.
+
+    Names match case-insensitively; ``start``/``end`` are inclusive.
+    """
+    manifest = load_manifest(root)
+    if manifest is None:
+        raise FileNotFoundError(f"No partitioned store at {root}; run preprocess_and_chunk()")
+
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    def overlaps(item) -> bool:
+        return (start is None or pd.Timestamp(item["max_ts"]) >= start) and (
+            end is None or pd.Timestamp(item["min_ts"]) <= end
+        )
+
+    wanted_cols = None
+    if columns:
+        wanted_cols = list(dict.fromkeys([*columns, "datetime_ts"])) if start or end else list(columns)
+
+    frames = []
+    for f in manifest["files"]:
+        if district and f["district"].lower() != district.strip().lower():
+            continue
+        if not overlaps(f):
+            continue
+        groups = [
+            g["index"] for g in f["row_groups"]
+            if (not block or g["block"].lower() == block.strip().lower()) and overlaps(g)
+        ]
+        if groups:
+            pf = pq.ParquetFile(Path(root) / f["path"])
+            frames.append(pf.read_row_groups(groups, columns=wanted_cols).to_pandas())
+
+    if not frames:
+        return pd.DataFrame(columns=columns or manifest["columns"])
+    df = pd.concat(frames, ignore_index=True)
+    if start is not None:
+        df = df[df["datetime_ts"] >= start]
+    if end is not None:
+        df = df[df["datetime_ts"] <= end]
+    return df[list(columns)].reset_index(drop=True) if columns else df.reset_index(drop=True)
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+# Parsed district frames keyed by (source files + mtimes, columns, block)
+frames = SizedCache(int(FRAME_CACHE_MB * 1024 * 1024), sizeof=frame_nbytes)
+
+
+def _legacy_path(district: str) -> Path:
+    """
+    Per-district parquet file, matched case-insensitively ("agra" -> Agra.parquet).
+    """
+    stem = district.strip().lower().replace(" ", "_")
+    for path in sorted(PARQUET_DIR.glob("*.parquet")):
+        if path.stem.lower().replace(" ", "_") == stem:
+            return path
+    raise FileNotFoundError(f"No parquet file found for {district} in {PARQUET_DIR}")
+
+
+def _district_sources(district: str):
+    """
+    (partitioned, ((path, mtime_ns), ...)) for the files holding a district.
+    """
+    manifest = load_manifest(PARTITION_DIR)
+    if manifest is not None:
+        paths = [
+            PARTITION_DIR / f["path"] for f in manifest["files"]
+            if f["district"].lower() == district.strip().lower()
+        ]
+        if not paths:
+            raise FileNotFoundError(f"No partitions found for {district} in {PARTITION_DIR}")
+    else:
+        paths = [_legacy_path(district)]
+    return manifest is not None, tuple((str(p), p.stat().st_mtime_ns) for p in paths)
+
+
+def _read_district(district: str, partitioned: bool, files, columns=None, block=None) -> pd.DataFrame:
+    """
+    Read a district from disk, pushing the column and block selection down
+    to the Parquet reader where the layout allows it.
+    """
+    if partitioned:
+        return compact(scan_partitioned(district=district, block=block, columns=columns, root=PARTITION_DIR))
+
+    path = Path(files[0][0])
+    raw = {}
+    for name in pq.read_schema(path).names:
+        raw.setdefault(canonical_name(name), name)
+    read_cols = None
+    if columns:
+        wanted = list(dict.fromkeys([*columns, "block"] if block else columns))
+        read_cols = [raw[c] for c in wanted if c in raw]
+    df = canonicalize(pd.read_parquet(path, columns=read_cols))
+    return compact(_select(df, columns, block))
+
+
+def _select(df: pd.DataFrame, columns=None, block=None) -> pd.DataFrame:
+    if block:
+        df = df[df["block"].str.lower() == block.strip().lower()]
+    if columns:
+        df = df[[c for c in columns if c in df.columns]]
+    return df.reset_index(drop=True)
+
+
+def _drop_stale(files):
+    """
+    Evict cached frames built from an older version of any of ``files``.
+    """
+    current = dict(files)
+    for key in frames.keys():
+        if key[0] != files and any(current.get(p, m) != m for p, m in key[0]):
+            frames.invalidate(key)
+
+
+def load_district(district: str, columns=None, block=None) -> pd.DataFrame:
+    """
+    Load one district (optionally only ``columns`` and one ``block``) as a
+    canonical, typed DataFrame.
+
+    Reads from the partitioned store when it has been built, otherwise
+    from the per-district parquet file. Parsed frames are cached in memory
+    (bounded by FRAME_CACHE_MB) and dropped when a source file changes; a
+    cached whole district also serves column/block subsets. Treat the
+    result as read-only.
+    """
+    partitioned, files = _district_sources(district)
+    full_key = (files, None, None)
+    key = (files, tuple(columns) if columns else None, block.strip().lower() if block else None)
+    if key != full_key and frames.peek(full_key) is not None:
+        key = full_key
+
+    df = frames.get(key)
+    if df is None:
+        _drop_stale(files)
+        if key == full_key:
+            df = _read_district(district, partitioned, files)
+        else:
+            df = _read_district(district, partitioned, files, columns, block)
+        frames.set(key, df)
+
+    if key == full_key and (columns or block):
+        df = _select(df, columns, block)
+    return df.copy(deep=False)
 
 
 def compute_daily(df: pd.DataFrame, block: str = None) -> pd.DataFrame:
     """
     Resample groundwater data to daily averages.
     Includes rainfall and yield if available.
+
+    Uses the same daily aggregation as the API rollup (app.rollup).
     """
+    if not is_canonical(df):
+        df = canonicalize(df)
     if block:
         df = df.loc[
             df["block"].astype(str).str.strip().str.title() == block.strip().title()
         ]
-    if df.empty:
+    if df.empty or "water_level" not in df.columns:
         return pd.DataFrame()
 
-    df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce")
-    df = df.dropna(subset=["datetime"])
-    df = df.set_index("datetime")
-
-    # Find water level column
-    wl_col = next(
-        (c for c in df.columns if "water" in c.lower() and "level" in c.lower()), None
-    )
-    if not wl_col:
+    daily = aggregate_daily(df)
+    if daily.empty:
         return pd.DataFrame()
 
-    # Daily mean water level
-    daily = df.resample("D")[wl_col].mean().to_frame("mean_level")
-
-    # Daily rainfall (sum, mm)
-    rain_col = next((c for c in df.columns if "rain" in c.lower()), None)
-    if rain_col:
-        daily["rainfall_mm"] = df[rain_col].resample("D").sum(min_count=1)
-
-    # Yield % (take last known / median as block property)
-    yield_col = next((c for c in df.columns if "yield" in c.lower()), None)
-    if yield_col:
-        daily["yield_percent"] = df[yield_col].resample("D").median()
+    daily = daily.rename(columns={"specific_yield": "yield_percent"})
+    daily.insert(0, "datetime", pd.to_datetime(daily.pop("date")))
 
     # Daily fluctuation
     daily["delta_h_m"] = daily["mean_level"].diff()
     # Convert fluctuation to equivalent recharge in mm (proxy)
     daily["delta_h_eq_mm"] = daily["delta_h_m"] * -1000  # negative = decline
 
-    return daily.reset_index()
+    return daily
 
 
 def compute_score(daily_df: pd.DataFrame) -> dict:
@@ -0,0 +1,274 @@
+"""
+Response encoding.
+
+``FastJSONResponse`` renders with orjson: NumPy arrays and scalars,
+dates and pandas timestamps are encoded natively and NaN/Inf become
+null. Handlers that build large payloads return it directly to skip
+FastAPI's ``jsonable_encoder`` pass.
+
+``frame_response`` negotiates tabular (time-series) payloads on the
+Accept header: Arrow IPC stream for ``application/vnd.apache.arrow.stream``,
+otherwise column-oriented JSON.
+
+``ndjson_chunk`` / ``csv_chunk`` encode one page of a streamed export.
+
+``CompressionMiddleware`` compresses responses with brotli (if the
+``brotli`` package is installed) or gzip, whichever the client prefers.
+Already-compressed or binary bodies (images, Arrow IPC, octet streams)
+are sent as they are.
+"""
+import datetime
+import decimal
+import zlib
+
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+from fastapi.responses import JSONResponse, Response
+
+from app.metrics import span
+from app.schema import widen
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+COMPRESS_MIN_BYTES = 1024
+# media type prefixes not worth compressing
+INCOMPRESSIBLE_TYPES = ("image/", "application/vnd.apache.arrow", "application/octet-stream")
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _default(value):
+    if isinstance(value, pd.Timestamp):
+        return None if pd.isna(value) else value.isoformat()
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson-rendered JSON; its encoding time is the "encode" stage."""
+
+    def render(self, content) -> bytes:
+        with span("encode"):
+            return dumps(content)
+
+
+# -------------------------------
+# Tabular payloads
+# -------------------------------
+def wants_arrow(request) -> bool:
+    return ARROW_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def columns_json(df: pd.DataFrame) -> dict:
+    """
+    {column: [values]} straight from the NumPy arrays (no per-row dicts).
+    Datetime columns become ISO strings, date objects ISO dates.
+    """
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            out[col] = values.to_numpy(dtype="datetime64[s]")
+        elif values.dtype == object:
+            out[col] = values.where(values.notna(), None).tolist()
+        else:
+            out[col] = values.to_numpy()
+    return out
+
+
+def arrow_bytes(df: pd.DataFrame, metadata: dict = None) -> bytes:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({k: str(v) for k, v in metadata.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def frame_response(request, df: pd.DataFrame, meta: dict = None, json_body: dict = None) -> Response:
+    """
+    ``df`` as Arrow IPC when the client accepts it, else JSON: ``json_body``
+    if given, otherwise ``{**meta, "columns": {col: [...]}}``.
+    """
+    if wants_arrow(request):
+        with span("encode"):
+            body = arrow_bytes(df, meta)
+        return Response(body, media_type=ARROW_MEDIA_TYPE, headers={"Vary": "Accept"})
+    if json_body is None:
+        json_body = {**(meta or {}), "columns": columns_json(df)}
+    return FastJSONResponse(json_body, headers={"Vary": "Accept"})
+
+
+# -------------------------------
+# Streamed exports
+# -------------------------------
+def _export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(**{c: widen(df[c]) for c in df.columns if df[c].dtype == "float32"})
+
+
+def ndjson_chunk(df: pd.DataFrame) -> bytes:
+    """
+    One JSON object per row, newline-terminated (NaN/NaT -> null).
+    """
+    with span("encode"):
+        records = _export_frame(df).to_dict(orient="records")
+        return b"".join(dumps(record) + b"\n" for record in records)
+
+
+def csv_chunk(df: pd.DataFrame, header: bool) -> bytes:
+    with span("encode"):
+        return _export_frame(df).to_csv(index=False, header=header).encode()
+
+
+# -------------------------------
+# Compression
+# -------------------------------
+def _accepted_encodings(header: str) -> dict:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+def compressible(headers) -> bool:
+    """
+    Whether a response with these (raw ASGI) headers should be compressed.
+    """
+    for key, value in headers:
+        if key.lower() == b"content-encoding":
+            return False
+        if key.lower() == b"content-type" and value.decode("latin-1").lower().startswith(INCOMPRESSIBLE_TYPES):
+            return False
+    return True
+
+
+def choose_encoding(header: str):
+    accepted = _accepted_encodings(header or "")
+    options = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(options, key=lambda e: (accepted.get(e, accepted.get("*", 0.0)), e == "br"))
+    return best if accepted.get(best, accepted.get("*", 0.0)) > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data)
+        return self._c.compress(data)
+
+    def finish(self) -> bytes:
+        return self._c.finish() if self.encoding == "br" else self._c.flush()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies of at least ``minimum_size``
+    bytes with the best encoding the client accepts (br, then gzip).
+    Streaming bodies are compressed chunk by chunk; see ``compressible``
+    for what is skipped.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if start is not None:
+                response_headers = start.get("headers", [])
+                if not compressible(response_headers) or (not more and len(body) < self.minimum_size):
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                response_headers = [
+                    (k, v) for k, v in response_headers
+                    if k.lower() not in (b"content-length", b"vary")
+                ]
+                vary = [v for k, v in start.get("headers", []) if k.lower() == b"vary"]
+                vary_value = b", ".join(vary + [b"Accept-Encoding"])
+                response_headers += [(b"content-encoding", encoding.encode()), (b"vary", vary_value)]
+                if not more:
+                    with span("compress"):
+                        body = compressor.compress(body) + compressor.finish()
+                    response_headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": response_headers})
+                    start = None
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({**start, "headers": response_headers})
+                start = None
+
+            if compressor is None:
+                await send(message)
+                return
+            with span("compress"):
+                chunk = compressor.compress(body)
+                if not more:
+                    chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,339 @@
+"""
+Per-block daily rollup shared by every analytics endpoint.
+
+Raw readings are reduced once to per-day partial sums and counts. New
+readings are folded into those partials incrementally (only rows newer
+than the block's high-water mark are fetched), so building the daily
+frame for a request no longer depends on how much raw history exists.
+The first load pages through the block's full history, folding at most
+``FOLD_ROWS`` raw rows at a time.
+
+Rows loaded at or before a block's high-water mark (backfills, batches
+committed out of order) are not seen by a top-up; ``invalidate`` marks
+blocks for a full rebuild, which replaces their partials in one swap.
+"""
+import asyncio
+import contextlib
+import os
+import time
+
+import pandas as pd
+
+from app.metrics import span
+from app.schema import frame_bytes, widen
+
+MEAN_COLUMNS = [
+    "water_level", "rainfall_mm", "specific_yield",
+    "wq_ph", "wq_ec", "wq_cl", "wq_f", "wq_total_hardness",
+]
+READING_COLUMNS = ["datetime_ts", "district", "block", "aquifer_type", "barometric"] + MEAN_COLUMNS
+
+BATCH_QUERY_BLOCKS = int(os.getenv("ROLLUP_BATCH_QUERY_BLOCKS", "10"))
+REFRESH_SECONDS = float(os.getenv("ROLLUP_REFRESH_SECONDS", "300"))
+# raw rows buffered from storage pages before they are folded
+FOLD_ROWS = int(os.getenv("ROLLUP_FOLD_ROWS", "50000"))
+COUNT_DTYPE = "int32"
+
+
+# -------------------------------
+# Aggregation
+# -------------------------------
+def daily_partials(df: pd.DataFrame, keys=()) -> pd.DataFrame:
+    """
+    Reduce raw readings to per-day sums/counts, grouped by ``keys`` + date.
+
+    Partials can be concatenated and re-reduced with ``merge_partials``,
+    which is what makes incremental updates exact.
+    """
+    df = df.copy()
+    df["datetime_ts"] = pd.to_datetime(df["datetime_ts"], errors="coerce")
+    df = df.dropna(subset=["datetime_ts", "water_level"]).sort_values("datetime_ts")
+
+    cols = [c for c in MEAN_COLUMNS if c in df.columns]
+    # sums accumulate in float64 even when the readings are held as float32
+    df[cols] = df[cols].apply(pd.to_numeric, errors="coerce").apply(widen)
+    df["date"] = df["datetime_ts"].dt.normalize()
+    if "aquifer_type" not in df.columns:
+        df["aquifer_type"] = None
+
+    grouped = df.groupby([*keys, "date"], sort=True, observed=True)
+    sums = grouped[cols].sum().add_suffix("__sum")
+    counts = grouped[cols].count().astype(COUNT_DTYPE).add_suffix("__n")
+    extra = grouped.agg(aquifer_type=("aquifer_type", "last"), last_ts=("datetime_ts", "max"))
+    return _compact_partials(pd.concat([sums, counts, extra], axis=1))
+
+
+def _compact_partials(partials: pd.DataFrame) -> pd.DataFrame:
+    """
+    Partials held per block: int32 counts and a categorical aquifer type.
+    """
+    if partials["aquifer_type"].dtype == object:
+        partials["aquifer_type"] = partials["aquifer_type"].astype("category")
+    return partials
+
+
+def merge_partials(*parts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Combine partial frames that share the same index levels.
+    """
+    parts = [p for p in parts if p is not None and not p.empty]
+    if not parts:
+        return pd.DataFrame()
+    if len(parts) == 1:
+        return parts[0]
+
+    df = pd.concat(parts).sort_values("last_ts")
+    agg = {c: "sum" for c in df.columns if c.endswith(("__sum", "__n"))}
+    agg.update({"aquifer_type": "last", "last_ts": "max"})
+    merged = df.groupby(level=list(range(df.index.nlevels)), sort=True).agg(agg)
+    counts = [c for c in merged.columns if c.endswith("__n")]
+    merged[counts] = merged[counts].astype(COUNT_DTYPE)
+    return _compact_partials(merged)
+
+
+def finalize_daily(partials: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn partials into the daily frame used by scoring and analytics:
+    date, mean_level, rainfall_mm, specific_yield, aquifer_type, wq_*.
+    """
+    if partials.empty:
+        return pd.DataFrame()
+
+    daily = pd.DataFrame(index=partials.index)
+    for col in MEAN_COLUMNS:
+        if f"{col}__sum" in partials.columns:
+            n = partials[f"{col}__n"]
+            daily[col] = partials[f"{col}__sum"].where(n > 0) / n.where(n > 0)
+    daily["aquifer_type"] = partials["aquifer_type"]
+    daily = daily.rename(columns={"water_level": "mean_level"}).reset_index()
+    daily["date"] = daily["date"].dt.date
+    return daily
+
+
+def aggregate_daily(df: pd.DataFrame, keys=()) -> pd.DataFrame:
+    """
+    One-shot daily aggregation of raw readings (no store involved).
+    """
+    return finalize_daily(daily_partials(df, keys))
+
+
+def stack_daily(daily_by_block: dict) -> pd.DataFrame:
+    """
+    Stack {(district, block): daily} into one frame with district/block columns.
+    """
+    frames = {key: daily for key, daily in daily_by_block.items() if not daily.empty}
+    if not frames:
+        return pd.DataFrame()
+    stacked = pd.concat(frames, names=["district", "block", "row"])
+    return stacked.reset_index(level=["district", "block"]).reset_index(drop=True)
+
+
+# -------------------------------
+# Store
+# -------------------------------
+def block_key(district: str, block: str) -> tuple:
+    return (district.strip().lower(), block.strip().lower())
+
+
+def _empty_state() -> dict:
+    """
+    Aggregates of a block before anything was folded in.
+    """
+    return {"partials": pd.DataFrame(), "daily": pd.DataFrame(), "high_water": None, "readings": 0}
+
+
+class DailyRollup:
+    """
+    In-memory daily aggregates per (district, block).
+
+    A block is loaded from storage on first use. After that it is topped
+    up with readings newer than its high-water mark at most once every
+    ``refresh_seconds``. After ``invalidate`` (which ``/cache/invalidate``
+    calls once new data was loaded) the next read rebuilds it from its
+    full history.
+    """
+
+    def __init__(self, storage, refresh_seconds: float = REFRESH_SECONDS, on_rows=None):
+        self.storage = storage
+        self.refresh_seconds = refresh_seconds
+        # called with every batch of newly folded raw rows (e.g. WellStats.update)
+        self.on_rows = on_rows
+        self._blocks = {}
+
+    def _entry(self, key: tuple) -> dict:
+        entry = self._blocks.get(key)
+        if entry is None:
+            entry = {
+                **_empty_state(),
+                "checked_at": 0.0,
+                "rebuild": False,
+                "generation": 0,
+                "lock": asyncio.Lock(),
+            }
+            self._blocks[key] = entry
+        return entry
+
+    def _fold(self, rows: pd.DataFrame, entries: dict):
+        """
+        Fold raw readings into ``entries`` ({key: entry}) in one grouped pass.
+
+        Rows at or below an entry's high-water mark were already counted
+        and are dropped. Callers hold the entries' locks.
+        """
+        if rows.empty:
+            return
+        with span("daily"):
+            rows = rows.assign(
+                _district=rows["district"].str.strip().str.lower(),
+                _block=rows["block"].str.strip().str.lower(),
+            )
+            marks = pd.Series(
+                {key: entry["high_water"] for key, entry in entries.items() if entry["high_water"] is not None},
+                dtype=object,
+            )
+            if not marks.empty:
+                row_keys = pd.MultiIndex.from_frame(rows[["_district", "_block"]])
+                mark = pd.to_datetime(marks.reindex(row_keys).to_numpy())
+                fresh = mark.isna() | (pd.to_datetime(rows["datetime_ts"]).to_numpy() > mark)
+                rows = rows[fresh]
+
+            if self.on_rows is not None:
+                held = pd.MultiIndex.from_frame(rows[["_district", "_block"]]).isin(list(entries))
+                self.on_rows(rows[held].drop(columns=["_district", "_block"]))
+
+            partials = daily_partials(rows, keys=("_district", "_block"))
+            for key, part in partials.groupby(level=[0, 1], sort=False):
+                entry = entries.get(key)
+                if entry is None:
+                    continue
+                part = part.droplevel([0, 1])
+                entry["partials"] = merge_partials(entry["partials"], part)
+                entry["daily"] = finalize_daily(entry["partials"])
+                entry["readings"] += int(part["water_level__n"].sum())
+                entry["high_water"] = entry["partials"]["last_ts"].max()
+
+    async def refresh(self, district: str, block: str, force: bool = False) -> dict:
+        """
+        Fetch readings newer than the block's high-water mark, if due.
+        ``district`` and ``block`` are the exact stored names.
+        """
+        key = block_key(district, block)
+        entry = self._entry(key)
+        async with entry["lock"]:
+            now = time.monotonic()
+            if not force and now - entry["checked_at"] < self.refresh_seconds:
+                return entry
+            await self._load_due([(district, block)], {key: entry}, now)
+        return entry
+
+    async def _load(self, pairs, entries: dict):
+        """
+        Page through every reading of ``pairs`` past their high-water
+        marks, folding into ``entries`` every ``FOLD_ROWS`` rows.
+        """
+        marks = [entries[block_key(d, b)]["high_water"] for d, b in pairs]
+        since = None if any(m is None for m in marks) else min(marks)
+        pending, buffered = [], 0
+        async for rows in self.storage.pages(pairs, READING_COLUMNS, since=since):
+            pending.append(rows)
+            buffered += len(rows)
+            if buffered >= FOLD_ROWS:
+                self._fold(pd.concat(pending, ignore_index=True), entries)
+                pending, buffered = [], 0
+        if pending:
+            self._fold(pd.concat(pending, ignore_index=True), entries)
+
+    async def _load_due(self, pairs, due: dict, now: float):
+        """
+        Load ``pairs`` (their ``due`` entries locked by the caller),
+        ``BATCH_QUERY_BLOCKS`` per query. Blocks marked for rebuild are
+        loaded from scratch into a fresh state that replaces theirs once
+        complete, so readers never see a half-built block.
+        """
+        targets = {key: _empty_state() if entry["rebuild"] else entry for key, entry in due.items()}
+        chunks = [pairs[i:i + BATCH_QUERY_BLOCKS] for i in range(0, len(pairs), BATCH_QUERY_BLOCKS)]
+        await asyncio.gather(*(self._load(chunk, targets) for chunk in chunks))
+        for key, entry in due.items():
+            if targets[key] is not entry:
+                entry.update(targets[key], rebuild=False, generation=entry["generation"] + 1)
+            entry["checked_at"] = now
+
+    async def refresh_many(self, pairs, force: bool = False) -> dict:
+        """
+        Refresh several blocks with a few concurrent storage queries.
+
+        Stale blocks are paged through ``BATCH_QUERY_BLOCKS`` per query,
+        the batches run concurrently, and each page is folded in one
+        grouped pass. ``pairs`` are exact (district, block) names. Returns
+        {(district, block): daily frame} for every requested pair.
+        """
+        pairs = list(dict.fromkeys(pairs))
+        entries = {block_key(d, b): self._entry(block_key(d, b)) for d, b in pairs}
+        async with contextlib.AsyncExitStack() as held:
+            # in key order so overlapping calls cannot deadlock; the stack
+            # releases exactly the locks taken, even if cancelled midway
+            for key in sorted(entries):
+                await held.enter_async_context(entries[key]["lock"])
+            now = time.monotonic()
+            due = {
+                key: entry for key, entry in entries.items()
+                if force or now - entry["checked_at"] >= self.refresh_seconds
+            }
+            if due:
+                due_pairs = [(d, b) for d, b in pairs if block_key(d, b) in due]
+                await self._load_due(due_pairs, due, now)
+            return {(d, b): entries[block_key(d, b)]["daily"] for d, b in pairs}
+
+    async def daily(self, district: str, block: str) -> pd.DataFrame:
+        """
+        Daily frame for a block (oldest first). Treat it as read-only.
+        """
+        return (await self.refresh(district, block))["daily"]
+
+    async def info(self, district: str, block: str) -> dict:
+        entry = await self.refresh(district, block)
+        return {
+            "readings": entry["readings"],
+            "daily_rows": len(entry["daily"]),
+            "high_water": entry["high_water"],
+        }
+
+    def version(self, district: str, block: str):
+        """
+        (rebuilds, high-water mark, readings folded) of a held block, or
+        None. It changes exactly when new readings are folded in or the
+        block is rebuilt.
+        """
+        entry = self._blocks.get(block_key(district, block))
+        return None if entry is None else (entry["generation"], entry["high_water"], entry["readings"])
+
+    def memory(self) -> dict:
+        """
+        Bytes held for partials and daily frames, in total and per district.
+        """
+        districts = {}
+        for (district, _), entry in list(self._blocks.items()):
+            held = districts.setdefault(district, {"blocks": 0, "bytes": 0})
+            held["blocks"] += 1
+            held["bytes"] += frame_bytes(entry["partials"]) + frame_bytes(entry["daily"])
+        return {
+            "total": {
+                "blocks": sum(d["blocks"] for d in districts.values()),
+                "bytes": sum(d["bytes"] for d in districts.values()),
+            },
+            "district": dict(sorted(districts.items())),
+        }
+
+    def invalidate(self, district: str = None, block: str = None):
+        """
+        Rebuild every held block (or one) from its full history on its
+        next read, picking up rows loaded at or before its high-water
+        mark. The current daily frames are served until then.
+        """
+        if district is None or block is None:
+            entries = list(self._blocks.values())
+        else:
+            entries = [e for e in [self._blocks.get(block_key(district, block))] if e is not None]
+        for entry in entries:
+            entry["rebuild"] = True
+            entry["checked_at"] = 0.0
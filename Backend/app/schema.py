@@ -0,0 +1,149 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# -------------------------------
+# Canonical column names
+# -------------------------------
+# The Supabase ``groundwater`` table is the reference schema. The local
+# Parquet exports carry the raw CSV headers ("water level",
+# "wq_ec_(?s/cm_at", "aquifier_type", ...) and are renamed to these names
+# when they are loaded.
+READING_COLUMNS = [
+    "datetime_ts", "water_level", "barometric",
+    "state", "district", "block", "site_name", "well_id",
+    "latitude", "longitude", "wq_distance_km",
+    "wq_ph", "wq_ec", "wq_cl", "wq_f", "wq_total_hardness",
+    "aquifer_type", "specific_yield", "rainfall_mm",
+]
+
+STRING_COLUMNS = ["state", "district", "block", "site_name", "well_id", "aquifer_type"]
+
+COLUMN_ALIASES = {
+    "datetime": "datetime_ts",
+    "aquifier_type": "aquifer_type",
+    "yield_percent": "specific_yield",
+}
+
+
+def canonical_name(column: str) -> str:
+    """
+    Map a raw CSV/Parquet header to its canonical column name.
+
+    Unit suffixes such as "(hpa)" or "_(mg/l)" are dropped and the
+    remaining words are joined with underscores.
+    """
+    name = column.strip().lower()
+    name = re.sub(r"_?\(.*$", "", name)
+    name = re.sub(r"[\s\-]+", "_", name).strip("_")
+    return COLUMN_ALIASES.get(name, name)
+
+
+def canonicalize(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rename columns to canonical names and coerce numeric fields.
+
+    Cells that cannot be parsed as numbers (e.g. "-" or corrupted lab
+    values) become NaN.
+    """
+    df = df.rename(columns={c: canonical_name(c) for c in df.columns})
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    if "datetime_ts" in df.columns:
+        df["datetime_ts"] = pd.to_datetime(df["datetime_ts"], errors="coerce")
+
+    for col in df.columns:
+        if col in STRING_COLUMNS or col == "datetime_ts":
+            continue
+        if df[col].dtype == object:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    for col in ("district", "block", "aquifer_type"):
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].str.strip()
+    return df
+
+
+def is_canonical(df: pd.DataFrame) -> bool:
+    """
+    True if ``df`` already has canonical names and a parsed ``datetime_ts``,
+    so ``canonicalize`` would have nothing to do.
+    """
+    return (
+        "datetime_ts" in df.columns
+        and pd.api.types.is_datetime64_any_dtype(df["datetime_ts"])
+        and all(canonical_name(c) == c for c in df.columns)
+    )
+
+
+# -------------------------------
+# Compact in-memory dtypes
+# -------------------------------
+# Repeated names are held as categoricals (one small integer code per
+# row) and sensor / water-quality readings (float or integer lab values)
+# as float32, which keeps their 6-7 significant digits. Coordinates stay float64. ``datetime_ts`` stays
+# datetime64[ns], i.e. an int64 epoch count with datetime semantics.
+CATEGORY_COLUMNS = STRING_COLUMNS
+FLOAT64_COLUMNS = ["latitude", "longitude"]
+FLOAT32_DIGITS = 7
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    ``df`` with the shared compact dtypes applied to the columns it has.
+    """
+    dtypes = {}
+    for col in df.columns:
+        kind = df[col].dtype
+        if col in CATEGORY_COLUMNS:
+            if kind == object:
+                dtypes[col] = "category"
+        elif col in FLOAT64_COLUMNS or col == "datetime_ts":
+            continue
+        elif kind == "float64" or pd.api.types.is_integer_dtype(kind):
+            dtypes[col] = "float32"
+    return df.astype(dtypes) if dtypes else df
+
+
+def widen(values: pd.Series) -> pd.Series:
+    """
+    float32 values as the float64 numbers they were parsed from (17.55,
+    not 17.549999237...): rounded to the 7 significant digits float32
+    holds.
+    """
+    if values.dtype != "float32":
+        return values
+    x = values.to_numpy(dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        digits = np.where(x == 0, 0, FLOAT32_DIGITS - np.ceil(np.log10(np.abs(x))))
+    scale = 10.0 ** np.nan_to_num(digits)
+    return pd.Series(np.round(x * scale) / scale, index=values.index, name=values.name)
+
+
+def frame_bytes(df: pd.DataFrame, dictionaries: bool = True) -> int:
+    """
+    Deep memory usage of ``df``. With ``dictionaries=False`` categorical
+    columns count only their codes (their categories are shared).
+    """
+    total = 0
+    for col in df.columns:
+        values = df[col]
+        if not dictionaries and isinstance(values.dtype, pd.CategoricalDtype):
+            total += values.cat.codes.to_numpy().nbytes
+        else:
+            total += values.memory_usage(deep=True, index=False)
+    return int(total)
+
+
+def memory_report(df: pd.DataFrame, by: str = "district") -> dict:
+    """
+    {"total": {"rows", "bytes"}, by: {value: {"rows", "bytes"}}} for ``df``.
+    Per-group bytes leave out the shared categorical dictionaries, which
+    the total counts once.
+    """
+    groups = {}
+    if by in df.columns and not df.empty:
+        for key, part in df.groupby(by, observed=True, sort=True):
+            groups[str(key)] = {"rows": len(part), "bytes": frame_bytes(part, dictionaries=False)}
+    return {"total": {"rows": len(df), "bytes": frame_bytes(df)}, by: groups}
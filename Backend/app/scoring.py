@@ -1,6 +1,24 @@
 import pandas as pd
 import numpy as np
 
+DEFAULT_WEIGHTS = {
+    "level_deviation": 0.30,
+    "storage_trend": 0.20,
+    "recharge_efficiency": 0.20,
+    "extraction_pressure": 0.10,
+    "threshold_penalty": 0.10,
+    "yield_factor": 0.10
+}
+
+DEFAULT_THRESHOLDS = {
+    "WL_deviation_max_m": 10.0,             # critical deviation
+    "storage_negativity_max": 2.0,          # m level drop over 30d
+    "critical_depth_m": 50.0,               # below 50m is severe
+    "max_recharge_efficiency": 0.5,         # max 50% rain → recharge
+    "ideal_yield_percent": 30.0             # target good aquifer yield
+}
+
+
 def compute_sustainability_score(
     daily_df: pd.DataFrame,
     rainfall_col: str = "rainfall_mm",
@@ -38,23 +56,10 @@ def compute_sustainability_score(
     # Default weights and thresholds
     # ---------------------------
     if weights is None:
-        weights = {
-            "level_deviation": 0.30,
-            "storage_trend": 0.20,
-            "recharge_efficiency": 0.20,
-            "extraction_pressure": 0.10,
-            "threshold_penalty": 0.10,
-            "yield_factor": 0.10
-        }
+        weights = DEFAULT_WEIGHTS
 
     if thresholds is None:
-        thresholds = {
-            "WL_deviation_max_m": 10.0,             # critical deviation
-            "storage_negativity_max": 2.0,          # m level drop over 30d
-            "critical_depth_m": 50.0,               # below 50m is severe
-            "max_recharge_efficiency": 0.5,         # max 50% rain → recharge
-            "ideal_yield_percent": 30.0             # target good aquifer yield
-        }
+        thresholds = DEFAULT_THRESHOLDS
 
     # ---------------------------
     # Prep data
@@ -151,6 +156,115 @@ def compute_sustainability_score(
     }
 
 
+SCORE_COLUMNS = [
+    "baseline", "latest",
+    "score_level_dev", "score_storage", "score_recharge",
+    "score_extraction", "score_threshold", "score_yield",
+    "final_score_pct",
+]
+
+
+def score_blocks(
+    daily_df: pd.DataFrame,
+    keys=("district", "block"),
+    window: int = 30,
+    rainfall_col: str = "rainfall_mm",
+    yield_col: str = "yield_percent",
+    weights: dict = None,
+    thresholds: dict = None
+) -> pd.DataFrame:
+    """
+    Vectorized ``compute_sustainability_score`` for many blocks at once.
+
+    Parameters
+    ----------
+    daily_df : pd.DataFrame
+        Daily frames of several blocks stacked together: the ``keys``
+        columns, 'date', 'mean_level' and optionally rainfall/yield.
+    keys : tuple
+        Columns identifying a block.
+    window : int
+        Number of most recent days scored per block, i.e. the
+        ``daily.tail(window)`` the per-block endpoints pass in.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per block (indexed by ``keys``) with the same components
+        as ``compute_sustainability_score``.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    keys = list(keys)
+
+    df = daily_df.sort_values([*keys, "date"], kind="stable")
+    df = df.groupby(keys, sort=False).tail(window)
+    grouped = df.groupby(keys, sort=False)
+    level = df["mean_level"]
+
+    # baseline = first 30 valid days, latest = last valid day
+    valid = df[level.notna()]
+    baseline = valid.groupby(keys).head(30).groupby(keys)["mean_level"].mean()
+    latest = valid.groupby(keys)["mean_level"].last()
+    out = pd.DataFrame({"baseline": baseline, "latest": latest})
+
+    # Factor 1: Level deviation
+    wl_dev = (out["latest"] - out["baseline"]).abs()
+    out["score_level_dev"] = 1 - (wl_dev / thresholds["WL_deviation_max_m"]).clip(upper=1)
+
+    # Factor 2: Storage trend (avg change in last 30 days)
+    recent = grouped.tail(30)
+    recent_grouped = recent.groupby(keys)
+    storage_change = recent_grouped["mean_level"].diff().groupby([recent[k] for k in keys]).mean()
+    score_storage = 1 - (storage_change.abs() / thresholds["storage_negativity_max"]).clip(upper=1)
+    out["score_storage"] = score_storage.where(recent_grouped.size() >= 2, 0.5)
+
+    # Factor 3: Recharge efficiency
+    out["score_recharge"] = 0.5
+    if rainfall_col in df.columns:
+        rainy = df[df[rainfall_col] > 0]
+        re_eff = rainy.groupby(keys)["mean_level"].diff() / rainy[rainfall_col]
+        re_eff = re_eff.groupby([rainy[k] for k in keys]).mean()
+        score_recharge = (re_eff / thresholds["max_recharge_efficiency"]).clip(lower=0, upper=1)
+        # like the per-block score: 0.5 only for blocks without rainy days,
+        # NaN when a block's rainy days give no efficiency
+        rainy_blocks = rainy.groupby(keys).size().index
+        out["score_recharge"] = score_recharge.reindex(out.index).where(out.index.isin(rainy_blocks), 0.5)
+
+    # Factor 4: Extraction pressure (fraction of days with negative Δh)
+    delta_h = grouped["mean_level"].diff()
+    neg_days = (delta_h < 0).groupby([df[k] for k in keys]).sum()
+    total_days = grouped.size() - 1
+    out["score_extraction"] = (1 - neg_days / total_days.where(total_days > 0)).fillna(0.5)
+
+    # Factor 5: Threshold penalty
+    out["score_threshold"] = np.where(out["latest"] > thresholds["critical_depth_m"], 0, 1)
+
+    # Factor 6: Aquifer yield factor
+    fallback_yield = thresholds["ideal_yield_percent"] / 2  # assume poor yield if missing
+    if yield_col in df.columns:
+        median_yield = grouped[yield_col].median().fillna(fallback_yield)
+    else:
+        median_yield = pd.Series(fallback_yield, index=out.index)
+    out["score_yield"] = (median_yield / thresholds["ideal_yield_percent"]).clip(upper=1)
+
+    # Combine all
+    final_score = (
+        out["score_level_dev"] * weights["level_deviation"] +
+        out["score_storage"] * weights["storage_trend"] +
+        out["score_recharge"] * weights["recharge_efficiency"] +
+        out["score_extraction"] * weights["extraction_pressure"] +
+        out["score_threshold"] * weights["threshold_penalty"] +
+        out["score_yield"] * weights["yield_factor"]
+    )
+
+    components = ["score_level_dev", "score_storage", "score_recharge",
+                  "score_extraction", "score_threshold", "score_yield"]
+    out[components] = out[components].round(3)
+    out["final_score_pct"] = (final_score * 100).round(2)
+    return out[SCORE_COLUMNS]
+
+
 # ---------------------------
 # Example usage
 # ---------------------------
@@ -0,0 +1,178 @@
+"""
+Precomputed per-block response snapshots.
+
+Readings arrive at most every few hours, yet ``/score`` and ``/extras``
+used to rebuild their payloads on every request. ``BlockSnapshots`` keeps
+one payload set per block, tagged with the rollup version it was built
+from, and a background loop rebuilds them: every ``SNAPSHOT_INTERVAL_SECONDS``
+and right after ``trigger()`` (called when new data was loaded). Each pass
+refreshes the rollup for all blocks and rebuilds only the blocks whose
+version moved, ``SNAPSHOT_BATCH_BLOCKS`` at a time, with the bulk scorer.
+
+Reads are stale-while-revalidate: a snapshot older than ``max_age`` (or
+behind the rollup) is still served, and a rebuild of that block is
+started in the background. Only a block that has no snapshot yet is
+built in the request.
+"""
+import asyncio
+import os
+import time
+
+from app.metrics import span
+
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300"))
+SNAPSHOT_BATCH_BLOCKS = int(os.getenv("SNAPSHOT_BATCH_BLOCKS", "64"))
+
+
+class BlockSnapshots:
+    def __init__(self, rollup, build, pairs, interval: float = SNAPSHOT_INTERVAL_SECONDS):
+        """
+        ``build({pair: daily frame})`` returns {pair: {name: payload}};
+        ``pairs()`` is awaited for the exact (district, block) of every block.
+        """
+        self.rollup = rollup
+        self.build = build
+        self.pairs = pairs
+        self.interval = interval
+        self.max_age = interval
+        self.snapshots = {}  # (district, block) -> {"payloads", "version", "computed_at", "checked_at"}
+        self.passes = 0
+        self.last_pass = None
+        self._wake = asyncio.Event()
+        self._loop_task = None
+        self._revalidating = set()
+        self._tasks = set()
+
+    async def refresh(self, pairs) -> int:
+        """
+        Bring the rollup of ``pairs`` up to date and rebuild the snapshots
+        whose data changed. Returns the number of blocks rebuilt.
+        """
+        pairs = list(dict.fromkeys(pairs))
+        daily = await self.rollup.refresh_many(pairs)
+        now = time.time()
+        stale = {}
+        for pair in pairs:
+            version = self.rollup.version(*pair)
+            snap = self.snapshots.get(pair)
+            if snap is None or snap["version"] != version:
+                stale[pair] = version
+            else:
+                snap["checked_at"] = now
+        if stale:
+            with span("snapshot"):
+                built = self.build({pair: daily[pair] for pair in stale})
+            now = time.time()
+            for pair, version in stale.items():
+                self.snapshots[pair] = {
+                    "payloads": built.get(pair, {}),
+                    "version": version,
+                    "computed_at": now,
+                    "checked_at": now,
+                }
+        return len(stale)
+
+    async def refresh_all(self) -> int:
+        """
+        One scheduler pass over every block, in batches.
+        """
+        started = time.monotonic()
+        pairs = await self.pairs()
+        rebuilt = 0
+        for i in range(0, len(pairs), SNAPSHOT_BATCH_BLOCKS):
+            rebuilt += await self.refresh(pairs[i:i + SNAPSHOT_BATCH_BLOCKS])
+            await asyncio.sleep(0)  # let requests in between batches
+        # drop blocks that are no longer in the catalog
+        for pair in set(self.snapshots) - set(pairs):
+            self.snapshots.pop(pair, None)
+        self.passes += 1
+        self.last_pass = {
+            "finished_at": time.time(),
+            "seconds": round(time.monotonic() - started, 3),
+            "blocks": len(pairs),
+            "rebuilt": rebuilt,
+        }
+        return rebuilt
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                await self.refresh_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Snapshot pass failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """
+        Start the background loop (first pass right away).
+        """
+        if self._loop_task is None:
+            self._loop_task = asyncio.get_running_loop().create_task(self._run())
+
+    def trigger(self):
+        """
+        Run the next pass now instead of at the end of the interval.
+        """
+        self._wake.set()
+
+    def _revalidate(self, pair):
+        if pair in self._revalidating:
+            return
+        self._revalidating.add(pair)
+
+        async def revalidate():
+            try:
+                await self.refresh([pair])
+            finally:
+                self._revalidating.discard(pair)
+
+        task = asyncio.get_running_loop().create_task(revalidate())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get(self, district: str, block: str):
+        """
+        Snapshot of the exact (district, block), built now only if the
+        block never had one. A snapshot older than ``max_age`` or behind
+        the rollup is returned as is and rebuilt in the background.
+        """
+        pair = (district, block)
+        snap = self.snapshots.get(pair)
+        if snap is None:
+            await self.refresh([pair])
+            return self.snapshots.get(pair)
+        if time.time() - snap["checked_at"] > self.max_age or snap["version"] != self.rollup.version(*pair):
+            self._revalidate(pair)
+        return snap
+
+    def stats(self) -> dict:
+        now = time.time()
+        ages = [now - snap["checked_at"] for snap in self.snapshots.values()]
+        return {
+            "blocks": len(self.snapshots),
+            "interval_seconds": self.interval,
+            "passes": self.passes,
+            "last_pass": self.last_pass,
+            "max_age_seconds": round(max(ages), 1) if ages else None,
+            "revalidating": len(self._revalidating),
+        }
+
+    def shutdown(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for task in self._tasks:
+            task.cancel()
+
+
+def snapshot_age(snap: dict) -> float:
+    """
+    Seconds since the snapshot was last confirmed against the rollup.
+    """
+    return round(time.time() - snap["checked_at"], 1)
@@ -0,0 +1,144 @@
+"""
+Spatial lookups over well locations.
+
+``GridIndex`` buckets points into fixed latitude/longitude cells held as
+one sorted array of cell keys, so the candidates for a query are a few
+``searchsorted`` slices instead of a scan of every point. Distances are
+great-circle (haversine) kilometres, computed with NumPy over the
+candidates only.
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+CELL_DEGREES = 0.25  # ~28 km north-south
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km; arguments broadcast like NumPy arrays.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GridIndex:
+    """
+    Fixed-cell grid over (lat, lon) points. Queries return positions into
+    the arrays the index was built from, nearest first, with distances.
+    """
+
+    def __init__(self, lat, lon, cell_degrees: float = CELL_DEGREES):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell = cell_degrees
+        self.n_cols = int(math.ceil(360 / cell_degrees)) + 1
+        keys = self._key(self._row(self.lat), self._col(self.lon))
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _row(self, lat):
+        return np.floor((np.asarray(lat) + 90) / self.cell).astype(np.int64)
+
+    def _col(self, lon):
+        return np.floor((np.asarray(lon) + 180) / self.cell).astype(np.int64)
+
+    def _key(self, row, col):
+        return row * self.n_cols + col
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """
+        Positions of every point in the cells overlapping the bounding box
+        of the radius (a superset of the points within it).
+        """
+        dlat = radius_km / KM_PER_DEGREE
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + dlat, 90.0))), 1e-6)
+        dlon = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+        rows = np.arange(self._row(max(lat - dlat, -90.0)), self._row(min(lat + dlat, 90.0)) + 1)
+        col_lo, col_hi = self._col(lon - dlon), self._col(lon + dlon)
+
+        # longitudes past the antimeridian wrap to the other end of the row
+        spans = [(max(col_lo, 0), min(col_hi, self.n_cols - 1))]
+        if col_lo < 0:
+            spans.append((col_lo + self.n_cols - 1, self.n_cols - 1))
+        if col_hi > self.n_cols - 1:
+            spans.append((0, col_hi - self.n_cols + 1))
+
+        found = []
+        for lo, hi in spans:
+            starts = np.searchsorted(self.keys, self._key(rows, lo), side="left")
+            ends = np.searchsorted(self.keys, self._key(rows, hi), side="right")
+            found += [self.order[s:e] for s, e in zip(starts, ends) if e > s]
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def within(self, lat: float, lon: float, radius_km: float):
+        """
+        (positions, distances) of the points within ``radius_km``, nearest first.
+        """
+        idx = self._candidates(lat, lon, radius_km)
+        dist = haversine_km(lat, lon, self.lat[idx], self.lon[idx])
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    def nearest(self, lat: float, lon: float, k: int, max_km: float = None):
+        """
+        (positions, distances) of the ``k`` nearest points, optionally only
+        those within ``max_km``. The search radius doubles from one cell
+        until it holds ``k`` points; all of them then lie inside it.
+        """
+        if len(self) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        limit = max_km if max_km is not None else math.pi * EARTH_RADIUS_KM
+        radius = min(self.cell * KM_PER_DEGREE, limit)
+        while True:
+            idx, dist = self.within(lat, lon, radius)
+            if len(idx) >= k or radius >= limit:
+                return idx[:k], dist[:k]
+            radius = min(radius * 2, limit)
+
+
+class WellIndex:
+    """
+    Well locations by exact (district, block), searchable by distance.
+    """
+
+    def __init__(self, wells):
+        """
+        ``wells``: iterable of (district, block, latitude, longitude).
+        """
+        wells = [w for w in wells if w[2] is not None and w[3] is not None]
+        self.names = [(d, b) for d, b, _, _ in wells]
+        self.grid = GridIndex([w[2] for w in wells], [w[3] for w in wells])
+
+    def __len__(self):
+        return len(self.names)
+
+    def _results(self, idx, dist) -> list:
+        return [
+            {
+                "district": self.names[i][0],
+                "block": self.names[i][1],
+                "latitude": float(self.grid.lat[i]),
+                "longitude": float(self.grid.lon[i]),
+                "distance_km": round(float(d), 3),
+            }
+            for i, d in zip(idx, dist)
+        ]
+
+    def nearest(self, lat: float, lon: float, k: int, max_km: float = None) -> list:
+        return self._results(*self.grid.nearest(lat, lon, k, max_km))
+
+    def within(self, lat: float, lon: float, radius_km: float, limit: int = None) -> list:
+        idx, dist = self.grid.within(lat, lon, radius_km)
+        return self._results(idx[:limit], dist[:limit])
@@ -0,0 +1,373 @@
+"""
+Storage backends for groundwater readings.
+
+Both backends answer the same small set of queries the API needs, as
+coroutines: catalog lookups (districts, blocks) and block readings
+ordered newest first, optionally only those newer than a ``since``
+timestamp. Names are matched exactly; ``app.names`` resolves client
+spellings to the stored names first. ``history`` returns one block's
+readings between two timestamps, oldest first, for long-range charts.
+
+``pages`` walks the full history of exact (district, block) pairs oldest
+first, one bounded frame at a time. On PostgREST, which caps every
+response at its ``max-rows``, this is keyset pagination on
+(datetime_ts, district, block, id): each page asks for the rows after the
+last key of the previous one, so deep pages cost the same as the first.
+Readings can share a (datetime_ts, district, block), so the table's ``id``
+primary key ends the key and breaks ties.
+
+``SupabaseStorage`` goes to PostgREST through a pooled async client;
+``LocalStorage`` serves the same queries from the Parquet files in
+``data/`` held as an Arrow table.
+"""
+import asyncio
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.metrics import rows_fetched, span
+from app.schema import canonicalize, compact, widen
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+# upper bound on rows a single history query returns
+HISTORY_MAX_ROWS = int(os.getenv("HISTORY_MAX_ROWS", "200000"))
+# rows per page; at most PostgREST's max-rows (Supabase default 1000)
+PAGE_ROWS = int(os.getenv("STORAGE_PAGE_ROWS", "1000"))
+# keyset order of ``pages``; the primary key ``id`` makes it unique per reading
+PAGE_KEYS = ["datetime_ts", "district", "block", "id"]
+
+
+def _with_keys(columns):
+    """
+    ``columns`` plus any page keys missing from it (None: every column).
+    """
+    return columns and list(columns) + [k for k in PAGE_KEYS if k not in columns]
+
+
+def to_records(df: pd.DataFrame) -> list:
+    """
+    Convert a DataFrame to JSON-safe records (NaN/NaT -> None).
+    """
+    if df.empty:
+        return []
+    df = df.assign(**{c: widen(df[c]) for c in df.columns if df[c].dtype == "float32"})
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+# -------------------------------
+# Supabase / PostgREST
+# -------------------------------
+class SupabaseStorage:
+    name = "supabase"
+
+    def __init__(self, client, table: str = "groundwater"):
+        self.client = client
+        self.table = table
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def _execute(self, query) -> list:
+        with span("db"):
+            resp = await query.execute()
+        return resp.data or []
+
+    def _frame(self, data: list, columns=None) -> pd.DataFrame:
+        rows_fetched(self.name, len(data))
+        with span("frame"):
+            return compact(pd.DataFrame(data, columns=columns))
+
+    async def districts(self) -> list:
+        rows = await self._execute(self.client.rpc("get_districts", {}))
+        return [row["district"] for row in rows if row.get("district")]
+
+    async def blocks(self, district: str) -> list:
+        rows = await self._execute(self.client.rpc("get_blocks_by_district", {"district_name": district}))
+        return [row["block"] for row in rows if row.get("block")]
+
+    async def blocks_all(self) -> list:
+        rows = await self._execute(self.client.rpc("get_blocks_all", {}))
+        return [
+            {"block": row["block"], "district": row["district"]}
+            for row in rows
+            if row.get("block") and row.get("district")
+        ]
+
+    async def readings(self, district: str, block: str, columns=None, limit: int = 1000, since=None):
+        query = (
+            self.client.table(self.table)
+            .select(", ".join(columns) if columns else "*")
+            .eq("district", district)
+            .eq("block", block)
+        )
+        if since is not None:
+            query = query.gt("datetime_ts", pd.Timestamp(since).isoformat())
+        rows = await self._execute(query.order("datetime_ts", desc=True).limit(limit))
+        return self._frame(rows, columns)
+
+    async def pages(self, pairs, columns=None, since=None, start=None, end=None, page_rows: int = PAGE_ROWS):
+        """
+        Readings of the exact ``pairs`` oldest first, one frame of at most
+        ``page_rows`` per query. ``since`` is exclusive, ``start``/``end``
+        inclusive.
+        """
+        select = _with_keys(columns)
+        after = None
+        while True:
+            query = (
+                self.client.table(self.table)
+                .select(", ".join(select) if select else "*")
+                .filter("district", "in", _in_list({d for d, _ in pairs}))
+                .filter("block", "in", _in_list({b for _, b in pairs}))
+            )
+            if since is not None:
+                query = query.gt("datetime_ts", pd.Timestamp(since).isoformat())
+            if start is not None:
+                query = query.gte("datetime_ts", pd.Timestamp(start).isoformat())
+            if end is not None:
+                query = query.lte("datetime_ts", pd.Timestamp(end).isoformat())
+            if after is not None:
+                query = query.or_(_keyset_after(after))
+            for key in PAGE_KEYS:
+                query = query.order(key)
+            rows = await self._execute(query.limit(page_rows))
+            if rows:
+                after = [rows[-1][key] for key in PAGE_KEYS]
+                frame = _select_pairs(self._frame(rows, select), pairs)
+                yield frame.reindex(columns=columns) if columns else frame
+            if len(rows) < page_rows:
+                return
+
+    async def history(self, district: str, block: str, columns=None, start=None, end=None):
+        frames, n = [], 0
+        async for page in self.pages([(district, block)], columns, start=start, end=end):
+            frames.append(page)
+            n += len(page)
+            if n >= HISTORY_MAX_ROWS:
+                break
+        if not frames:
+            return self._frame([], columns)
+        return compact(pd.concat(frames, ignore_index=True).head(HISTORY_MAX_ROWS))
+
+    async def latest(self, district: str, block: str, columns=None):
+        records = to_records(await self.readings(district, block, columns, limit=1))
+        return records[0] if records else None
+
+    def memory(self) -> dict:
+        """
+        Nothing is held in process; readings live in the database.
+        """
+        return {"total": {"rows": 0, "bytes": 0}, "district": {}}
+
+
+def _quote(value) -> str:
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _in_list(values) -> str:
+    """
+    PostgREST ``in`` list with every value quoted; postgrest-py's ``in_``
+    leaves quotes inside names unescaped.
+    """
+    return "(" + ",".join(_quote(v) for v in sorted(values)) + ")"
+
+
+def _keyset_after(key) -> str:
+    """
+    PostgREST ``or`` filter for rows after ``key`` in ``PAGE_KEYS`` order.
+    """
+    values = [_quote(v) for v in key]
+    terms = []
+    for i, column in enumerate(PAGE_KEYS):
+        conditions = [f"{c}.eq.{v}" for c, v in zip(PAGE_KEYS[:i], values)] + [f"{column}.gt.{values[i]}"]
+        terms.append(f"and({','.join(conditions)})" if i else conditions[0])
+    return ",".join(terms)
+
+
+def _select_pairs(df: pd.DataFrame, pairs) -> pd.DataFrame:
+    """
+    Keep only rows whose (district, block) is one of ``pairs``; the
+    per-column IN filters can also match unrequested combinations.
+    """
+    if df.empty:
+        return df
+    wanted = pd.MultiIndex.from_tuples(list(pairs), names=["district", "block"])
+    mask = pd.MultiIndex.from_frame(df[["district", "block"]]).isin(wanted)
+    return df[mask]
+
+
+# -------------------------------
+# Local Arrow / Parquet
+# -------------------------------
+class LocalStorage:
+    """
+    Serves readings from local Parquet files.
+
+    The files are read once, renamed to the canonical schema, stripped of
+    rows repeated from an earlier file (readings repeated within one file
+    are kept, as the database keeps them) and kept in memory as an Arrow table sorted newest first, with the
+    compact dtypes (dictionary-encoded names, float32 readings), so a block
+    query is a take plus a slice: the row positions of every (district,
+    block) are indexed at load time.
+    """
+
+    name = "local"
+
+    def __init__(self, paths=None):
+        if paths is None:
+            paths = [DATA_DIR / "groundwater_clean.parquet"]
+            paths += sorted((DATA_DIR / "parquet_chunks").glob("*.parquet"))
+        self.paths = [Path(p) for p in paths]
+        self._table = None
+        self._rows = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        frames = [canonicalize(pd.read_parquet(p)) for p in self.paths if p.exists()]
+        if not frames:
+            raise FileNotFoundError(f"No parquet files found in {[str(p) for p in self.paths]}")
+        # number the copies of each row within its file, so only copies
+        # across files (e.g. a district chunk of the main file) are dropped
+        frames = [f.assign(_copy=f.groupby(list(f.columns), dropna=False, sort=False).cumcount()) for f in frames]
+        df = pd.concat(frames, ignore_index=True).drop_duplicates().drop(columns="_copy")
+        df = df.dropna(subset=["datetime_ts", "district", "block"])
+        df = df.sort_values("datetime_ts", ascending=False, kind="stable").reset_index(drop=True)
+        rows = df.groupby(["district", "block"], sort=False).indices
+        return pa.Table.from_pandas(compact(df), preserve_index=False), rows
+
+    async def open(self):
+        """
+        Load the Parquet files off the event loop.
+        """
+        await asyncio.to_thread(lambda: self.table)
+
+    async def close(self):
+        pass
+
+    @property
+    def table(self) -> pa.Table:
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    self._table, self._rows = self._load()
+        return self._table
+
+    def _take(self, pairs) -> pa.Table:
+        """
+        Rows of the exact (district, block) ``pairs``, still newest first.
+        """
+        table = self.table
+        found = [self._rows[p] for p in pairs if p in self._rows]
+        if not found:
+            return table.slice(0, 0)
+        return table.take(np.sort(np.concatenate(found)))
+
+    def _since(self, table: pa.Table, since) -> pa.Table:
+        if since is None:
+            return table
+        ts = pa.scalar(pd.Timestamp(since), type=table.schema.field("datetime_ts").type)
+        return table.filter(pc.greater(table.column("datetime_ts"), ts))
+
+    def _unique(self, table: pa.Table, column: str) -> list:
+        return [v for v in pc.unique(table.column(column)).to_pylist() if v]
+
+    async def districts(self) -> list:
+        return self._unique(self.table, "district")
+
+    async def blocks(self, district: str) -> list:
+        self.table  # loads the (district, block) row index
+        return [b for d, b in self._rows if d == district]
+
+    async def blocks_all(self) -> list:
+        pairs = self.table.select(["block", "district"]).group_by(["block", "district"]).aggregate([])
+        return pairs.to_pylist()
+
+    def _frame(self, table: pa.Table, columns=None, limit: int = 1000) -> pd.DataFrame:
+        if columns:
+            table = table.select([c for c in columns if c in table.column_names])
+        table = table.slice(0, limit)
+        rows_fetched(self.name, table.num_rows)
+        with span("frame"):
+            df = table.to_pandas()
+        return df.reindex(columns=columns) if columns else df
+
+    async def readings(self, district: str, block: str, columns=None, limit: int = 1000, since=None):
+        with span("db"):
+            table = self._since(self._take([(district, block)]), since)
+        return self._frame(table, columns, limit)
+
+    def _oldest_first(self, pairs, since=None, start=None, end=None) -> pa.Table:
+        table = self._since(self._take(pairs), since)
+        ts = table.column("datetime_ts")
+        if start is not None:
+            table = table.filter(pc.greater_equal(ts, pa.scalar(pd.Timestamp(start), type=ts.type)))
+            ts = table.column("datetime_ts")
+        if end is not None:
+            table = table.filter(pc.less_equal(ts, pa.scalar(pd.Timestamp(end), type=ts.type)))
+        # rows are held newest first
+        return table.take(np.arange(table.num_rows - 1, -1, -1))
+
+    async def pages(self, pairs, columns=None, since=None, start=None, end=None, page_rows: int = PAGE_ROWS):
+        """
+        Readings of the exact ``pairs`` oldest first, ``page_rows`` at a
+        time. The table is already in memory, so pages are zero-copy
+        slices; only one page at a time is converted to pandas.
+        """
+        with span("db"):
+            table = self._oldest_first(pairs, since, start, end)
+        for offset in range(0, table.num_rows, page_rows):
+            yield self._frame(table.slice(offset, page_rows), columns, page_rows)
+
+    async def history(self, district: str, block: str, columns=None, start=None, end=None):
+        with span("db"):
+            table = self._oldest_first([(district, block)], start=start, end=end)
+        return self._frame(table, columns, HISTORY_MAX_ROWS)
+
+    async def latest(self, district: str, block: str, columns=None):
+        records = to_records(await self.readings(district, block, columns, limit=1))
+        return records[0] if records else None
+
+    def memory(self) -> dict:
+        """
+        Resident size of the readings table, in total and per district.
+        Every column is fixed-width (names are dictionary codes), so a
+        district's share is its row count times the per-row width; the
+        name dictionaries are counted once, in the total.
+        """
+        table = self.table
+        dictionaries = sum(
+            chunk.dictionary.nbytes
+            for column in table.columns if pa.types.is_dictionary(column.type)
+            for chunk in column.chunks
+        )
+        row_bytes = (table.nbytes - dictionaries) / max(table.num_rows, 1)
+        counts = {}
+        for (district, _), rows in self._rows.items():
+            counts[district] = counts.get(district, 0) + len(rows)
+        return {
+            "total": {"rows": table.num_rows, "bytes": table.nbytes},
+            "district": {
+                d: {"rows": n, "bytes": int(n * row_bytes)} for d, n in sorted(counts.items())
+            },
+        }
+
+
+def make_storage(backend: str, client=None):
+    """
+    Build the storage backend named by ``backend`` ("supabase" or "local").
+    """
+    backend = backend.lower()
+    if backend == "supabase":
+        return SupabaseStorage(client)
+    if backend == "local":
+        return LocalStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,115 @@
+"""
+Server-side downsampling of long reading histories.
+
+Both reducers work on a time-sorted series with NumPy only:
+
+``bucket_stats`` splits the requested range into equal-width time
+buckets and returns min/max/mean/count per non-empty bucket, so peaks
+survive while the point count is bounded.
+
+``lttb`` (Largest-Triangle-Three-Buckets) keeps the ``n`` original
+points that best preserve the visual shape of the line.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_POINTS = 300
+MAX_POINTS = 5000
+SERIES_COLUMNS = [
+    "water_level", "rainfall_mm", "specific_yield",
+    "wq_ph", "wq_ec", "wq_cl", "wq_f", "wq_total_hardness",
+]
+
+
+def clean_series(df: pd.DataFrame, column: str):
+    """
+    (timestamps as int64 ns, float values) sorted by time, NaNs dropped.
+    float32 readings stay float32.
+    """
+    ts = pd.to_datetime(df["datetime_ts"]).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    values = pd.to_numeric(df[column], errors="coerce").to_numpy()
+    if values.dtype != np.float32:
+        values = values.astype(float)
+    keep = ~np.isnan(values)
+    ts, values = ts[keep], values[keep]
+    order = np.argsort(ts, kind="stable")
+    return ts[order], values[order]
+
+
+def bucket_stats(ts: np.ndarray, values: np.ndarray, n_buckets: int, start: int = None, end: int = None) -> pd.DataFrame:
+    """
+    min/max/mean/count of ``values`` in ``n_buckets`` equal time buckets
+    between ``start`` and ``end`` (int64 ns; default: the data's range).
+    Empty buckets are omitted. ``ts`` must be sorted.
+    """
+    columns = ["datetime_ts", "mean", "min", "max", "count"]
+    if len(ts) == 0:
+        return pd.DataFrame(columns=columns)
+    start = int(ts[0]) if start is None else int(start)
+    end = int(ts[-1]) if end is None else int(end)
+    width = max((end - start + 1) / n_buckets, 1.0)
+
+    bucket = np.minimum(((ts - start) / width).astype(np.int64), n_buckets - 1)
+    # ts is sorted, so each bucket is one contiguous run
+    bounds = np.flatnonzero(np.diff(bucket)) + 1
+    starts = np.concatenate(([0], bounds))
+    counts = np.diff(np.concatenate((starts, [len(ts)])))
+
+    return pd.DataFrame({
+        "datetime_ts": pd.to_datetime(start + bucket[starts] * width, unit="ns").floor("s"),
+        "mean": (np.add.reduceat(values, starts, dtype=np.float64) / counts).astype(values.dtype),
+        "min": np.minimum.reduceat(values, starts),
+        "max": np.maximum.reduceat(values, starts),
+        "count": counts,
+    })
+
+
+def lttb(ts: np.ndarray, values: np.ndarray, n: int):
+    """
+    Indices of the ``n`` points chosen by Largest-Triangle-Three-Buckets.
+    First and last points are always kept. ``ts`` must be sorted.
+    """
+    size = len(ts)
+    if n >= size or n < 3:
+        return np.arange(size) if n >= size else np.array([0, size - 1][:max(n, 0)])
+
+    x = (ts - ts[0]).astype(float)
+    y = values
+    # n - 2 inner buckets over points 1 .. size - 2
+    edges = np.floor(np.linspace(1, size - 1, n - 1)).astype(np.int64)
+    chosen = np.empty(n, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, size - 1
+
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else size)
+        # average of the next bucket (or the last point)
+        avg_x = x[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else x[-1]
+        avg_y = y[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else y[-1]
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        chosen[i + 1] = a
+    return chosen
+
+
+def downsample(df: pd.DataFrame, column: str, points: int, method: str, start=None, end=None):
+    """
+    (frame, raw point count, method used) for ``column`` of ``df`` reduced to about
+    ``points`` rows with ``method`` ("minmax" or "lttb"). Series that
+    are already short enough come back as raw points (value column).
+    """
+    ts, values = clean_series(df, column)
+    raw = len(ts)
+    if raw <= points:
+        return pd.DataFrame({"datetime_ts": pd.to_datetime(ts, unit="ns"), "value": values}), raw, "raw"
+
+    if method == "lttb":
+        idx = lttb(ts, values, points)
+        return pd.DataFrame({"datetime_ts": pd.to_datetime(ts[idx], unit="ns"), "value": values[idx]}), raw, method
+
+    start = pd.Timestamp(start).value if start is not None else None
+    end = pd.Timestamp(end).value if end is not None else None
+    return bucket_stats(ts, values, points, start, end), raw, method
@@ -0,0 +1,310 @@
+"""
+Water-quality lab samples and their join onto wells.
+
+Each reading carries the ``wq_*`` values of the lab sample nearest to its
+well, plus the great-circle distance to it (``wq_distance_km``).
+``join_water_quality`` recomputes those columns for a whole frame of
+readings at once: the nearest sample is found per distinct well location
+(and sample year, with ``match_year``) with one matrix product over unit
+vectors, then broadcast back to the rows.
+
+The lab CSV has corrupted cells (values fused with unit text) and is
+cleaned once into a typed Parquet artifact next to it, with a JSON
+report of what was recovered and what could not be read.
+
+    python -m app.water_quality clean data/water_quality_UP_clean.csv
+    python -m app.water_quality join data/groundwater_merged.csv --out data/groundwater_wq.parquet
+"""
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.schema import canonical_name, canonicalize, compact, widen
+from app.spatial import haversine_km
+
+WQ_CSV = Path("data") / "water_quality_UP_clean.csv"
+
+# locations compared against every sample per matrix product
+JOIN_CHUNK = 2048
+
+SAMPLE_KEYS = ["sample_no", "state", "district", "location", "latitude", "longitude", "year"]
+SAMPLE_ALIASES = {"s._no.": "sample_no"}
+
+# -------------------------------
+# Cleaning
+# -------------------------------
+# Cells of the lab CSV were extracted from PDFs; some values are
+# interleaved with the characters of the unit printed next to them:
+# "(m4g88/L)" is 488 inside "(mg/L)", "257 4°6C)" is 746 inside the
+# "25 °C)" of the EC header. Removing the unit's characters (leftmost
+# match) leaves the value.
+UNIT_TEMPLATES = {"wq_ec": ["25 °C)"]}
+DEFAULT_TEMPLATES = ["(mg/L)"]
+PLACEHOLDERS = ["-", ""]
+NUMBER = r"-?\d+(?:\.\d+)?"
+
+
+def _template_pattern(template: str) -> str:
+    """
+    Regex matching ``template`` with digits/dots inserted anywhere; each
+    inserted run is a capture group.
+    """
+    gap = r"([\d.]*?)"
+    return "^" + gap + gap.join(re.escape(ch) for ch in template) + r"([\d.]*)$"
+
+
+def clean_column(raw: pd.Series, templates) -> tuple:
+    """
+    (float values, status per cell) for one raw text column. Status is
+    "ok" (plain number), "recovered" (number pulled out of unit text),
+    "missing" (empty or placeholder) or "invalid" (nothing recoverable).
+    """
+    text = raw.astype("string").str.strip()
+    status = pd.Series("invalid", index=raw.index, dtype=object)
+    values = pd.Series(np.nan, index=raw.index)
+
+    missing = text.isna() | text.isin(PLACEHOLDERS)
+    plain = ~missing & text.str.fullmatch(NUMBER).fillna(False)
+    values[plain] = pd.to_numeric(text[plain])
+    status[missing] = "missing"
+    status[plain] = "ok"
+
+    for template in templates:
+        todo = status == "invalid"
+        if not todo.any():
+            break
+        parts = text[todo].str.extract(_template_pattern(template))
+        digits = parts.fillna("").astype(str).sum(axis=1)
+        found = digits.str.fullmatch(NUMBER).fillna(False) & parts.notna().all(axis=1)
+        values[found[found].index] = pd.to_numeric(digits[found])
+        status[found[found].index] = "recovered"
+    return values, status
+
+
+def clean_samples(path=WQ_CSV) -> tuple:
+    """
+    (samples, report) from the raw lab CSV: canonical names, numeric
+    ``wq_*`` columns (corrupted cells recovered where possible), and a
+    report counting each column's cell statuses and listing the cells
+    that could not be read.
+    """
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+    raw = raw.rename(columns=sample_name)
+    raw = raw[[c for c in raw.columns if c in SAMPLE_KEYS or c.startswith("wq_")]]
+
+    df = raw.copy()
+    report = {"source": str(path), "rows": len(raw), "columns": {}, "invalid": []}
+    for col in ["latitude", "longitude", "year", "sample_no", *wq_columns(raw)]:
+        if col not in raw.columns:
+            continue
+        values, status = clean_column(raw[col], UNIT_TEMPLATES.get(col, DEFAULT_TEMPLATES))
+        df[col] = values
+        report["columns"][col] = {k: int(v) for k, v in status.value_counts().items()}
+        bad = status[status == "invalid"].index
+        report["invalid"] += [
+            {"row": int(i), "sample_no": raw.at[i, "sample_no"] if "sample_no" in raw.columns else None,
+             "column": col, "value": raw.at[i, col]}
+            for i in bad
+        ]
+    for col in ("state", "district", "location"):
+        if col in df.columns:
+            df[col] = df[col].str.strip().replace("", None)
+
+    dropped = df["latitude"].isna() | df["longitude"].isna()
+    report["dropped_without_coordinates"] = int(dropped.sum())
+    df = df[~dropped].reset_index(drop=True)
+    return compact(df).astype({"sample_no": "Int32", "year": "Int16"}, errors="ignore"), report
+
+
+def artifact_paths(csv_path) -> tuple:
+    csv_path = Path(csv_path)
+    return csv_path.with_suffix(".parquet"), csv_path.with_suffix(".report.json")
+
+
+def write_clean_samples(csv_path=WQ_CSV) -> dict:
+    """
+    Clean the lab CSV and write ``<csv>.parquet`` plus ``<csv>.report.json``
+    next to it. Returns the report.
+    """
+    samples, report = clean_samples(csv_path)
+    parquet, report_path = artifact_paths(csv_path)
+    tmp = parquet.with_suffix(".parquet.tmp")
+    samples.to_parquet(tmp, index=False)
+    tmp.replace(parquet)
+    report_path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+# -------------------------------
+# Samples
+# -------------------------------
+def sample_name(column: str) -> str:
+    """
+    Canonical name of a lab-sample column: "ec_(?s/cm_at" -> "wq_ec".
+    """
+    name = canonical_name(column)
+    name = SAMPLE_ALIASES.get(name, name)
+    return name if name in SAMPLE_KEYS else f"wq_{name}"
+
+
+def load_samples(path=WQ_CSV) -> pd.DataFrame:
+    """
+    Cleaned lab samples. A Parquet ``path`` is read as is; for a CSV the
+    cleaned artifact next to it is used while it is newer than the CSV,
+    otherwise the CSV is cleaned and the artifact rewritten.
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    parquet, _ = artifact_paths(path)
+    if parquet.exists() and parquet.stat().st_mtime >= path.stat().st_mtime:
+        return pd.read_parquet(parquet)
+    try:
+        write_clean_samples(path)
+    except OSError:
+        return clean_samples(path)[0]
+    return pd.read_parquet(parquet)
+
+
+def wq_columns(df: pd.DataFrame) -> list:
+    return [c for c in df.columns if c.startswith("wq_") and c != "wq_distance_km"]
+
+
+# -------------------------------
+# Nearest sample
+# -------------------------------
+def _unit_vectors(lat, lon) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def nearest_sample(lat, lon, sample_lat, sample_lon, chunk: int = JOIN_CHUNK):
+    """
+    (sample position, distance km) of the nearest sample for every point.
+
+    On the unit sphere the nearest point has the largest dot product, so
+    each chunk of points is one (chunk x 3) @ (3 x samples) product and an
+    argmax. Points without coordinates get position -1 and NaN distance.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    idx = np.full(len(lat), -1, dtype=np.int64)
+    dist = np.full(len(lat), np.nan)
+    valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+    if len(valid) == 0 or len(sample_lat) == 0:
+        return idx, dist
+
+    samples = _unit_vectors(sample_lat, sample_lon).T
+    points = _unit_vectors(lat[valid], lon[valid])
+    best = np.empty(len(valid), dtype=np.int64)
+    for start in range(0, len(valid), chunk):
+        best[start:start + chunk] = np.argmax(points[start:start + chunk] @ samples, axis=1)
+
+    idx[valid] = best
+    dist[valid] = haversine_km(
+        lat[valid], lon[valid],
+        np.asarray(sample_lat, dtype=np.float64)[best], np.asarray(sample_lon, dtype=np.float64)[best],
+    )
+    return idx, dist
+
+
+def join_water_quality(df: pd.DataFrame, samples: pd.DataFrame, match_year: bool = False, max_km: float = None) -> pd.DataFrame:
+    """
+    ``df`` with its ``wq_*`` columns and ``wq_distance_km`` replaced by
+    those of the nearest sample to each row's well.
+
+    With ``match_year`` a reading only joins samples taken in its own
+    year, falling back to all samples for years without any. Rows whose
+    nearest sample is farther than ``max_km`` get NaN values.
+    """
+    columns = wq_columns(samples)
+    lat = pd.to_numeric(df["latitude"], errors="coerce").to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(df["longitude"], errors="coerce").to_numpy(dtype=np.float64)
+    keys = [lat, lon]
+    if match_year:
+        keys.append(pd.to_datetime(df["datetime_ts"]).dt.year.to_numpy())
+
+    # one lookup per distinct location (and year), broadcast back to rows
+    codes, uniques = pd.factorize(pd.MultiIndex.from_arrays(keys))
+    locations = uniques.to_frame(index=False, name=["latitude", "longitude", "year"][:len(keys)])
+    best = np.full(len(locations), -1, dtype=np.int64)
+    dist = np.full(len(locations), np.nan)
+
+    groups = [(None, np.arange(len(locations)))]
+    if match_year:
+        groups = locations.groupby("year", sort=False).indices.items()
+    for year, where in groups:
+        pool = np.arange(len(samples))
+        if year is not None:
+            same_year = np.flatnonzero(samples["year"].to_numpy(dtype=float, na_value=np.nan) == year)
+            pool = same_year if len(same_year) else pool
+        found, km = nearest_sample(
+            locations["latitude"].to_numpy()[where], locations["longitude"].to_numpy()[where],
+            samples["latitude"].to_numpy()[pool], samples["longitude"].to_numpy()[pool],
+        )
+        best[where] = np.where(found >= 0, pool[np.maximum(found, 0)], -1)
+        dist[where] = km
+
+    if max_km is not None:
+        best[dist > max_km] = -1
+    values = np.column_stack([widen(samples[c]).to_numpy(dtype=np.float64) for c in columns])
+    joined = np.vstack((values, np.full(len(columns), np.nan)))[best[codes]]
+
+    out = df.drop(columns=[c for c in df.columns if c in columns or c == "wq_distance_km"])
+    wq = pd.DataFrame(joined, columns=columns, index=df.index)
+    wq["wq_distance_km"] = np.where(best[codes] >= 0, dist[codes], np.nan)
+    return pd.concat([out, wq], axis=1)
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+def read_readings(path) -> pd.DataFrame:
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return canonicalize(pd.read_parquet(path))
+    from app.preprocess_and_metrics import read_merged_csv
+
+    return read_merged_csv(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean water-quality samples and join them onto groundwater readings")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    clean = commands.add_parser("clean", help="write the cleaned Parquet artifact and report for a lab CSV")
+    clean.add_argument("csv", nargs="?", default=str(WQ_CSV))
+
+    join = commands.add_parser("join", help="re-join the nearest sample onto readings")
+    join.add_argument("readings", help="merged CSV or Parquet of readings with latitude/longitude")
+    join.add_argument("--samples", default=str(WQ_CSV))
+    join.add_argument("--out", required=True, help="Parquet file to write")
+    join.add_argument("--match-year", action="store_true", help="join samples from the reading's year")
+    join.add_argument("--max-km", type=float, default=None, help="leave wq_* empty beyond this distance")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    if args.command == "clean":
+        report = write_clean_samples(args.csv)
+        recovered = sum(c.get("recovered", 0) for c in report["columns"].values())
+        print(
+            f"✅ Cleaned {report['rows']} samples in {time.monotonic() - started:.2f}s: "
+            f"{recovered} cells recovered, {len(report['invalid'])} unreadable -> {artifact_paths(args.csv)[0]}"
+        )
+        return
+
+    df = join_water_quality(read_readings(args.readings), load_samples(args.samples), args.match_year, args.max_km)
+    compact(df).to_parquet(args.out, index=False)
+    print(
+        f"✅ Joined water quality onto {len(df)} rows in {time.monotonic() - started:.2f}s "
+        f"(median distance {df['wq_distance_km'].median():.2f} km) -> {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
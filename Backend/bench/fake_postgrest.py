@@ -0,0 +1,224 @@
+"""
+In-process stand-in for the Supabase PostgREST endpoint.
+
+Implements the slice of the PostgREST interface the API uses, over an
+in-memory copy of ``data/groundwater_clean.parquet``, numbered by an
+``id`` primary key like the real table:
+
+    GET  /rest/v1/groundwater   select, eq/ilike/in/gt/gte/lt/lte filters,
+                                or=(...) with nested and(...),
+                                order=<col>[.desc][,<col>[.desc]...], limit
+    POST /rest/v1/rpc/get_districts
+    POST /rest/v1/rpc/get_blocks_by_district   {"district_name": ...}
+    POST /rest/v1/rpc/get_blocks_all
+
+Every filter is evaluated as a full scan, like an unindexed table, and an
+optional fixed delay per request stands in for network round trips.
+Like PostgREST's ``max-rows``, no response holds more than ``max_rows``
+rows, whatever ``limit`` asks for.
+The app is served through ``httpx.ASGITransport``, so no socket is opened.
+"""
+import asyncio
+import re
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.schema import canonicalize
+
+DATA_FILE = Path(__file__).resolve().parent.parent / "data" / "groundwater_clean.parquet"
+BASE_URL = "http://fake-supabase"
+OPERATORS = ("eq", "ilike", "in", "gt", "gte", "lt", "lte")
+MAX_ROWS = 1000  # Supabase's default max-rows
+
+
+def load_table(path=DATA_FILE) -> pd.DataFrame:
+    df = canonicalize(pd.read_parquet(path))
+    return df.dropna(subset=["datetime_ts", "district", "block"]).reset_index(drop=True)
+
+
+def _pattern(value: str) -> re.Pattern:
+    parts = [re.escape(p) for p in value.split("*")]
+    return re.compile("^" + ".*".join(parts) + "$", re.IGNORECASE | re.DOTALL)
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def _split(text: str) -> list:
+    """
+    Split a logic-tree list on commas outside quotes and parentheses.
+    """
+    parts, depth, quoted, escaped, start = [], 0, False, False, 0
+    for i, ch in enumerate(text):
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _in_values(value: str) -> list:
+    inner = value[1:-1] if value.startswith("(") and value.endswith(")") else value
+    return [_unquote(v) for v in _split(inner)]
+
+
+def _records(df: pd.DataFrame) -> list:
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    df = df.replace([np.inf, -np.inf], np.nan)
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+class FakePostgrest:
+    def __init__(self, df: pd.DataFrame = None, latency_ms: float = 0.0, max_rows: int = MAX_ROWS):
+        df = load_table() if df is None else df
+        if "id" not in df.columns:
+            df = df.assign(id=np.arange(1, len(df) + 1))
+        self.df = df
+        self.latency = latency_ms / 1000.0
+        self.max_rows = max_rows
+        self.requests = 0
+        self.app = Starlette(routes=[
+            Route("/rest/v1/rpc/{func}", self.rpc, methods=["POST", "GET"]),
+            Route("/rest/v1/{table}", self.select, methods=["GET"]),
+        ])
+
+    def _mask(self, column: str, expr: str) -> np.ndarray:
+        op, _, value = expr.partition(".")
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {expr}")
+        values = self.df[column]
+        if op == "ilike":
+            pattern = _pattern(value)
+            return values.astype(str).map(lambda v: bool(pattern.match(v))).to_numpy()
+        if op == "in":
+            return values.isin(_in_values(value)).to_numpy()
+        value = _unquote(value)
+        if column == "datetime_ts":
+            value = pd.Timestamp(value)
+        elif values.dtype == object:
+            values = values.astype(str)
+        elif op != "eq":
+            value = float(value)
+        if op == "eq" and column != "datetime_ts":
+            return (values.astype(str) == str(value)).to_numpy()
+        return {
+            "eq": values == value,
+            "gt": values > value,
+            "gte": values >= value,
+            "lt": values < value,
+            "lte": values <= value,
+        }[op].to_numpy()
+
+    def _logic(self, op: str, items: str) -> np.ndarray:
+        """
+        Mask of an ``or``/``and`` tree such as ``(a.gt.1,and(a.eq.1,b.gt.2))``.
+        """
+        masks = []
+        for item in _split(items[1:-1]):
+            name, _, rest = item.partition("(")
+            if name in ("and", "or") and rest:
+                masks.append(self._logic(name, "(" + rest))
+            else:
+                column, _, expr = item.partition(".")
+                masks.append(self._mask(column, expr))
+        combine = np.logical_or if op == "or" else np.logical_and
+        return combine.reduce(masks) if masks else np.ones(len(self.df), dtype=bool)
+
+    async def select(self, request: Request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        params = request.query_params
+        mask = np.ones(len(self.df), dtype=bool)
+        for column, expr in params.multi_items():
+            if column in ("select", "order", "limit", "offset"):
+                continue
+            if column in ("or", "and"):
+                mask &= self._logic(column, expr)
+                continue
+            if column not in self.df.columns:
+                return JSONResponse({"message": f"column {column} does not exist"}, status_code=400)
+            mask &= self._mask(column, expr)
+        df = self.df[mask]
+
+        if "order" in params:
+            keys = [key.split(".") for key in params["order"].split(",")]
+            df = df.sort_values(
+                [column for column, *_ in keys],
+                ascending=["desc" not in flags for _, *flags in keys],
+                kind="stable",
+            )
+        offset = int(params.get("offset", 0))
+        limit = min(int(params.get("limit", self.max_rows)), self.max_rows)
+        df = df.iloc[offset:offset + limit]
+
+        select = params.get("select", "*")
+        if select.strip() != "*":
+            columns = [c.strip() for c in select.split(",") if c.strip()]
+            df = df[[c for c in columns if c in df.columns]]
+        return JSONResponse(_records(df))
+
+    async def rpc(self, request: Request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        func = request.path_params["func"]
+        body = await request.json() if request.method == "POST" else {}
+        pairs = self.df[["district", "block"]].drop_duplicates()
+        if func == "get_districts":
+            rows = [{"district": d} for d in sorted(pairs["district"].unique())]
+        elif func == "get_blocks_by_district":
+            name = str((body or {}).get("district_name", "")).strip().lower()
+            rows = [{"block": b} for b in sorted(pairs.loc[pairs["district"].str.lower() == name, "block"])]
+        elif func == "get_blocks_all":
+            rows = pairs.sort_values(["district", "block"]).to_dict(orient="records")
+        else:
+            return JSONResponse({"message": f"function {func} does not exist"}, status_code=404)
+        return JSONResponse(rows)
+
+    def client(self, key: str = "bench"):
+        """
+        Async PostgREST client whose requests are served by this fake.
+        """
+        from postgrest import AsyncPostgrestClient
+
+        app = self.app
+
+        class FakePostgrestClient(AsyncPostgrestClient):
+            def create_session(self, base_url, headers, timeout, verify=True):
+                return httpx.AsyncClient(
+                    base_url=base_url,
+                    headers=headers,
+                    timeout=timeout,
+                    transport=httpx.ASGITransport(app=app),
+                )
+
+        return FakePostgrestClient(
+            f"{BASE_URL}/rest/v1",
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+        )
@@ -0,0 +1,392 @@
+"""
+Endpoint benchmark for the API.
+
+Runs the FastAPI app in-process against ``FakePostgrest`` (seeded from
+data/groundwater_clean.parquet), drives each scenario with a fixed number
+of concurrent clients and writes latency percentiles, throughput and
+peak RSS per scenario as JSON. Request choices use a fixed seed, so two
+runs on different commits issue the same requests.
+
+    python -m bench.run --out bench/results/$(git rev-parse --short HEAD).json
+    python -m bench.run --compare bench/results/<old>.json --scenarios extras score
+
+Caches stay warm across a run unless ``--cold`` is given, which clears
+the rollup, well statistics, latest readings, snapshots, forecast models,
+catalog and plot caches before every scenario.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+CONCURRENCY = 16
+REQUESTS = 200
+WARMUP = 20
+
+
+# -------------------------------
+# Scenarios
+# -------------------------------
+# Each scenario maps to weighted request builders; a builder takes the
+# random generator and the (district, block) pairs and returns
+# (label, method, path, params, json body).
+def _pair(rng, pairs):
+    return rng.choice(pairs)
+
+
+def extras(rng, pairs):
+    d, b = _pair(rng, pairs)
+    return "extras", "GET", "/extras", {"district": d, "block": b}, None
+
+
+def score(rng, pairs):
+    d, b = _pair(rng, pairs)
+    return "score", "GET", "/score", {"district": d, "block": b}, None
+
+
+def plot_png(rng, pairs):
+    d, b = _pair(rng, pairs)
+    days = rng.choice([7, 10, 30])
+    return "plot-mean-levels", "GET", "/plot-mean-levels", {"district": d, "block": b, "days": days}, None
+
+
+def plot_json(rng, pairs):
+    d, b = _pair(rng, pairs)
+    params = {"district": d, "block": b, "days": 30, "format": "json"}
+    return "plot-mean-levels-json", "GET", "/plot-mean-levels", params, None
+
+
+def timeseries(rng, pairs):
+    d, b = _pair(rng, pairs)
+    params = {"district": d, "block": b, "points": 300, "method": rng.choice(["minmax", "lttb"])}
+    return "timeseries", "GET", "/timeseries", params, None
+
+
+def wells_nearest(rng, pairs):
+    # points scattered over Uttar Pradesh
+    params = {"lat": round(rng.uniform(24.0, 30.0), 4), "lon": round(rng.uniform(77.5, 84.5), 4), "k": 10}
+    return "wells-nearest", "GET", "/wells/nearest", params, None
+
+
+def forecast(rng, pairs):
+    d, b = _pair(rng, pairs)
+    return "forecast", "GET", "/forecast", {"district": d, "block": b, "days": rng.choice([7, 30, 90])}, None
+
+
+def export(rng, pairs):
+    d, b = _pair(rng, pairs)
+    return "export", "GET", "/export", {"district": d, "block": b, "format": rng.choice(["ndjson", "csv"])}, None
+
+
+def alerts(rng, pairs):
+    return "alerts", "GET", "/alerts", {}, None
+
+
+def last_water_level(rng, pairs):
+    d, b = _pair(rng, pairs)
+    return "last-water-level", "GET", "/last-water-level", {"district": d, "block": b}, None
+
+
+def block_summary(rng, pairs):
+    d, b = _pair(rng, pairs)
+    return "block-summary", "GET", "/block-summary", {"district": d, "block": b}, None
+
+
+def blocks(rng, pairs):
+    d, _ = _pair(rng, pairs)
+    return "blocks", "GET", "/blocks", {"district": d}, None
+
+
+def extras_batch(rng, pairs):
+    d, _ = _pair(rng, pairs)
+    return "extras-batch", "POST", "/extras/batch", None, {"district": d}
+
+
+def ranking(rng, pairs):
+    return "ranking", "GET", "/ranking", {"window": 30}, None
+
+
+SCENARIOS = {
+    "extras": [(1, extras)],
+    "score": [(1, score)],
+    "plot-mean-levels": [(1, plot_png)],
+    "plot-mean-levels-json": [(1, plot_json)],
+    "timeseries": [(1, timeseries)],
+    "wells-nearest": [(1, wells_nearest)],
+    "alerts": [(1, alerts)],
+    "forecast": [(1, forecast)],
+    "export": [(1, export)],
+    "extras-batch": [(1, extras_batch)],
+    "ranking": [(1, ranking)],
+    "block-summary": [(1, block_summary)],
+    # what the app does on a typical block screen
+    "mixed": [
+        (40, extras),
+        (20, score),
+        (15, plot_png),
+        (15, last_water_level),
+        (10, blocks),
+    ],
+}
+
+
+def build_requests(scenario: str, pairs, n: int, seed: int) -> list:
+    rng = random.Random(f"{scenario}:{seed}")
+    weights, builders = zip(*SCENARIOS[scenario])
+    return [rng.choices(builders, weights)[0](rng, pairs) for _ in range(n)]
+
+
+# -------------------------------
+# Measurement
+# -------------------------------
+def rss_mb() -> float:
+    """
+    Current resident set size of this process in MB.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RssSampler:
+    """
+    Peak RSS seen while the sampler runs (polled every ``interval`` s).
+    """
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0.0
+        self._task = None
+
+    async def _poll(self):
+        while True:
+            self.peak = max(self.peak, rss_mb())
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = rss_mb()
+        self._task = asyncio.get_running_loop().create_task(self._poll())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+        self.peak = max(self.peak, rss_mb())
+
+
+def summarize(latencies: list) -> dict:
+    if not latencies:
+        return {}
+    ms = np.asarray(latencies) * 1000
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3),
+        "mean": round(float(ms.mean()), 3),
+        "max": round(float(ms.max()), 3),
+    }
+
+
+async def drive(client, requests: list, concurrency: int) -> dict:
+    """
+    Issue ``requests`` with ``concurrency`` workers; per-label latencies.
+    """
+    queue = asyncio.Queue()
+    for item in requests:
+        queue.put_nowait(item)
+    samples = {}
+
+    async def worker():
+        while not queue.empty():
+            label, method, path, params, body = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                resp = await client.request(method, path, params=params, json=body)
+                status = resp.status_code
+                is_json = resp.headers.get("content-type", "").startswith("application/json")
+                ok = status < 400 and "error" not in (resp.json() if status == 200 and is_json else {})
+            except Exception as e:
+                status, ok = type(e).__name__, False
+            elapsed = time.perf_counter() - started
+            entry = samples.setdefault(label, {"latencies": [], "errors": 0, "status": {}})
+            entry["latencies"].append(elapsed)
+            entry["errors"] += not ok
+            entry["status"][str(status)] = entry["status"].get(str(status), 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+async def run_scenario(client, scenario: str, pairs, args) -> dict:
+    if args.cold:
+        reset_caches()
+    if args.warmup:
+        await drive(client, build_requests(scenario, pairs, args.warmup, args.seed + 1), args.concurrency)
+
+    requests = build_requests(scenario, pairs, args.requests, args.seed)
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        samples = await drive(client, requests, args.concurrency)
+        elapsed = time.perf_counter() - started
+
+    all_latencies = [t for s in samples.values() for t in s["latencies"]]
+    return {
+        "requests": len(all_latencies),
+        "errors": sum(s["errors"] for s in samples.values()),
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(all_latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": summarize(all_latencies),
+        "peak_rss_mb": round(rss.peak, 1),
+        "endpoints": {
+            label: {
+                "requests": len(s["latencies"]),
+                "errors": s["errors"],
+                "status": s["status"],
+                "latency_ms": summarize(s["latencies"]),
+            }
+            for label, s in sorted(samples.items())
+        },
+    }
+
+
+# -------------------------------
+# App wiring
+# -------------------------------
+def reset_caches():
+    from app import catalog
+    from app.api import snapshots
+    from app.db import forecasts, latest, rollup, well_stats
+    from app.plots import plots
+
+    rollup.invalidate()
+    well_stats.reset()
+    latest.expire()
+    snapshots.snapshots.clear()
+    forecasts.models.clear()
+    catalog.invalidate()
+    plots.cache.invalidate()
+
+
+def load_app(fake):
+    """
+    Import the API configured for the Supabase backend, with its PostgREST
+    client pointed at ``fake``.
+    """
+    os.environ["STORAGE_BACKEND"] = "supabase"
+    os.environ.setdefault("SUPABASE_URL", "http://fake-supabase")
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+
+    from app import db
+    from app.api import app
+
+    db.client = db.storage.client = fake.client()
+    return app
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict):
+    print(f"\n{'scenario':<24}{'p50 ms':>18}{'p95 ms':>18}{'req/s':>18}")
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+
+        def cell(new, prev):
+            change = (new - prev) / prev * 100 if prev else 0.0
+            return f"{new:>9.2f} ({change:+5.1f}%)"
+
+        print(
+            f"{name:<24}"
+            f"{cell(result['latency_ms']['p50'], old['latency_ms']['p50']):>18}"
+            f"{cell(result['latency_ms']['p95'], old['latency_ms']['p95']):>18}"
+            f"{cell(result['throughput_rps'], old['throughput_rps']):>18}"
+        )
+
+
+async def main_async(args) -> dict:
+    import httpx
+
+    from bench.fake_postgrest import FakePostgrest
+
+    fake = FakePostgrest(latency_ms=args.db_latency_ms)
+    app = load_app(fake)
+    pairs = sorted(map(tuple, fake.df[["district", "block"]].drop_duplicates().to_numpy().tolist()))
+
+    await app.router.startup()
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for scenario in args.scenarios:
+                results[scenario] = await run_scenario(client, scenario, pairs, args)
+                r = results[scenario]
+                print(
+                    f"{scenario:<24} p50={r['latency_ms'].get('p50')}ms p95={r['latency_ms'].get('p95')}ms "
+                    f"p99={r['latency_ms'].get('p99')}ms {r['throughput_rps']} req/s "
+                    f"errors={r['errors']} rss={r['peak_rss_mb']}MB"
+                )
+    finally:
+        await app.router.shutdown()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "rows": len(fake.df),
+            "blocks": len(pairs),
+            "db_requests": fake.requests,
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API endpoints against a local PostgREST stand-in")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=REQUESTS, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=WARMUP, help="unmeasured requests before each scenario")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="delay added to every PostgREST call")
+    parser.add_argument("--cold", action="store_true", help="clear app caches before each scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    parser.add_argument("--compare", default=None, help="baseline JSON report to diff against")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"✅ Report written to {args.out}")
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Shared fixtures: small synthetic reading sets served through the real
+``LocalStorage`` engine. The API is imported with the local backend, so
+no Supabase credentials are needed.
+"""
+import os
+
+os.environ.setdefault("STORAGE_BACKEND", "local")
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.storage import LocalStorage
+
+# names with spaces, quotes and commas exercise keyset quoting
+BLOCKS = [
+    ("Agra", "Achhnera"),
+    ("Agra", 'Bah "East", Tehsil'),
+    ("Badaun", "Ambiapur"),
+]
+
+
+def make_readings(days: int = 90, start: str = "2024-01-01", seed: int = 0) -> pd.DataFrame:
+    """
+    Six-hourly readings for every block in ``BLOCKS``; all blocks share
+    the same timestamps and a few water levels are missing.
+    """
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(start, periods=days * 4, freq="6h")
+    t = np.arange(len(ts))
+    frames = []
+    for i, (district, block) in enumerate(BLOCKS):
+        level = -10.0 - 5 * i - 0.002 * t + 0.3 * np.sin(t / 40) + rng.normal(0, 0.05, len(ts))
+        level[rng.choice(len(ts), 5, replace=False)] = np.nan
+        frames.append(pd.DataFrame({
+            "datetime_ts": ts,
+            "district": district,
+            "block": block,
+            "water_level": level.round(3),
+            "barometric": (980 + rng.normal(0, 1, len(ts))).round(1),
+            "rainfall_mm": rng.gamma(0.5, 2.0, len(ts)).round(1),
+            "specific_yield": 0.12 + 0.01 * i,
+            "aquifer_type": "Older Alluvium",
+            "latitude": 27.0 + i,
+            "longitude": 78.0 + i,
+            "wq_ph": 7.5,
+            "wq_ec": 500.0 + i,
+            "wq_cl": 14.0,
+            "wq_f": 0.2,
+            "wq_total_hardness": 230.0,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def local_storage(df: pd.DataFrame, path) -> LocalStorage:
+    """
+    ``LocalStorage`` over ``df`` written to the Parquet file ``path``.
+    """
+    df.to_parquet(path, index=False)
+    return LocalStorage([path])
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def readings() -> pd.DataFrame:
+    return make_readings()
+
+
+@pytest.fixture
+def storage(readings, tmp_path) -> LocalStorage:
+    return local_storage(readings, tmp_path / "readings.parquet")
@@ -0,0 +1,113 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.anomaly import MIN_READINGS, WellStats
+
+ALPHA = 0.1
+
+
+def reference(values, alpha=ALPHA):
+    """Per-reading loop over one signal: Welford, EWMA and the last z."""
+    n, mean, m2, ewma, ewvar, z = 0, 0.0, 0.0, None, 0.0, math.nan
+    for x in values:
+        if math.isnan(x):
+            z = math.nan
+            continue
+        n += 1
+        if ewma is None:
+            ewma = x
+        std = math.sqrt(ewvar)
+        z = (x - ewma) / std if n > MIN_READINGS and std > 0 else 0.0
+        delta = x - mean
+        mean += delta / n
+        m2 += delta * (x - mean)
+        diff = x - ewma
+        ewma += alpha * diff
+        ewvar = (1 - alpha) * (ewvar + diff * alpha * diff)
+    return {"n": n, "mean": mean, "std": math.sqrt(m2 / (n - 1)), "ewma": ewma, "z": z}
+
+
+def frame(seed=0, size=60, wells=(("Agra", "Achhnera"), ("Agra", "Bah"), ("Badaun", "Ujhani"))):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i, (district, block) in enumerate(wells):
+        level = -10 - i + np.cumsum(rng.normal(0, 0.1, size))
+        level[rng.choice(size, 4, replace=False)] = np.nan
+        frames.append(pd.DataFrame({
+            "datetime_ts": pd.date_range("2024-01-01", periods=size, freq="h") + pd.Timedelta(minutes=i),
+            "district": district,
+            "block": block,
+            "water_level": level,
+            "barometric": 980 + rng.normal(0, 1, size),
+        }))
+    # interleave wells, as storage pages do
+    return pd.concat(frames, ignore_index=True).sample(frac=1, random_state=seed)
+
+
+def assert_matches_reference(stats: WellStats, rows: pd.DataFrame):
+    for (district, block), well in rows.groupby(["district", "block"]):
+        record = stats.get(district, block)
+        well = well.sort_values("datetime_ts")
+        for signal in ("water_level", "barometric"):
+            expected = reference(well[signal].to_numpy())
+            got = record[signal]
+            assert got["readings"] == expected["n"]
+            assert got["mean"] == pytest.approx(round(expected["mean"], 3))
+            assert got["std"] == pytest.approx(round(expected["std"], 3))
+            assert got["ewma"] == pytest.approx(round(expected["ewma"], 3))
+            if math.isnan(expected["z"]):
+                assert got["z"] is None
+            else:
+                assert got["z"] == pytest.approx(round(expected["z"], 2))
+
+
+def test_update_matches_per_reading_loop():
+    rows = frame()
+    stats = WellStats(alpha=ALPHA)
+    assert stats.update(rows) == len(rows)
+    assert_matches_reference(stats, rows)
+
+
+def test_batches_fold_like_one_update():
+    rows = frame(seed=1).sort_values("datetime_ts")
+    stats = WellStats(alpha=ALPHA)
+    for chunk in np.array_split(np.arange(len(rows)), 7):
+        stats.update(rows.iloc[chunk])
+    # replayed and older rows are ignored
+    assert stats.update(rows.iloc[: len(rows) // 2]) == 0
+    assert_matches_reference(stats, rows)
+
+
+def test_missing_newest_reading_clears_z():
+    rows = frame(seed=2, wells=(("Agra", "Achhnera"),)).sort_values("datetime_ts")
+    stats = WellStats(alpha=ALPHA)
+    stats.update(rows.assign(water_level=rows["water_level"].fillna(-10.0)))
+    assert stats.get("Agra", "Achhnera")["water_level"]["z"] is not None
+
+    gap = pd.DataFrame({
+        "datetime_ts": [rows["datetime_ts"].max() + pd.Timedelta(hours=1)],
+        "district": ["Agra"], "block": ["Achhnera"], "water_level": [np.nan], "barometric": [980.0],
+    })
+    stats.update(gap)
+    record = stats.get("Agra", "Achhnera")
+    assert record["water_level"]["z"] is None
+    assert record["barometric"]["z"] is not None
+
+
+def test_alerts_flag_sudden_drop():
+    rows = frame(seed=3).sort_values("datetime_ts")
+    stats = WellStats(alpha=ALPHA)
+    stats.update(rows)
+    assert stats.alerts(threshold=8) == []
+
+    drop = pd.DataFrame({
+        "datetime_ts": [rows["datetime_ts"].max() + pd.Timedelta(hours=1)],
+        "district": ["Agra"], "block": ["Bah"], "water_level": [-40.0], "barometric": [980.0],
+    })
+    stats.update(drop)
+    alerts = stats.alerts(threshold=8)
+    assert [(a["district"], a["block"], a["kind"]) for a in alerts] == [("Agra", "Bah", ["level_drop"])]
+    assert stats.alerts(threshold=8, district="Badaun") == []
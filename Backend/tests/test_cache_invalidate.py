@@ -0,0 +1,27 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import api
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api, "CACHE_INVALIDATE_TOKEN", "s3cret")
+    return TestClient(api.app)
+
+
+def test_invalidate_requires_token(client):
+    assert client.post("/cache/invalidate").status_code == 401
+    assert client.post("/cache/invalidate", headers={"X-Invalidate-Token": "wrong"}).status_code == 401
+
+
+def test_invalidate_with_token(client):
+    response = client.post("/cache/invalidate", headers={"X-Invalidate-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.json() == {"status": "invalidated"}
+
+
+def test_invalidate_disabled_without_configured_token(monkeypatch):
+    monkeypatch.setattr(api, "CACHE_INVALIDATE_TOKEN", None)
+    response = TestClient(api.app).post("/cache/invalidate", headers={"X-Invalidate-Token": ""})
+    assert response.status_code == 403
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.coalesce import Coalescer
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_calls_share_one_computation():
+    flights = Coalescer()
+    calls = []
+    release = asyncio.Event()
+
+    async def compute():
+        calls.append(1)
+        await release.wait()
+        return {"value": 42}
+
+    waiters = [asyncio.create_task(flights.run("score", ("Agra", "Bah"), compute)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert flights.stats()["score"] == {"computations": 1, "coalesced": 4, "in_flight": 1}
+
+    release.set()
+    results = await asyncio.gather(*waiters)
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flights.stats()["score"]["in_flight"] == 0
+
+    # once finished, the next call computes again
+    assert await flights.run("score", ("Agra", "Bah"), compute) == {"value": 42}
+    assert len(calls) == 2
+
+
+async def test_different_keys_and_names_do_not_coalesce():
+    flights = Coalescer()
+    release = asyncio.Event()
+
+    async def compute():
+        await release.wait()
+        return object()
+
+    tasks = [
+        asyncio.create_task(flights.run(name, key, compute))
+        for name, key in [("score", 1), ("score", 2), ("extras", 1)]
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+    assert len({id(r) for r in results}) == 3
+    assert flights.stats() == {
+        "extras": {"computations": 1, "coalesced": 0, "in_flight": 0},
+        "score": {"computations": 2, "coalesced": 0, "in_flight": 0},
+    }
+
+
+async def test_failure_reaches_every_waiter_and_is_not_cached():
+    flights = Coalescer()
+    release = asyncio.Event()
+
+    async def fail():
+        await release.wait()
+        raise ValueError("boom")
+
+    waiters = [asyncio.create_task(flights.run("score", 1, fail)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+    async def ok():
+        return "ok"
+
+    assert await flights.run("score", 1, ok) == "ok"
+
+
+async def test_cancelled_caller_does_not_cancel_shared_computation():
+    flights = Coalescer()
+    release = asyncio.Event()
+
+    async def compute():
+        await release.wait()
+        return "done"
+
+    first = asyncio.create_task(flights.run("score", 1, compute))
+    second = asyncio.create_task(flights.run("score", 1, compute))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await second == "done"
+    assert first.cancelled()
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app import api, catalog
+from app.names import NameIndex
+from app.rollup import DailyRollup
+from tests.conftest import BLOCKS, local_storage
+
+
+@pytest.fixture
+def client(readings, tmp_path, monkeypatch):
+    # the same block name in two districts
+    twin = readings[readings["block"] == "Achhnera"].assign(district="Badaun", water_level=lambda df: df["water_level"] - 7)
+    storage = local_storage(pd.concat([readings, twin], ignore_index=True), tmp_path / "readings.parquet")
+    index = NameIndex([*BLOCKS, ("Badaun", "Achhnera")])
+
+    async def fake_index():
+        return index
+
+    monkeypatch.setattr(catalog, "index", fake_index)
+    monkeypatch.setattr(api, "rollup", DailyRollup(storage))
+    return TestClient(api.app)
+
+
+def test_same_block_name_in_two_districts(client):
+    response = client.post("/extras/batch", json={"blocks": [
+        {"district": "Agra", "block": "Achhnera"},
+        {"district": "badaun", "block": "ACHHNERA"},
+        {"district": "Agra", "block": "achhnera"},  # same block again
+        {"district": "Agra", "block": "Nowhere"},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+
+    results = {(r["district"], r["block"]): r for r in body["results"]}
+    assert list(results) == [("Agra", "Achhnera"), ("Badaun", "Achhnera")]
+    assert results[("Agra", "Achhnera")]["last_water_level"] != results[("Badaun", "Achhnera")]["last_water_level"]
+    assert body["missing"] == [{"district": "Agra", "block": "Nowhere"}]
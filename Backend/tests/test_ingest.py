@@ -0,0 +1,48 @@
+import json
+
+from app.ingest import Checkpoint
+
+
+def make_checkpoint(tmp_path):
+    csv = tmp_path / "readings.csv"
+    if not csv.exists():
+        csv.write_text("datetime,district\n")
+    return Checkpoint(tmp_path / "readings.checkpoint.json", csv, batch_size=500)
+
+
+def test_marks_compact_to_high_water(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    for batch_no in [1, 2, 0, 5, 3]:
+        checkpoint.mark(batch_no)
+
+    assert (checkpoint.below, checkpoint.ahead) == (4, {5})
+    assert [b for b in range(7) if b in checkpoint] == [0, 1, 2, 3, 5]
+    assert len(checkpoint) == 5
+
+
+def test_file_stays_small(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    for batch_no in range(10_000):
+        checkpoint.mark(batch_no)
+    saved = json.loads(checkpoint.path.read_text())
+    assert (saved["below"], saved["done"]) == (10_000, [])
+
+
+def test_resume_and_source_change(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    for batch_no in [0, 1, 3]:
+        checkpoint.mark(batch_no)
+
+    resumed = make_checkpoint(tmp_path)
+    assert [b for b in range(5) if b in resumed] == [0, 1, 3]
+
+    # a changed CSV starts over
+    (tmp_path / "readings.csv").write_text("datetime,district\n2024-01-01,Agra\n")
+    assert len(make_checkpoint(tmp_path)) == 0
+
+
+def test_reads_sorted_list_checkpoints(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    checkpoint.path.write_text(json.dumps({"source": checkpoint.source, "done": [0, 1, 2, 4]}))
+    resumed = make_checkpoint(tmp_path)
+    assert (resumed.below, resumed.ahead) == (3, {4})
@@ -0,0 +1,65 @@
+from app.names import NameIndex, name_key
+
+PAIRS = [
+    ("Agra", "Achhnera"),
+    ("Agra", "Barauli Ahir_Dav Degree College_ Kundal"),
+    ("Aligarh", "Atrauli"),
+    ("Badaun", "Achhnera"),
+]
+
+
+def test_name_key_normalizes_case_and_separators():
+    assert name_key("  Barauli_Ahir--dav ") == "barauli ahir dav"
+
+
+def test_resolve_exact_key_and_alias():
+    index = NameIndex(PAIRS)
+    assert index.resolve("AGRA", "achhnera") == ("Agra", "Achhnera")
+    assert index.resolve("agra", "barauli-ahir") == ("Agra", "Barauli Ahir_Dav Degree College_ Kundal")
+    assert index.resolve("agra", "Dav Degree College Kundal") == ("Agra", "Barauli Ahir_Dav Degree College_ Kundal")
+    assert index.resolve("", "atrauli") == ("Aligarh", "Atrauli")
+
+
+def test_resolve_rejects_partial_fuzzy_and_ambiguous_names():
+    index = NameIndex(PAIRS)
+    assert index.resolve("agra", "achhner") is None      # prefix
+    assert index.resolve("agra", "achnera") is None      # typo
+    assert index.resolve("agra", "degree") is None       # substring
+    assert index.resolve("agr", "achhnera") is None      # district prefix
+    assert index.resolve("", "achhnera") is None         # in two districts
+    assert index.resolve("aligarh", "achhnera") is None  # wrong district
+    assert index.resolve_district("Aligrah") is None
+
+
+def test_search_keeps_prefix_and_fuzzy_matches():
+    index = NameIndex(PAIRS)
+    labels = [r["label"] for r in index.search("achh")]
+    assert labels[:2] == ["Achhnera", "Achhnera"]
+    assert "Atrauli" in [r["label"] for r in index.search("atrauly")]
+    # the district filter itself may be partial or misspelt
+    assert [r["district"] for r in index.search("achh", district="badau")] == ["Badaun"]
+
+
+def test_data_endpoints_404_with_suggestions(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import api, catalog
+
+    index = NameIndex(PAIRS)
+
+    async def fake_index():
+        return index
+
+    monkeypatch.setattr(catalog, "index", fake_index)
+    client = TestClient(api.app)
+
+    response = client.get("/fluctuations-daily", params={"district": "agra", "block": "achnera"})
+    assert response.status_code == 404
+    assert [s["block"] for s in response.json()["detail"]["suggestions"]] == ["Achhnera"]
+
+    response = client.get("/blocks", params={"district": "Aligrah"})
+    assert response.status_code == 404
+    assert response.json()["detail"]["suggestions"][0]["district"] == "Aligarh"
+
+    response = client.get("/autocomplete", params={"q": "achn", "district": "agr"})
+    assert [r["label"] for r in response.json()["results"]] == ["Achhnera"]
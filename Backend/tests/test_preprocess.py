@@ -0,0 +1,25 @@
+from app.preprocess_and_metrics import preprocess_and_chunk, read_merged_csv, scan_partitioned
+
+MERGED = """datetime,district,block,water level
+01-01-2024 00:00, AGRA ,Bah (East),-10.5
+01-01-2024 06:00,AGRA, Bah (East) ,-10.6
+01-01-2024 00:00,Agra,McLeodganj,-8.0
+"""
+
+
+def test_names_keep_stored_spelling(tmp_path):
+    path = tmp_path / "merged.csv"
+    path.write_text(MERGED)
+    df = read_merged_csv(path)
+    assert list(df["district"]) == ["AGRA", "AGRA", "Agra"]
+    assert list(df["block"]) == ["Bah (East)", "Bah (East)", "McLeodganj"]
+
+
+def test_partitioned_lookup_ignores_case(tmp_path):
+    path = tmp_path / "merged.csv"
+    path.write_text(MERGED)
+    preprocess_and_chunk(path, out_dir=tmp_path / "partitioned")
+
+    df = scan_partitioned(district="agra", block="bah (east)", root=tmp_path / "partitioned")
+    assert list(df["water_level"]) == [-10.5, -10.6]
+    assert set(df["block"]) == {"Bah (East)"}
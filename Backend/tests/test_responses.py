@@ -0,0 +1,38 @@
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from app.responses import ARROW_MEDIA_TYPE, CompressionMiddleware
+
+BODY = b"0123456789" * 500
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/{media_type:path}")
+    async def body(media_type: str):
+        return Response(BODY, media_type=media_type)
+
+    return TestClient(app)
+
+
+def test_text_is_compressed_with_preferred_encoding():
+    client = make_client()
+    response = client.get("/application/json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == BODY  # decoded by the client
+
+    response = client.get("/text/csv", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.content == BODY
+
+
+def test_binary_types_are_not_compressed():
+    client = make_client()
+    for media_type in ("image/png", ARROW_MEDIA_TYPE, "application/octet-stream"):
+        response = client.get(f"/{media_type}", headers={"Accept-Encoding": "gzip, br"})
+        assert "content-encoding" not in response.headers, media_type
+        assert response.content == BODY
@@ -0,0 +1,150 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from app import rollup as rollup_module
+from app.rollup import DailyRollup, READING_COLUMNS, aggregate_daily, block_key
+from tests.conftest import BLOCKS, local_storage
+
+pytestmark = pytest.mark.anyio
+
+
+class SmallPages:
+    """
+    Storage wrapper serving ``pages`` in pages of ``page_rows``.
+    """
+
+    def __init__(self, storage, page_rows: int):
+        self.storage = storage
+        self.page_rows = page_rows
+
+    def pages(self, *args, **kwargs):
+        return self.storage.pages(*args, page_rows=self.page_rows, **kwargs)
+
+
+def assert_daily_equal(left: pd.DataFrame, right: pd.DataFrame):
+    pd.testing.assert_frame_equal(
+        left.reset_index(drop=True), right.reset_index(drop=True), check_dtype=False, check_categorical=False,
+    )
+
+
+async def test_daily_matches_one_shot_aggregation(storage, readings):
+    rollup = DailyRollup(storage)
+    district, block = BLOCKS[0]
+    daily = await rollup.daily(district, block)
+
+    rows = readings[(readings["district"] == district) & (readings["block"] == block)]
+    expected = aggregate_daily(rows.reindex(columns=READING_COLUMNS))
+    assert_daily_equal(daily, expected)
+    assert (await rollup.info(district, block))["readings"] == rows["water_level"].notna().sum()
+
+
+async def test_incremental_fold_equals_full_rebuild(readings, tmp_path):
+    district, block = BLOCKS[1]
+    cutoff = readings["datetime_ts"].iloc[len(readings) // 3 + 7]  # mid-day
+
+    full = DailyRollup(local_storage(readings, tmp_path / "full.parquet"))
+    expected = await full.daily(district, block)
+
+    incremental = DailyRollup(local_storage(readings[readings["datetime_ts"] <= cutoff], tmp_path / "old.parquet"))
+    await incremental.daily(district, block)
+    incremental.storage = local_storage(readings, tmp_path / "new.parquet")
+    entry = await incremental.refresh(district, block, force=True)
+
+    assert_daily_equal(entry["daily"], expected)
+    assert entry["readings"] == (await full.info(district, block))["readings"]
+
+
+async def test_fold_drops_rows_at_or_below_high_water(storage, readings):
+    rollup = DailyRollup(storage)
+    district, block = BLOCKS[0]
+    entry = await rollup.refresh(district, block)
+    daily, count, version = entry["daily"].copy(), entry["readings"], rollup.version(district, block)
+
+    # the same rows again, e.g. an overlapping load, change nothing
+    rows = readings[(readings["district"] == district) & (readings["block"] == block)]
+    rollup._fold(rows, {block_key(district, block): entry})
+
+    assert_daily_equal(entry["daily"], daily)
+    assert entry["readings"] == count
+    assert rollup.version(district, block) == version
+
+
+async def test_paged_folds_equal_single_fold(storage, monkeypatch):
+    expected = await DailyRollup(storage).refresh_many(BLOCKS)
+
+    monkeypatch.setattr(rollup_module, "FOLD_ROWS", 100)
+    paged = await DailyRollup(SmallPages(storage, 37)).refresh_many(BLOCKS)
+
+    for pair in BLOCKS:
+        assert_daily_equal(paged[pair], expected[pair])
+
+
+async def test_refresh_many_matches_refresh(storage):
+    batched = await DailyRollup(storage).refresh_many(BLOCKS)
+    single = DailyRollup(storage)
+    for pair in BLOCKS:
+        assert_daily_equal(batched[pair], await single.daily(*pair))
+
+
+async def test_on_rows_sees_each_reading_once(storage, readings):
+    seen = []
+    rollup = DailyRollup(storage, on_rows=seen.append)
+    await rollup.refresh_many(BLOCKS)
+    await rollup.refresh_many(BLOCKS, force=True)
+
+    folded = pd.concat(seen, ignore_index=True)
+    assert len(folded) == len(readings)
+
+
+async def test_cancelled_refresh_many_releases_its_locks(storage):
+    rollup = DailyRollup(storage)
+    first, second = sorted(BLOCKS, key=lambda pair: block_key(*pair))[:2]
+    blocker = rollup._entry(block_key(*second))["lock"]
+    await blocker.acquire()
+
+    task = asyncio.create_task(rollup.refresh_many([first, second]))
+    await asyncio.sleep(0.01)  # holds the first lock, waits for the second
+    assert rollup._entry(block_key(*first))["lock"].locked()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    blocker.release()
+
+    assert not rollup._entry(block_key(*first))["lock"].locked()
+    await asyncio.wait_for(rollup.refresh_many([first, second]), timeout=5)
+
+
+async def test_invalidate_rebuilds_backfilled_rows(readings, tmp_path):
+    district, block = BLOCKS[0]
+    # a batch of old rows (e.g. committed out of order) arrives after the first load
+    backfill = readings["datetime_ts"].between("2024-02-01", "2024-02-10")
+    rollup = DailyRollup(local_storage(readings[~backfill], tmp_path / "partial.parquet"))
+    await rollup.daily(district, block)
+    version = rollup.version(district, block)
+
+    rollup.storage = local_storage(readings, tmp_path / "full.parquet")
+    expected = await DailyRollup(rollup.storage).daily(district, block)
+
+    # a top-up only asks for rows past the high-water mark
+    topped_up = await rollup.refresh(district, block, force=True)
+    assert len(topped_up["daily"]) < len(expected)
+    assert rollup.version(district, block) == version
+
+    rollup.invalidate()
+    assert_daily_equal(await rollup.daily(district, block), expected)
+    assert rollup.version(district, block) != version
+    rows = readings[(readings["district"] == district) & (readings["block"] == block)]
+    assert (await rollup.info(district, block))["readings"] == rows["water_level"].notna().sum()
+
+
+async def test_invalidate_one_block(storage):
+    rollup = DailyRollup(storage)
+    await rollup.refresh_many(BLOCKS)
+    versions = {pair: rollup.version(*pair) for pair in BLOCKS}
+
+    rollup.invalidate(*BLOCKS[0])
+    await rollup.refresh_many(BLOCKS)
+    assert rollup.version(*BLOCKS[0]) != versions[BLOCKS[0]]
+    assert all(rollup.version(*pair) == versions[pair] for pair in BLOCKS[1:])
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.rollup import DailyRollup, stack_daily
+from app.scoring import SCORE_COLUMNS, compute_sustainability_score, score_blocks
+from tests.conftest import BLOCKS
+
+pytestmark = pytest.mark.anyio
+
+
+def daily_frame(days: int, seed: int, rainfall: bool = True, yield_percent: bool = False) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "date": pd.date_range("2024-01-01", periods=days, freq="D"),
+        "mean_level": -20 + np.cumsum(rng.normal(0, 0.2, days)),
+    })
+    df.loc[rng.choice(days, min(days // 10, 3), replace=False), "mean_level"] = np.nan
+    if rainfall:
+        df["rainfall_mm"] = rng.choice([0.0, 0.0, 2.5, 10.0], days)
+    if yield_percent:
+        df["yield_percent"] = rng.uniform(5, 40, days)
+    return df
+
+
+def assert_scores_match(daily_by_block: dict, window: int):
+    scores = score_blocks(stack_daily(daily_by_block), window=window)
+    assert set(scores.index) == set(daily_by_block)
+    for pair, daily in daily_by_block.items():
+        expected = compute_sustainability_score(daily.tail(window))
+        for column in SCORE_COLUMNS:
+            assert scores.loc[pair, column] == pytest.approx(expected[column], abs=1e-9, nan_ok=True), (pair, column)
+
+
+@pytest.mark.parametrize("window", [30, 60])
+async def test_score_blocks_matches_per_block_score(storage, window):
+    daily_by_block = await DailyRollup(storage).refresh_many(BLOCKS)
+    assert_scores_match(daily_by_block, window)
+
+
+@pytest.mark.parametrize("window", [30, 60])
+def test_score_blocks_edge_cases(window):
+    daily_by_block = {
+        ("A", "long"): daily_frame(120, 1),
+        ("A", "short"): daily_frame(12, 2),
+        ("A", "no rain"): daily_frame(45, 3).assign(rainfall_mm=0.0),
+        ("B", "one day"): daily_frame(1, 4),
+        ("B", "with yield"): daily_frame(70, 5, yield_percent=True),
+    }
+    assert_scores_match(daily_by_block, window)
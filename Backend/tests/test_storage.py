@@ -0,0 +1,119 @@
+import pandas as pd
+import pytest
+
+from app.storage import SupabaseStorage
+from bench.fake_postgrest import FakePostgrest
+from tests.conftest import BLOCKS, local_storage
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_names_match_exactly(storage):
+    assert sorted(await storage.blocks("Agra")) == sorted(b for d, b in BLOCKS if d == "Agra")
+    assert await storage.blocks("agra") == []
+    assert await storage.latest("Agra", "achhnera") is None
+
+    district, block = BLOCKS[1]
+    row = await storage.latest(district, block)
+    assert (row["district"], row["block"]) == (district, block)
+    assert len(await storage.readings(district, block, limit=10_000)) == 360
+
+
+COLUMNS = ["datetime_ts", "district", "block", "water_level", "rainfall_mm"]
+
+
+async def collect(storage, pairs, page_rows, **kwargs):
+    pages = [page async for page in storage.pages(pairs, COLUMNS, page_rows=page_rows, **kwargs)]
+    assert all(len(page) <= page_rows for page in pages)
+    if not pages:
+        return pd.DataFrame(columns=COLUMNS)
+    df = pd.concat(pages, ignore_index=True)
+    return df.assign(
+        datetime_ts=pd.to_datetime(df["datetime_ts"]),
+        district=df["district"].astype(str),
+        block=df["block"].astype(str),
+        water_level=df["water_level"].astype("float64").round(3),
+        rainfall_mm=df["rainfall_mm"].astype("float64").round(1),
+    )
+
+
+def expected_scan(readings, pairs, start=None, end=None, since=None):
+    df = readings[pd.MultiIndex.from_frame(readings[["district", "block"]]).isin(pairs)]
+    if start is not None:
+        df = df[df["datetime_ts"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["datetime_ts"] <= pd.Timestamp(end)]
+    if since is not None:
+        df = df[df["datetime_ts"] > pd.Timestamp(since)]
+    return df.sort_values(["datetime_ts", "district", "block"], kind="stable")[COLUMNS].reset_index(drop=True)
+
+
+def assert_same_rows(got: pd.DataFrame, expected: pd.DataFrame):
+    key = ["datetime_ts", "district", "block"]
+    assert not got.duplicated(key).any()
+    pd.testing.assert_frame_equal(
+        got.sort_values(key, kind="stable").reset_index(drop=True), expected,
+        check_dtype=False, check_categorical=False,
+    )
+
+
+RANGES = [
+    {},
+    {"start": "2024-02-01", "end": "2024-02-15 06:00"},
+    {"since": "2024-03-20 12:00"},
+]
+
+
+def supabase_over(df: pd.DataFrame) -> SupabaseStorage:
+    """
+    ``SupabaseStorage`` over a fake PostgREST serving ``df``, capped at 50
+    rows per response like a small ``max-rows``.
+    """
+    return SupabaseStorage(FakePostgrest(df=df, max_rows=50).client())
+
+
+@pytest.fixture
+def fake_supabase(readings):
+    return supabase_over(readings)
+
+
+@pytest.mark.parametrize("page_rows", [37, 50])
+@pytest.mark.parametrize("window", RANGES)
+async def test_supabase_keyset_pages_equal_single_scan(fake_supabase, readings, page_rows, window):
+    got = await collect(fake_supabase, BLOCKS, page_rows, **window)
+    assert_same_rows(got, expected_scan(readings, BLOCKS, **window))
+    # oldest first across pages
+    assert got["datetime_ts"].is_monotonic_increasing
+
+
+@pytest.mark.parametrize("page_rows", [1, 37, 10_000])
+@pytest.mark.parametrize("window", RANGES)
+async def test_local_pages_equal_single_scan(storage, readings, page_rows, window):
+    pairs = BLOCKS[1:]
+    got = await collect(storage, pairs, page_rows, **window)
+    assert_same_rows(got, expected_scan(readings, pairs, **window))
+    assert got["datetime_ts"].is_monotonic_increasing
+
+
+async def test_pages_skip_unrequested_combinations(readings):
+    # the district and block IN filters also match (Agra, Ambiapur)
+    extra = readings[readings["block"] == "Ambiapur"].assign(district="Agra")
+    fake = supabase_over(pd.concat([readings, extra]))
+    pairs = [("Agra", "Achhnera"), ("Badaun", "Ambiapur")]
+    got = await collect(fake, pairs, 50)
+    assert_same_rows(got, expected_scan(readings, pairs))
+
+
+async def test_pages_keep_readings_sharing_a_key(readings, tmp_path):
+    # eleven readings of one block at the same instant, as in the shipped data
+    district, block = BLOCKS[1]
+    row = readings[(readings["district"] == district) & (readings["block"] == block)].iloc[[100]]
+    copies = pd.concat([row] * 11, ignore_index=True).assign(water_level=[-float(i) for i in range(11)])
+    df = pd.concat([readings, copies], ignore_index=True)
+    expected = expected_scan(df, BLOCKS).sort_values(COLUMNS, ignore_index=True)
+
+    for storage in (supabase_over(df), local_storage(df, tmp_path / "readings.parquet")):
+        got = await collect(storage, BLOCKS, 7)
+        pd.testing.assert_frame_equal(
+            got.sort_values(COLUMNS, ignore_index=True), expected, check_dtype=False, check_categorical=False,
+        )
@@ -0,0 +1,94 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.timeseries import bucket_stats, clean_series, downsample, lttb
+
+
+def series(size: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ts = np.sort(rng.choice(np.arange(10 * size), size, replace=False)).astype(np.int64) * 60_000_000_000
+    values = np.cumsum(rng.normal(0, 1, size))
+    return ts, values
+
+
+def reference_lttb(ts, values, n):
+    """Textbook LTTB (Steinarsson 2013), one point at a time."""
+    size = len(ts)
+    x = [float(t - ts[0]) for t in ts]
+    every = (size - 2) / (n - 2)
+    chosen, a = [0], 0
+    for i in range(n - 2):
+        avg_start = math.floor((i + 1) * every) + 1
+        avg_end = min(math.floor((i + 2) * every) + 1, size)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(values[avg_start:avg_end]) / (avg_end - avg_start)
+        best, best_area = None, -1.0
+        for j in range(math.floor(i * every) + 1, math.floor((i + 1) * every) + 1):
+            area = abs((x[a] - avg_x) * (values[j] - values[a]) - (x[a] - x[j]) * (avg_y - values[a]))
+            if area > best_area:
+                best, best_area = j, area
+        chosen.append(best)
+        a = best
+    return chosen + [size - 1]
+
+
+@pytest.mark.parametrize("size, n", [(1000, 100), (997, 13), (50, 3), (10, 9)])
+def test_lttb_matches_reference(size, n):
+    ts, values = series(size, seed=size)
+    idx = lttb(ts, values, n)
+    assert list(idx) == reference_lttb(ts, values, n)
+    assert len(idx) == n and idx[0] == 0 and idx[-1] == size - 1
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_lttb_short_series():
+    ts, values = series(5)
+    assert list(lttb(ts, values, 10)) == [0, 1, 2, 3, 4]
+    assert list(lttb(ts, values, 2)) == [0, 4]
+
+
+def test_bucket_stats_matches_groupby():
+    ts, values = series(2000)
+    n_buckets = 64
+    stats = bucket_stats(ts, values, n_buckets)
+
+    width = max((ts[-1] - ts[0] + 1) / n_buckets, 1.0)
+    bucket = np.minimum(((ts - ts[0]) / width).astype(np.int64), n_buckets - 1)
+    expected = pd.Series(values).groupby(bucket).agg(["mean", "min", "max", "count"])
+
+    assert len(stats) == len(expected) <= n_buckets
+    np.testing.assert_allclose(stats["mean"], expected["mean"])
+    np.testing.assert_array_equal(stats["min"], expected["min"])
+    np.testing.assert_array_equal(stats["max"], expected["max"])
+    np.testing.assert_array_equal(stats["count"], expected["count"])
+    assert stats["datetime_ts"].is_monotonic_increasing
+
+
+def test_bucket_stats_keeps_extremes_and_empty_buckets_out():
+    ts, values = series(500)
+    stats = bucket_stats(ts, values, 40, start=ts[0] - 10**12, end=ts[-1] + 10**12)
+    assert stats["min"].min() == values.min()
+    assert stats["max"].max() == values.max()
+    assert stats["count"].sum() == len(values)
+    assert (stats["count"] > 0).all()
+
+
+def test_downsample_raw_minmax_and_lttb():
+    ts, values = series(400)
+    values[::50] = np.nan
+    df = pd.DataFrame({"datetime_ts": pd.to_datetime(ts[::-1], unit="ns"), "water_level": values[::-1]})
+
+    clean_ts, clean_values = clean_series(df, "water_level")
+    assert len(clean_ts) == 392 and np.all(np.diff(clean_ts) > 0)
+
+    frame, raw, method = downsample(df, "water_level", 1000, "lttb")
+    assert (raw, method, len(frame)) == (392, "raw", 392)
+
+    frame, raw, method = downsample(df, "water_level", 50, "lttb")
+    assert (raw, method, len(frame)) == (392, "lttb", 50)
+
+    frame, raw, method = downsample(df, "water_level", 50, "minmax")
+    assert method == "minmax" and frame["count"].sum() == 392 and len(frame) <= 50
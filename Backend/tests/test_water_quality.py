@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.spatial import haversine_km
+from app.water_quality import DEFAULT_TEMPLATES, UNIT_TEMPLATES, clean_column, clean_samples, join_water_quality
+
+RAW = """s._no.,state,district,location,longitude,latitude,year,ph,ec_(?s/cm_at,cl_(mg/l),hco3,so4
+1,Uttar Pradesh,Agra,Raunakata,77.8734,27.2341,2023,8,2459 °2C3),(m4g88/L),760,(m10g9/L1)
+2,Uttar Pradesh,Agra,Sai Ki Takia,78.0095,27.1707,2023,8.2,1520,50,805,-
+3,Uttar Pradesh,Agra,No Coordinates,,,2023,7.9,900,12,300,40
+4,Uttar Pradesh,Badaun,Ujhani,79.0060,28.0000,2022,7.5,257 4°6C),(mg- /L),,38
+"""
+
+
+def test_clean_column_recovers_values_from_unit_text():
+    raw = pd.Series(["8", "-1.5", "(m4g88/L)", "(m10g9/L1)", "(mg- /L)", "-", "", None, "abc"])
+    values, status = clean_column(raw, DEFAULT_TEMPLATES)
+    assert list(status) == ["ok", "ok", "recovered", "recovered", "invalid", "missing", "missing", "missing", "invalid"]
+    np.testing.assert_array_equal(values[:4], [8.0, -1.5, 488.0, 1091.0])
+    assert values[4:].isna().all()
+
+
+def test_clean_column_ec_template():
+    values, status = clean_column(pd.Series(["257 4°6C)", "2459 °2C3)", "1520"]), UNIT_TEMPLATES["wq_ec"])
+    assert list(status) == ["recovered", "recovered", "ok"]
+    assert list(values) == [746.0, 4923.0, 1520.0]
+
+
+def test_clean_samples_report(tmp_path):
+    path = tmp_path / "wq.csv"
+    path.write_text(RAW, encoding="utf-8")
+    samples, report = clean_samples(path)
+
+    assert report["rows"] == 4
+    assert report["dropped_without_coordinates"] == 1
+    assert report["columns"]["wq_cl"] == {"ok": 2, "recovered": 1, "invalid": 1}
+    assert report["invalid"] == [{"row": 3, "sample_no": "4", "column": "wq_cl", "value": "(mg- /L)"}]
+    assert list(samples["sample_no"]) == [1, 2, 4]
+    assert list(samples["wq_ec"]) == [4923.0, 1520.0, 746.0]
+    assert list(samples["wq_so4"].isna()) == [False, True, False]
+
+
+def test_join_picks_nearest_sample(tmp_path):
+    path = tmp_path / "wq.csv"
+    path.write_text(RAW, encoding="utf-8")
+    samples, _ = clean_samples(path)
+    readings = pd.DataFrame({
+        "datetime_ts": pd.to_datetime(["2023-05-01", "2023-05-01", "2022-05-01", "2023-05-01"]),
+        "latitude": [27.23, 27.18, 27.23, np.nan],
+        "longitude": [77.88, 78.00, 77.88, 78.0],
+        "wq_ec": 0.0,
+    })
+
+    joined = join_water_quality(readings, samples)
+    for i in range(3):
+        km = haversine_km(readings.at[i, "latitude"], readings.at[i, "longitude"], samples["latitude"], samples["longitude"])
+        nearest = int(np.argmin(km))
+        assert joined.at[i, "wq_ec"] == samples.at[nearest, "wq_ec"]
+        assert joined.at[i, "wq_distance_km"] == pytest.approx(km[nearest])
+    assert joined.loc[3, ["wq_ec", "wq_distance_km"]].isna().all()
+
+    # 2022 readings only join the 2022 sample
+    by_year = join_water_quality(readings, samples, match_year=True)
+    assert by_year.at[2, "wq_ec"] == 746.0
+    assert by_year.at[0, "wq_ec"] == 4923.0
+
+    near = join_water_quality(readings, samples, max_km=1.0)
+    assert list(near["wq_ec"].notna()) == list(joined["wq_distance_km"] <= 1.0)